@@ -0,0 +1,53 @@
+# Runs the simulated CPU inside an asyncio event loop without hogging it.
+# Instructions are executed in short slices, and the loop gets control back between slices so that other coroutines keep running.
+
+import asyncio
+import time
+import cpu_simulator as sim
+import cpu_jit
+
+
+class asyncProgress:
+    """How far a run_async_progress run has got.  retired counts every instruction retired so far, and reason is the stopReason of the latest slice."""
+
+    def __init__(self,retired:int,reason:str,seconds:float) -> None:
+        self.retired:int=retired
+        self.reason:str=reason
+        self.seconds:float=seconds # time since the run started
+
+
+async def run_async_progress(cpu:sim.CPU,max_instructions:int,slice:int=4096,sliceSeconds:float=0.005,engine=None):
+    """Runs up to max_instructions instructions, yielding an asyncProgress after each slice and handing control back to the event loop with asyncio.sleep(0).
+    Slices start at slice instructions and are resized as the run goes so that each takes about sliceSeconds, which bounds how long other coroutines wait.
+    engine is anything with a run(max_instructions) method like CPU.run.  By default a blockJIT is used, and detached when the run ends.
+    Cancelling the task running this stops the run between slices, so the CPU is always left between instructions."""
+    ownEngine:bool = engine==None
+    if ownEngine:
+        engine = cpu_jit.blockJIT(cpu)
+    started:float = time.monotonic()
+    retired:int = 0
+    reason:str = sim.stopReason.limit
+    try:
+        while retired<max_instructions:
+            sliceStarted:float = time.monotonic()
+            moreRetired, reason = engine.run(min(slice,max_instructions-retired))
+            retired = retired+moreRetired
+            sliceTook:float = time.monotonic()-sliceStarted
+            if sliceSeconds!=None: # aim the next slice at sliceSeconds, without changing size too abruptly
+                slice = max(1,int(slice*min(2.0,max(0.5,sliceSeconds/max(sliceTook,1e-6)))))
+            if (reason!=sim.stopReason.limit) or (retired>=max_instructions):
+                break
+            yield asyncProgress(retired,reason,time.monotonic()-started)
+            await asyncio.sleep(0)
+        yield asyncProgress(retired,reason,time.monotonic()-started)
+    finally:
+        if ownEngine:
+            engine.detach()
+
+async def run_async(cpu:sim.CPU,max_instructions:int,slice:int=4096,sliceSeconds:float=0.005,engine=None) -> tuple[int,str]:
+    """Runs up to max_instructions instructions in slices, letting other coroutines run in between, and returns the number retired along with the stopReason, just like CPU.run.
+    See run_async_progress for the slices, the engine and cancellation."""
+    progress:asyncProgress = asyncProgress(0,sim.stopReason.limit,0.0)
+    async for progress in run_async_progress(cpu,max_instructions,slice,sliceSeconds,engine):
+        pass
+    return progress.retired,progress.reason
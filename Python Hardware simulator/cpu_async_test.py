@@ -0,0 +1,55 @@
+import asyncio
+import cpu_simulator
+import cpu_async
+from cpu_test_helpers import countdownProgram, loadProgram
+
+def test_run_async_countdown_sameStateAsRun():
+    interpretedCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(interpretedCpu,countdownProgram)
+    interpretedCpu.run(10000)
+
+    asyncCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(asyncCpu,countdownProgram)
+    assert asyncio.run(cpu_async.run_async(asyncCpu,10000,slice=100))==(10000,cpu_simulator.stopReason.limit)
+    for register in ["000","001","010","011","100","101","110","111"]:
+        assert asyncCpu.getRegister(register).toString()==interpretedCpu.getRegister(register).toString()
+    assert not asyncCpu.theRAM.onWriteEvent.hasReactions # the blockJIT it made was detached
+
+def test_run_async_progress_otherCoroutinesRunBetweenSlices():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,countdownProgram)
+    ticks:list[int] = []
+
+    async def ticker() -> None:
+        while True:
+            ticks.append(len(ticks))
+            await asyncio.sleep(0)
+
+    async def main() -> list[cpu_async.asyncProgress]:
+        tickerTask:asyncio.Task = asyncio.create_task(ticker())
+        reports:list[cpu_async.asyncProgress] = [progress async for progress in cpu_async.run_async_progress(theCpu,5000,slice=500,sliceSeconds=None,engine=theCpu)]
+        tickerTask.cancel()
+        return reports
+
+    reports:list[cpu_async.asyncProgress] = asyncio.run(main())
+    assert [progress.retired for progress in reports]==list(range(500,5001,500))
+    assert reports[-1].reason==cpu_simulator.stopReason.limit
+    assert len(ticks)>=9
+
+def test_run_async_cancelled_cpuLeftBetweenInstructions():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,countdownProgram)
+
+    async def main() -> None:
+        task:asyncio.Task = asyncio.create_task(cpu_async.run_async(theCpu,10**9,slice=1000))
+        await asyncio.sleep(0.02)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return
+        raise AssertionError("the run wasn't cancelled")
+
+    asyncio.run(main())
+    assert theCpu.theClock==2
+    assert not theCpu.theRAM.onWriteEvent.hasReactions
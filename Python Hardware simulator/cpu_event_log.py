@@ -0,0 +1,67 @@
+# A bounded log of what the simulated CPU did, for displays like the GUI's action log.
+# Records are cheap to add: each one keeps its raw values and is only turned into text if it's actually shown.
+
+import collections
+
+
+class logCategory:
+    """The kinds of record an eventLog holds.  Each one can be switched off separately."""
+    registers:str="registers"
+    ram:str="RAM"
+    alu:str="ALU"
+    decode:str="decode"
+    messages:str="messages" # anything else, such as files being opened or a run finishing
+    all:tuple[str,...]=(registers,ram,alu,decode,messages)
+
+
+class eventLog:
+    """Keeps the last capacity records in a ring buffer, so a long session can't make the log grow without limit.
+    A record is a category, a template and the values for the template.  The template is a format string, a function called with the values, or None to join the values with spaces like print does.
+    Records in a category that isn't enabled are dropped as they're added."""
+
+    def __init__(self,capacity:int=1000,categories:tuple[str,...]=logCategory.all) -> None:
+        self.capacity:int=capacity
+        self.enabled:set[str]=set(categories)
+        self.count:int=0 # the number of records added so far, including any that have been overwritten
+        self._records:collections.deque=collections.deque(maxlen=capacity)
+        self._takenCount:int=0 # count when takeNew was last called
+
+    def add(self,category:str,template,*values) -> None:
+        if category in self.enabled:
+            self._records.append((category,template,values))
+            self.count=self.count+1
+
+    def setEnabled(self,category:str,enabled:bool) -> None:
+        if enabled:
+            self.enabled.add(category)
+        else:
+            self.enabled.discard(category)
+
+    @staticmethod
+    def formatRecord(record:tuple[str,object,tuple]) -> str:
+        category, template, values = record
+        if template==None:
+            return " ".join([str(value) for value in values])
+        if callable(template):
+            return template(*values)
+        return template.format(*values)
+
+    def lines(self) -> list[str]:
+        """Returns every record still in the buffer as text, oldest first."""
+        return [self.formatRecord(record) for record in self._records]
+
+    def hasNew(self) -> bool:
+        """Whether records have been added since takeNew was last called."""
+        return self.count!=self._takenCount
+
+    def takeNew(self) -> tuple[list[str],int]:
+        """Returns the records added since the last call as text, oldest first, along with how many of them were overwritten before they could be taken."""
+        newCount:int = self.count-self._takenCount
+        available:int = min(newCount,len(self._records))
+        self._takenCount = self.count
+        records:list[tuple] = list(self._records)[len(self._records)-available:] if available>0 else []
+        return [self.formatRecord(record) for record in records], newCount-available
+
+    def clear(self) -> None:
+        self._records.clear()
+        self._takenCount=self.count
@@ -0,0 +1,27 @@
+import cpu_event_log
+
+def test_add_moreThanCapacity_oldestOverwrittenAndCountedAsMissed():
+    log:cpu_event_log.eventLog = cpu_event_log.eventLog(3)
+    for value in range(5):
+        log.add(cpu_event_log.logCategory.registers,"Register 2 is {}",value)
+    assert log.lines()==["Register 2 is 2","Register 2 is 3","Register 2 is 4"]
+    assert log.takeNew()==(["Register 2 is 2","Register 2 is 3","Register 2 is 4"],2)
+    assert not log.hasNew()
+    log.add(cpu_event_log.logCategory.ram,None,"RAM at",10,"changed")
+    assert log.takeNew()==(["RAM at 10 changed"],0)
+
+def test_add_disabledCategory_dropped():
+    log:cpu_event_log.eventLog = cpu_event_log.eventLog()
+    log.setEnabled(cpu_event_log.logCategory.alu,False)
+    log.add(cpu_event_log.logCategory.alu,"ALU directives {}","000010")
+    log.add(cpu_event_log.logCategory.decode,lambda opcode: "Decoded "+format(opcode,"016b"),60)
+    assert log.lines()==["Decoded 0000000000111100"]
+
+def test_add_recordNeverShown_neverFormatted():
+    log:cpu_event_log.eventLog = cpu_event_log.eventLog(2)
+    def formatShouldNotBeCalled(*values):
+        raise AssertionError("A record that was overwritten got formatted")
+    log.add(cpu_event_log.logCategory.registers,formatShouldNotBeCalled)
+    log.add(cpu_event_log.logCategory.registers,"a")
+    log.add(cpu_event_log.logCategory.registers,"b")
+    assert log.takeNew()==(["a","b"],1)
@@ -0,0 +1,546 @@
+# A basic-block compiler for the cpu simulator.
+# Straight-line runs of machine language in RAM are translated into Python functions that work on integer registers directly.
+
+import collections # used for the least-recently-used cache of compiled blocks
+import numpy # used to check which ALU operations just add a constant
+import types # used to give each translated function a tally of its own
+import cpu_simulator as sim
+
+
+_mask:int=sim.cpuByte._maxVal
+_signBit:int=sim.cpuByte._signBit
+
+
+def usesStandardInstructionSet(theCPU:sim.CPU) -> bool:
+    """The code generator only understands the standard instruction set.  Custom or reordered commands, or standard ones whose action has been replaced, have to go through CPU.run."""
+    if tuple(mlCommand.reMatch for mlCommand in theCPU.mlCommandList)!=tuple(mlCommand.reMatch for mlCommand in theCPU.setupML()):
+        return False
+    return all(mlCommand.action==mlCommand.actWithIntegers for mlCommand in theCPU.mlCommandList)
+
+def cpuRegisters(theCPU:sim.CPU) -> list[sim.cpuByte]:
+    """The CPU's registers, in order."""
+    return [theCPU.register0,theCPU.register1,theCPU.register2,theCPU.register3,theCPU.register4,theCPU.register5,theCPU.register6,theCPU.register7]
+
+def readRegisters(theCPU:sim.CPU) -> list[int]:
+    """Returns the CPU's registers as a list of unsigned integers."""
+    return [register.asUnsignedInteger() for register in cpuRegisters(theCPU)]
+
+def writeRegisters(theCPU:sim.CPU,registers:list[int]) -> None:
+    """Copies a list of unsigned integers back into the CPU's registers.  Only the registers that changed are written (and fire their events)."""
+    registerBytes:list[sim.cpuByte] = cpuRegisters(theCPU)
+    for index in range(len(registers)):
+        if registerBytes[index].asUnsignedInteger()!=registers[index]:
+            registerBytes[index].setFromUnsignedInteger(registers[index])
+
+def aluExpression(aluDirectives:int) -> str:
+    """The Python expression for the ALU output given the 6 ALU directive bits (zeroX,negateX,zeroY,negateY,addOrAnd,negateOut), reading r2 and r3."""
+    return sim.ALU.directiveExpression(aluDirectives,"r2","r3")
+
+def _registerExpression(whichRegister:int,nextAddress:int,opcode:int) -> str:
+    """The Python expression for reading a register part way through a block.  Register0 and register1 are constants there."""
+    if whichRegister==0:
+        return str(nextAddress)
+    if whichRegister==1:
+        return str(opcode)
+    return "r"+str(whichRegister)
+
+def _exitLines(nextAddress:str,opcode:int,retired:int,indent:str,jumped:bool=False) -> list[str]:
+    tallyLines:list[str] = [indent+"tally[0] = tally[0]+1"]+([indent+"tally[1] = tally[1]+1"] if jumped else [])
+    return tallyLines+[indent+"registers[:] = ("+nextAddress+", "+str(opcode)+", r2, r3, r4, r5, r6, r7)", indent+"return "+str(retired)]
+
+def blockSource(readOpcode:callable,startAddress:int,functionName:str="block",maxBlockLength:int=64) -> tuple[list[int],str]:
+    """Translates the straight-line run of instructions starting at startAddress into the source of a Python function.
+    readOpcode(address) returns the instruction at an address, or None if it isn't known, in which case the block stops just before it.
+    The function is called as function(registers,load,store) and returns the number of instructions retired.  
+    It counts its own runs in tally[0], and how many of them ended in a taken ALU jump in tally[1].  tally is a default argument, so rebind it (see blockCounts.rebind) to count separately.
+    Returns the addresses of the instructions in the block along with the source."""
+    lines:list[str] = ["def "+functionName+"(registers,load,store,tally=[0,0]):"]
+    for whichRegister in range(2,8):
+        lines.append("    r"+str(whichRegister)+" = registers["+str(whichRegister)+"]")
+    addresses:list[int] = []
+    address:int = startAddress
+    lastOpcode:int = None
+    finished:bool = False
+    while not finished:
+        opcode:int = readOpcode(address)
+        if opcode==None:
+            lines.extend(_exitLines(str(address),lastOpcode,len(addresses),"    "))
+            break
+        addresses.append(address)
+        nextAddress:int = (address+1) & _mask
+        lines.append("    # "+sim.cpuByte.unsignedIntegerToBitString(address)+": "+sim.cpuByte.unsignedIntegerToBitString(opcode))
+        kind:int = opcode & 7
+        if kind==0: # STORE.  The block ends here in case the store rewrote code that comes after it.
+            lines.append("    store(r5,r7)")
+            lines.extend(_exitLines(str(nextAddress),opcode,len(addresses),"    "))
+            finished = True
+        elif kind==1: # LOAD
+            lines.append("    r6 = load(r5)")
+        elif kind==2: # SETLOWBITS
+            lines.append("    r7 = (r7 & "+str(_mask ^ 255)+") | "+str((opcode>>3) & 255))
+        elif kind==3: # SETTOPBITS
+            lines.append("    r7 = (r7 & 255) | "+str(((opcode>>3) & 255)<<8))
+        elif kind==4: # COPY
+            target:int = (opcode>>6) & 7
+            source:str = _registerExpression((opcode>>3) & 7,nextAddress,opcode)
+            if target==0:
+                lines.extend(_exitLines(source,opcode,len(addresses),"    "))
+                finished = True
+            elif target!=1:
+                lines.append("    r"+str(target)+" = "+source)
+        elif kind==5: # ALU
+            lines.append("    r4 = "+aluExpression((opcode>>6) & 63))
+            jumpRegister:int = (opcode>>3) & 7
+            if jumpRegister!=0:
+                jumpIfZero:bool = (opcode & 8192)!=0
+                jumpIfNegative:bool = (opcode & 4096)!=0
+                condition:str = "((r4 & "+str(_signBit)+") "+("!=" if jumpIfNegative else "==")+" 0) and ((r4 & "+str(_signBit-1)+") "+("==" if jumpIfZero else "!=")+" 0)"
+                lines.append("    if "+condition+":")
+                lines.extend(_exitLines(_registerExpression(jumpRegister,nextAddress,opcode),opcode,len(addresses),"        ",True))
+                lines.extend(_exitLines(str(nextAddress),opcode,len(addresses),"    "))
+                finished = True
+        # kinds 6 and 7 are no-ops
+        if (not finished) & ((len(addresses)>=maxBlockLength) | (nextAddress==0)): # a block never wraps round the top of RAM, so register0 can only go backwards at its last instruction
+            lines.extend(_exitLines(str(nextAddress),opcode,len(addresses),"    "))
+            finished = True
+        lastOpcode = opcode
+        address = nextAddress
+    return addresses,"\n".join(lines)+"\n"
+
+
+class compiledBlock:
+    """A convenient bucket to hold one compiled run of machine language instructions."""
+
+    def __init__(self,startAddress:int,addresses:list[int],source:str,function:callable) -> None:
+        self.startAddress:int=startAddress # the RAM address of the first instruction in the block
+        self.addresses:list[int]=addresses # every RAM address the block was compiled from
+        self.length:int=len(addresses) # the number of instructions retired when the block runs to the end
+        self.source:str=source # the generated Python source, kept for debugging
+        self.function:callable=function # function(registers,load,store) -> instructions retired.  It counts its runs in counts.tally.
+        self.opcodes:list[int]=None # the instructions the block was compiled from, filled in by blockJIT.compileBlock
+        self.loopSummaries:dict[tuple[int,...],loopSummary]=dict() # what one pass round the block does, keyed by the values of loopKeyRegisters (None if it isn't a counting loop)
+        self.loopKeyRegisters:list[int]=None # the registers a loop summary of this block treats as constants
+        self.mayBeLoop:bool=False # whether the block has the shape of a counting loop: it ends at an ALU jump and doesn't touch RAM
+        self.counts:blockCounts=None # what running the block adds to the CPU's performance counters, filled in by blockJIT.compileBlock
+
+
+class blockCounts:
+    """What running a compiled block adds to the CPU's performanceCounters.
+    A block always retires every one of its instructions, so everything but whether its closing jump was taken is known when it's compiled.
+    The block's function counts its runs, and its taken jumps, in tally itself."""
+
+    def __init__(self,theCPU:sim.CPU,opcodes:list[int],tally:list[int]) -> None:
+        self.length:int=len(opcodes)
+        self.retiredByCommand:dict[int,int]=dict() # position in mlCommandList -> instructions of that command in the block
+        for opcode in opcodes:
+            commandIndex:int = theCPU.decodeML(opcode)[0]
+            self.retiredByCommand[commandIndex] = self.retiredByCommand.get(commandIndex,0)+1
+        self.loadReads:int=sum(1 for opcode in opcodes if (opcode & 7)==1)
+        self.storeWrites:int=sum(1 for opcode in opcodes if (opcode & 7)==0)
+        self.endsInJump:bool=((opcodes[-1] & 7)==5) and (((opcodes[-1]>>3) & 7)!=0) # an ALU command with a jump register
+        self.tally:list[int]=tally # [runs, closing jumps taken] since the counts were last added in
+
+    @staticmethod
+    def rebind(function:callable) -> tuple[callable,list[int]]:
+        """Returns a copy of a function written by blockSource with a tally of its own, along with that tally."""
+        tally:list[int] = [0,0]
+        return types.FunctionType(function.__code__,function.__globals__,function.__name__,(tally,)),tally
+
+    def addTo(self,theCPU:sim.CPU) -> None:
+        """Adds the runs tallied so far to the CPU's performance counters and starts the tally again from zero."""
+        runs, jumpsTaken = self.tally
+        if runs==0:
+            return
+        counters:sim.performanceCounters = theCPU.counters
+        counters.ticks = counters.ticks+3*self.length*runs
+        counters.fetchReads = counters.fetchReads+self.length*runs
+        counters.loadReads = counters.loadReads+self.loadReads*runs
+        counters.storeWrites = counters.storeWrites+self.storeWrites*runs
+        if self.endsInJump:
+            counters.jumpsTaken = counters.jumpsTaken+jumpsTaken
+            counters.jumpsNotTaken = counters.jumpsNotTaken+runs-jumpsTaken
+        for commandIndex, count in self.retiredByCommand.items():
+            mlCommand:sim.machineLanguageCommand = theCPU.mlCommandList[commandIndex]
+            mlCommand.retiredCount = mlCommand.retiredCount+count*runs
+        self.tally[0] = 0 # in place, since the function holds on to the list
+        self.tally[1] = 0
+
+
+# Loop acceleration.
+# A counting loop is a block that jumps back to its own start, touches nothing but registers, and on each pass either adds a constant to a register, sets it to a constant,
+# or sets it to another counting register plus a constant.  Once a block is known to be one, any number of passes can be worked out at once.
+# Values part way through a pass are tracked as ("c",value) for a known constant or ("r",register,offset) for a register's value at the start of the pass plus offset.
+
+_linearOffsets:dict[tuple,int]=dict() # ALU directives and inputs -> the constant the output adds to the counting register, or None if it doesn't just add one
+
+def _aluOnLinearValues(aluDirectives:int,x:tuple,y:tuple) -> tuple:
+    """The ALU output for inputs x and y, or None if it isn't a constant or a register plus a constant."""
+    if (x==None) or (y==None):
+        return None
+    if (x[0]=="c") and (y[0]=="c"):
+        return ("c",sim.ALU.directiveFunctions[aluDirectives](x[1],y[1]))
+    if (x[0]=="r") and (y[0]=="r") and (x[1]!=y[1]):
+        return None
+    base:int = x[1] if x[0]=="r" else y[1]
+    key:tuple = (aluDirectives,x[0],x[1] if x[0]=="c" else x[2],y[0],y[1] if y[0]=="c" else y[2])
+    if key not in _linearOffsets: # try the operation on every possible value of the register
+        values:numpy.ndarray = numpy.arange(_mask+1,dtype=numpy.int64)
+        X:numpy.ndarray = numpy.full(_mask+1,x[1],dtype=numpy.int64) if x[0]=="c" else values+x[2]
+        Y:numpy.ndarray = numpy.full(_mask+1,y[1],dtype=numpy.int64) if y[0]=="c" else values+y[2]
+        out:numpy.ndarray = sim.ALU.evaluate_batch((X & _mask).astype(numpy.uint16),(Y & _mask).astype(numpy.uint16),aluDirectives)[0]
+        differences:numpy.ndarray = (out.astype(numpy.int64)-values) & _mask
+        _linearOffsets[key] = int(differences[0]) if (differences==differences[0]).all() else None
+    offset:int = _linearOffsets[key]
+    return None if offset==None else ("r",base,offset)
+
+# The register4 values an ALU jump with these conditional flags (jump if zero, jump if negative) is taken for, as (lowest, highest)
+_jumpRanges:dict[tuple[bool,bool],tuple[int,int]]={
+    (False,False):(1,_signBit-1),
+    (True,False):(0,0),
+    (False,True):(_signBit+1,_mask),
+    (True,True):(_signBit,_signBit),
+}
+
+
+class loopSummary:
+    """What one pass round a counting loop does, worked out by analyzeLoop.
+    steps holds the amount added to each counting register per pass.  finals holds the value every other register the loop writes ends up with, as ("c",value) or ("r",counting register,offset).
+    The loop exits when the value ("r",exitRegister,exitOffset) is outside exitRange on the loop's last instruction."""
+
+    def __init__(self,length:int,steps:dict[int,int],finals:dict[int,tuple],exitRegister:int,exitOffset:int,exitRange:tuple[int,int],startAddress:int,exitAddress:int,lastOpcode:int) -> None:
+        self.length:int=length
+        self.steps:dict[int,int]=steps
+        self.finals:dict[int,tuple]=finals
+        self.exitRegister:int=exitRegister
+        self.exitOffset:int=exitOffset
+        self.exitRange:tuple[int,int]=exitRange
+        self.startAddress:int=startAddress
+        self.exitAddress:int=exitAddress
+        self.lastOpcode:int=lastOpcode
+
+    def passesLeft(self,registers:list[int]) -> int:
+        """The number of passes, starting from these registers, up to and including the one that falls out of the loop.  None if the loop never ends."""
+        step:int = self.steps[self.exitRegister]
+        if step>=_signBit: # treat the step as a signed number
+            step = step-(_mask+1)
+        value:int = (registers[self.exitRegister]+self.exitOffset) & _mask
+        lowest, highest = self.exitRange
+        if (value<lowest) or (value>highest):
+            return 1
+        if step==0:
+            return None
+        if step>0: # the value climbs out of the top of the range without wrapping back into it
+            return (highest-value)//step+2
+        return (value-lowest)//(-step)+2
+
+    def passesTo(self,registers:list[int],state:tuple[int,...]) -> int:
+        """The number of passes (at least 1), starting from these registers, after which the registers are exactly state, or None if they never are."""
+        if (state[0]!=self.startAddress) or (state[1]!=self.lastOpcode):
+            return None
+        step:int = self.steps[self.exitRegister]
+        distance:int = (state[self.exitRegister]-registers[self.exitRegister]) & _mask
+        if step>=_signBit: # the register counts down
+            step = _mask+1-step
+            distance = (_mask+1-distance) & _mask
+        if (step==0) or (distance==0) or (distance%step!=0):
+            return None
+        passes:int = distance//step
+        after:list[int] = list(registers)
+        self.apply(after,passes)
+        return passes if tuple(after)==state else None
+
+    def apply(self,registers:list[int],passes:int) -> None:
+        """Updates the registers as if the loop had gone round the given number of times (at least 1)."""
+        starting:list[int] = list(registers)
+        for whichRegister, step in self.steps.items():
+            registers[whichRegister] = (starting[whichRegister]+passes*step) & _mask
+        for whichRegister, value in self.finals.items():
+            if value[0]=="c":
+                registers[whichRegister] = value[1]
+            else:
+                registers[whichRegister] = (starting[value[1]]+(passes-1)*self.steps[value[1]]+value[2]) & _mask
+        registers[1] = self.lastOpcode
+        last:int = (starting[self.exitRegister]+(passes-1)*self.steps[self.exitRegister]+self.exitOffset) & _mask
+        registers[0] = self.startAddress if self.exitRange[0]<=last<=self.exitRange[1] else self.exitAddress
+
+def _writtenRegisters(opcodes:list[int]) -> set[int]:
+    written:set[int] = set()
+    for opcode in opcodes:
+        kind:int = opcode & 7
+        if kind==1:
+            written.add(6)
+        elif kind in (2,3):
+            written.add(7)
+        elif (kind==4) and (((opcode>>6) & 7)>1):
+            written.add((opcode>>6) & 7)
+        elif kind==5:
+            written.add(4)
+    return written
+
+def analyzeLoop(block:compiledBlock,registers:list[int]) -> loopSummary:
+    """Works out whether a block that has just jumped back to its own start is a counting loop, given the registers after that pass.  Returns None if it isn't.
+    Registers the block doesn't write keep their values, so they're treated as constants.  So is register7 if it's only loaded with constants, since the pass that just finished left it holding them."""
+    written:set[int] = _writtenRegisters(block.opcodes)
+    for assumedConstant in ([{7},set()] if 7 in written else [set()]):
+        summary:loopSummary = _analyzeLoopPass(block,registers,written-assumedConstant)
+        if summary!=None:
+            return summary
+    return None
+
+def _analyzeLoopPass(block:compiledBlock,registers:list[int],symbolic:set[int]) -> loopSummary:
+    """Follows one pass round the block with the registers in symbolic unknown, and the rest holding their current values.  Those must still hold the same values at the end of the pass."""
+    values:list[tuple] = [None,None]+[("r",whichRegister,0) if whichRegister in symbolic else ("c",registers[whichRegister]) for whichRegister in range(2,8)]
+    opcodes:list[int] = block.opcodes
+    exitValue:tuple = None
+    exitRange:tuple[int,int] = None
+    for index in range(len(opcodes)):
+        opcode:int = opcodes[index]
+        nextAddress:int = (block.addresses[index]+1) & _mask
+        kind:int = opcode & 7
+        if kind in (0,1): # loops that touch RAM aren't counting loops
+            return None
+        elif kind in (2,3): # SETLOWBITS, SETTOPBITS
+            if values[7][0]!="c":
+                return None
+            values[7] = ("c",(values[7][1] & (_mask ^ 255)) | ((opcode>>3) & 255)) if kind==2 else ("c",(values[7][1] & 255) | (((opcode>>3) & 255)<<8))
+        elif kind==4: # COPY
+            target:int = (opcode>>6) & 7
+            source:int = (opcode>>3) & 7
+            if target==0:
+                return None
+            if target!=1:
+                values[target] = ("c",nextAddress) if source==0 else (("c",opcode) if source==1 else values[source])
+        elif kind==5: # ALU
+            values[4] = _aluOnLinearValues((opcode>>6) & 63,values[2],values[3])
+            if values[4]==None:
+                return None
+            jumpRegister:int = (opcode>>3) & 7
+            if jumpRegister!=0:
+                target:tuple = ("c",opcode) if jumpRegister==1 else values[jumpRegister]
+                if (index!=len(opcodes)-1) or (target!=("c",block.startAddress)):
+                    return None
+                exitValue = values[4]
+                exitRange = _jumpRanges[((opcode & 8192)!=0,(opcode & 4096)!=0)]
+    if exitValue==None:
+        return None
+    steps:dict[int,int] = dict()
+    for whichRegister in symbolic:
+        value:tuple = values[whichRegister]
+        if (value!=None) and (value[0]=="r") and (value[1]==whichRegister):
+            steps[whichRegister] = value[2]
+    finals:dict[int,tuple] = dict()
+    for whichRegister in symbolic:
+        value = values[whichRegister]
+        if whichRegister in steps:
+            continue
+        if (value==None) or ((value[0]=="r") and (value[1] not in steps)):
+            return None
+        finals[whichRegister] = value
+    for whichRegister in range(2,8):
+        if (whichRegister not in symbolic) and (values[whichRegister]!=("c",registers[whichRegister])):
+            return None
+    if (exitValue[0]!="r") or (exitValue[1] not in steps):
+        return None
+    return loopSummary(len(opcodes),steps,finals,exitValue[1],exitValue[2],exitRange,block.startAddress,(block.addresses[-1]+1) & _mask,opcodes[-1])
+
+
+class blockJIT:
+    """Runs a CPU by compiling the machine language in its RAM into cached Python functions, one per basic block.
+    A block is a straight-line run of instructions ending at an ALU instruction with a jump register, a COPY into register0 or a STORE.
+    Blocks are cached by start address with least-recently-used eviction, and any write to RAM that a cached block was compiled from throws that block away.
+    Compiled blocks don't fire the CPU's onParseML, onAluCommand or register events.  Registers are written back (firing their events), and the CPU's performance counters brought up to date, when run() returns.
+    With accelerateLoops, a block that turns out to be a counting loop (see analyzeLoop) is gone round as many times as it would go in one step."""
+
+    _maxBlockLength:int=64 # the longest straight-line run we'll compile into one block
+    _minimumPasses:int=4 # loops with fewer passes left than this are cheaper to just run
+
+    def __init__(self,theCPU:sim.CPU,capacity:int=1024,compileThreshold:int=8,accelerateLoops:bool=True) -> None:
+        self.cpu:sim.CPU=theCPU
+        self.accelerateLoops:bool=accelerateLoops
+        self.capacity:int=capacity # the maximum number of compiled blocks to keep
+        self.compileThreshold:int=compileThreshold # how many times execution must reach an address before we compile a block there
+        self._heat:dict[int,int]=dict() # RAM address -> times execution has reached it without a compiled block
+        self._blocks:collections.OrderedDict[int,compiledBlock]=collections.OrderedDict() # compiled blocks by start address, least recently used first
+        self._codeAddresses:dict[int,set[int]]=dict() # RAM address -> start addresses of the cached blocks compiled from it
+        self._forgottenCounts:blockCounts=None # the counts of the block thrown away most recently
+        self.cpu.theRAM.onWriteEvent.setReaction(self,self.reactToRAM)
+
+    def detach(self) -> None:
+        """Stops listening to the CPU's RAM.  The compiled blocks are thrown away."""
+        self.cpu.theRAM.onWriteEvent.removeReaction(self)
+        self.clear()
+
+    def clear(self) -> None:
+        """Throws away every compiled block."""
+        self.addCounts()
+        self._blocks.clear()
+        self._codeAddresses.clear()
+        self._heat.clear()
+
+    def reactToRAM(self,addressAsInt:int,*unused) -> None:
+        """Throws away every cached block compiled from the RAM address that just changed."""
+        for startAddress in self._codeAddresses.pop(addressAsInt,()):
+            self._forgetBlock(startAddress)
+
+    def _forgetBlock(self,startAddress:int) -> None:
+        block:compiledBlock = self._blocks.pop(startAddress,None)
+        if block==None:
+            return
+        block.counts.addTo(self.cpu)
+        if self._forgottenCounts!=None:
+            self._forgottenCounts.addTo(self.cpu)
+        self._forgottenCounts = block.counts # the block may be part way through running, if it just overwrote its own code, so its counts are added in again later
+        for address in block.addresses:
+            startAddresses:set[int] = self._codeAddresses.get(address)
+            if startAddresses==None:
+                continue
+            startAddresses.discard(startAddress)
+            if len(startAddresses)==0:
+                del self._codeAddresses[address]
+
+    def addCounts(self) -> None:
+        """Adds the runs of every cached block to the CPU's performance counters."""
+        for block in self._blocks.values():
+            block.counts.addTo(self.cpu)
+        if self._forgottenCounts!=None:
+            self._forgottenCounts.addTo(self.cpu)
+            self._forgottenCounts = None
+
+    def canCompile(self) -> bool:
+        """The compiler only understands the standard instruction set.  Custom or reordered commands make us fall back to CPU.run."""
+        return usesStandardInstructionSet(self.cpu)
+
+    def getBlock(self,startAddress:int) -> compiledBlock:
+        """Returns the compiled block starting at the RAM address, compiling it if it isn't cached."""
+        block:compiledBlock = self._blocks.get(startAddress)
+        if block!=None:
+            self._blocks.move_to_end(startAddress)
+            return block
+        block = self.compileBlock(startAddress)
+        self._blocks[startAddress] = block
+        for address in block.addresses:
+            self._codeAddresses.setdefault(address,set()).add(startAddress)
+        while len(self._blocks)>self.capacity:
+            self._forgetBlock(next(iter(self._blocks)))
+        return block
+
+    def run(self,max_instructions:int) -> tuple[int,str]:
+        """Executes up to max_instructions whole instructions and returns the number retired along with the stopReason, just like CPU.run.
+        The CPU's loop detector sees the same states CPU.run would show it, so a stuck program halts after the same instruction."""
+        theCPU:sim.CPU=self.cpu
+        retired:int=0
+        if (theCPU.theClock!=2) & (max_instructions>0):
+            retired,unused = theCPU.run(1) # finish off the instruction that's part way through its ticks
+        if (not self.canCompile()) or theCPU.needsInterpreter(): # compiled code doesn't record traces or stop at breakpoints
+            moreRetired,reason = theCPU.run(max_instructions-retired)
+            return retired+moreRetired,reason
+
+        registers:list[int] = readRegisters(theCPU)
+        theRAM:sim.RAM = theCPU.theRAM
+        load:callable = theRAM.getValueUsingIntegerAddress
+        store:callable = theRAM.setUsingUnsignedIntegerAddressAndValue
+        blocks:collections.OrderedDict[int,compiledBlock] = self._blocks
+        heat:dict[int,int] = self._heat
+        loops:sim.loopDetector = theCPU.loops
+        reason:str = sim.stopReason.limit
+        try:
+            while retired<max_instructions:
+                startAddress:int = registers[0]
+                block:compiledBlock = blocks.get(startAddress)
+                if block==None:
+                    timesSeen:int = heat.get(startAddress,0)+1
+                    if timesSeen<self.compileThreshold: # cold code is cheaper to interpret than to compile
+                        heat[startAddress] = timesSeen
+                        writeRegisters(theCPU,registers)
+                        unused, reason = theCPU.run(1)
+                        retired = retired+1
+                        register0:sim.cpuByte = theCPU.register0
+                        while (retired<max_instructions) & (reason==sim.stopReason.limit) & (register0._value not in blocks): # keep interpreting until we're back in compiled code or the code gets hot
+                            timesSeen = heat.get(register0._value,0)+1
+                            if timesSeen>=self.compileThreshold:
+                                break
+                            heat[register0._value] = timesSeen
+                            unused, reason = theCPU.run(1)
+                            retired = retired+1
+                        registers = readRegisters(theCPU)
+                        if reason==sim.stopReason.halted:
+                            return retired,reason
+                        continue
+                    heat.pop(startAddress,None)
+                    block = self.getBlock(startAddress)
+                else:
+                    blocks.move_to_end(startAddress)
+                if block.length>max_instructions-retired:
+                    break # the block would overshoot the limit, so the interpreter finishes the job
+                retired = retired+block.function(registers,load,store)
+                if registers[0]<startAddress+block.length: # a backward jump from the block's last instruction, which is where CPU.run would look for a loop
+                    if (loops!=None) and loops.check(tuple(registers),theRAM.writeCount):
+                        writeRegisters(theCPU,registers)
+                        return retired,sim.stopReason.halted
+                    if (registers[0]==startAddress) and block.mayBeLoop and self.accelerateLoops:
+                        forwarded, halted = self.fastForward(block,registers,max_instructions-retired,loops)
+                        retired = retired+forwarded
+                        if halted:
+                            writeRegisters(theCPU,registers)
+                            return retired,sim.stopReason.halted
+        finally:
+            self.addCounts()
+        writeRegisters(theCPU,registers)
+
+        moreRetired,reason = theCPU.run(max_instructions-retired)
+        return retired+moreRetired,reason
+
+    def fastForward(self,block:compiledBlock,registers:list[int],max_instructions:int,loops:sim.loopDetector=None) -> tuple[int,bool]:
+        """If the block, which has just jumped back to its own start, is a counting loop, updates the registers as if it had gone round as many more times as it would (within max_instructions).
+        Returns the number of instructions retired, which is 0 if the block isn't a counting loop or doesn't have enough passes left to be worth it, and whether loops caught the CPU in a loop.
+        The loop detector is shown every pass that jumps back, just as CPU.run would show it, so it stops at the same pass.  Loops that never end are left for it to watch go round one pass at a time."""
+        if block.loopKeyRegisters==None:
+            block.loopKeyRegisters = [whichRegister for whichRegister in range(2,8) if whichRegister not in _writtenRegisters(block.opcodes)-{7}]
+        key:tuple[int,...] = tuple([registers[whichRegister] for whichRegister in block.loopKeyRegisters]) # a summary only depends on the registers it treats as constants
+        if key in block.loopSummaries:
+            summary:loopSummary = block.loopSummaries[key]
+        else:
+            if len(block.loopSummaries)>=16: # the constants keep changing, so don't let the summaries pile up
+                block.loopSummaries.clear()
+            summary = analyzeLoop(block,registers)
+            block.loopSummaries[key] = summary
+        if summary==None:
+            return 0,False
+        passes:int = summary.passesLeft(registers)
+        if (passes==None) and (loops!=None):
+            return 0,False
+        if (passes==None) or (passes*summary.length>max_instructions):
+            passes = max_instructions//summary.length
+        if passes<self._minimumPasses:
+            return 0,False
+        halted:bool = False
+        if loops!=None:
+            starting:tuple[int,...] = tuple(registers)
+            def stateAt(index:int) -> tuple[int,...]:
+                after:list[int] = list(starting)
+                summary.apply(after,index+1)
+                return tuple(after)
+            def indexOf(state:tuple[int,...]) -> int:
+                passesTo:int = summary.passesTo(list(starting),state)
+                return None if passesTo==None else passesTo-1
+            jumpedBack:int = passes if stateAt(passes-1)[0]==block.startAddress else passes-1 # the last pass may fall out of the loop instead
+            caught:int = loops.checkMany(jumpedBack,stateAt,indexOf,self.cpu.theRAM.writeCount)
+            if caught!=None:
+                passes = caught+1
+                halted = True
+        summary.apply(registers,passes)
+        tally:list[int] = block.counts.tally
+        tally[0] = tally[0]+passes
+        tally[1] = tally[1]+passes-(0 if registers[0]==block.startAddress else 1) # every pass jumped back round except, maybe, the last
+        return passes*summary.length,halted
+
+    def compileBlock(self,startAddress:int) -> compiledBlock:
+        """Translates the straight-line run of instructions starting at the RAM address into a Python function."""
+        addresses, source = blockSource(self.cpu.theRAM.getValueUsingIntegerAddress,startAddress,maxBlockLength=self._maxBlockLength)
+        namespace:dict = dict()
+        exec(compile(source,"<block "+sim.cpuByte.unsignedIntegerToBitString(startAddress)+">","exec"),namespace)
+        block:compiledBlock = compiledBlock(startAddress,addresses,source,namespace["block"])
+        block.opcodes = [self.cpu.theRAM.getValueUsingIntegerAddress(address) for address in addresses]
+        block.mayBeLoop = ((block.opcodes[-1] & 7)==5) and (((block.opcodes[-1]>>3) & 7)!=0) and all((opcode & 7)>1 for opcode in block.opcodes)
+        block.counts = blockCounts(self.cpu,block.opcodes,block.function.__defaults__[0])
+        return block
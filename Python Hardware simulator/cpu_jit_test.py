@@ -0,0 +1,226 @@
+import random
+import cpu_simulator
+import cpu_jit
+import pytest
+from cpu_test_helpers import countdownProgram, loadProgram, assertSameState
+
+def test_blockJIT_countdown_sameStateAsRun():
+    interpretedCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(interpretedCpu,countdownProgram)
+    interpretedCpu.run(1000)
+
+    jitCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(jitCpu,countdownProgram)
+    retired, reason = cpu_jit.blockJIT(jitCpu).run(1000)
+
+    assert retired==1000
+    assert reason==cpu_simulator.stopReason.limit
+    assertSameState(interpretedCpu,jitCpu,32)
+
+def test_blockJIT_randomPrograms_sameStateAsRun():
+    generator:random.Random = random.Random(1234)
+    for trial in range(10):
+        mask:int = 0b0000000111111111 if trial%2==0 else 0b1111111111111111 # small literal fields keep jumps and stores near the program, full opcodes cover every ALU directive
+        program:list[str] = [cpu_simulator.cpuByte.unsignedIntegerToBitString(generator.getrandbits(16) & mask) for i in range(64)]
+        interpretedCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+        loadProgram(interpretedCpu,program)
+        interpretedCpu.run(500)
+
+        jitCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+        loadProgram(jitCpu,program)
+        cpu_jit.blockJIT(jitCpu,compileThreshold=1).run(500)
+
+        assertSameState(interpretedCpu,jitCpu,512)
+        assert jitCpu.counters.snapshot()==interpretedCpu.counters.snapshot()
+
+def test_blockJIT_storeIntoCompiledCode_blockRecompiled():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,countdownProgram)
+    jit:cpu_jit.blockJIT = cpu_jit.blockJIT(theCpu,compileThreshold=1)
+    jit.run(20)
+    loopBlock:cpu_jit.compiledBlock = jit.getBlock(8)
+
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndBitStringValue(9,"0000000000000110") # replace "COPY R4 R2" with a no-op
+    assert jit.getBlock(8) is not loopBlock
+
+def test_blockJIT_loadValuesIntoCompiledCode_blockRecompiledWithoutBitStrings(monkeypatch):
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,countdownProgram)
+    jit:cpu_jit.blockJIT = cpu_jit.blockJIT(theCpu,compileThreshold=1)
+    jit.run(20)
+    loopBlock:cpu_jit.compiledBlock = jit.getBlock(8)
+    def toStringShouldNotBeCalled(*args):
+        raise AssertionError("A bit string was built for the JIT")
+    monkeypatch.setattr(cpu_simulator.cpuByte,"unsignedIntegerToBitString",toStringShouldNotBeCalled)
+    theCpu.theRAM.loadValues(9,[0b0000000000000110]) # replace "COPY R4 R2" with a no-op, a page at a time
+    monkeypatch.undo()
+    assert jit.getBlock(8) is not loopBlock
+
+def test_blockJIT_codePatchedThroughRamView_sameStateAsRun():
+    program:list[str] = [
+        "0000000000001010", # SETLOWBITS 00000001
+        "0000000010111100", # COPY R7 R2
+        "0000000000000010", # SETLOWBITS 00000000
+        "0000000000111100", # COPY R7 R0
+    ]
+    interpretedCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    jitCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    jit:cpu_jit.blockJIT = cpu_jit.blockJIT(jitCpu,compileThreshold=1)
+    for theCpu, runner in [(interpretedCpu,interpretedCpu),(jitCpu,jit)]:
+        loadProgram(theCpu,program)
+        runner.run(40)
+        theCpu.theRAM.getUsingIntegerAddress(0).setFromUnsignedInteger(0b0000000001001010) # SETLOWBITS 00001001, written through the view
+        runner.run(4)
+    assert jitCpu.register2.asUnsignedInteger()==9
+    assertSameState(interpretedCpu,jitCpu,len(program))
+
+def test_blockJIT_capacityReached_leastRecentlyUsedEvicted():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,countdownProgram)
+    jit:cpu_jit.blockJIT = cpu_jit.blockJIT(theCpu,capacity=2)
+    jit.getBlock(0)
+    jit.getBlock(8)
+    jit.getBlock(0) # block 0 is now the most recently used
+    jit.getBlock(11)
+    assert list(jit._blocks.keys())==[0,11]
+
+def test_blockJIT_customInstructionSet_fallsBackToInterpreter():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    customCommand:cpu_simulator.machineLanguageCommand=cpu_simulator.machineLanguageCommand()
+    customCommand.reMatch="1{16}"
+    customCommand.description="Sets register2 to all ones."
+    customCommand.action=lambda unused : theCpu.register2.fromString("1111111111111111")
+    theCpu.mlCommandList.insert(0,customCommand)
+    loadProgram(theCpu,["1111111111111111"])
+
+    jit:cpu_jit.blockJIT = cpu_jit.blockJIT(theCpu)
+    assert not jit.canCompile()
+    jit.run(1)
+    assert theCpu.register2.toString()=="1111111111111111"
+
+def test_blockJIT_standardActionReplaced_fallsBackToInterpreter():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    theCpu.mlCommandList[6].action=lambda unused : theCpu.register2.fromString("1111111111111111") # NOOP110
+    loadProgram(theCpu,["0000000000000110"])
+
+    jit:cpu_jit.blockJIT = cpu_jit.blockJIT(theCpu)
+    assert not jit.canCompile()
+    jit.run(1)
+    assert theCpu.register2.toString()=="1111111111111111"
+
+def test_blockJIT_breakpointArmed_stopsLikeRun():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,countdownProgram)
+    theCpu.addBreakpoint(11)
+    retired, reason = cpu_jit.blockJIT(theCpu,compileThreshold=1).run(1000)
+    assert reason==cpu_simulator.stopReason.breakpoint
+    assert theCpu.register2.asUnsignedInteger()==0
+
+def test_blockJIT_loopDetection_haltsLikeRun():
+    interpretedCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(interpretedCpu,countdownProgram)
+    interpretedCpu.startLoopDetection()
+    expected:tuple[int,str] = interpretedCpu.run(100000)
+
+    jitCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(jitCpu,countdownProgram)
+    jitCpu.startLoopDetection()
+    assert cpu_jit.blockJIT(jitCpu,compileThreshold=1).run(100000)==expected
+    assert expected[1]==cpu_simulator.stopReason.halted
+    assertSameState(interpretedCpu,jitCpu,32)
+
+def test_blockJIT_loopDetection_randomPrograms_haltsAtSameInstructionAsRun():
+    generator:random.Random = random.Random(11)
+    for trial in range(40):
+        mask:int = [0b0000000111111111,0b0000000000111111,0b0000011111111111][trial%3] # small literal fields keep jumps near the program, so most of these programs get stuck
+        program:list[str] = [cpu_simulator.cpuByte.unsignedIntegerToBitString(generator.getrandbits(16) & mask) for i in range(48)]
+        interpretedCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+        loadProgram(interpretedCpu,program)
+        interpretedCpu.startLoopDetection()
+        expected:tuple[int,str] = interpretedCpu.run(2000)
+
+        jitCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+        loadProgram(jitCpu,program)
+        jitCpu.startLoopDetection()
+        assert cpu_jit.blockJIT(jitCpu,compileThreshold=4).run(2000)==expected # programs that store into their own code get recompiled over and over at lower thresholds
+        assertSameState(interpretedCpu,jitCpu,64)
+
+# Multiplies 7 by 300 by repeated addition into register5, counting register6 down to zero, then spins in place.
+multiplyProgram:list[str]=[
+    "0000000000001011", # SETTOPBITS 00000001
+    "0000000101100010", # SETLOWBITS 00101100
+    "0000000110111100", # COPY R7 R6
+    "0000000000000011", # SETTOPBITS 00000000
+    "0000000000000010", # SETLOWBITS 00000000
+    "0000000101111100", # COPY R7 R5
+    "0000000001000010", # SETLOWBITS 00001000
+    "0000000111111100", # COPY R7 R7
+    "0000000010101100", # COPY R5 R2
+    "0000000000111010", # SETLOWBITS 00000111
+    "0000000011111100", # COPY R7 R3
+    "0000000010000101", # R2+R3
+    "0000000101100100", # COPY R4 R5
+    "0000000010110100", # COPY R6 R2
+    "0000000000001010", # SETLOWBITS 00000001
+    "0000000011111100", # COPY R7 R3
+    "0000010011000101", # R2-R3
+    "0000000110100100", # COPY R4 R6
+    "0000000010100100", # COPY R4 R2
+    "0000000001000010", # SETLOWBITS 00001000
+    "0000001100111101", # ALU 001100 IF 00 JUMP R7
+    "0000000010101010", # SETLOWBITS 00010101
+    "0000000000111100", # COPY R7 R0
+]
+
+def test_blockJIT_countingLoops_fastForwardedToSameStateAsRun():
+    for program in [countdownProgram,multiplyProgram]:
+        for max_instructions in [50,1000,3912,3913,3914,5000]: # including limits part way round the loop and just as it exits
+            interpretedCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+            loadProgram(interpretedCpu,program)
+            interpretedCpu.run(max_instructions)
+
+            jitCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+            loadProgram(jitCpu,program)
+            jit:cpu_jit.blockJIT = cpu_jit.blockJIT(jitCpu,compileThreshold=1)
+            assert jit.run(max_instructions)==(max_instructions,cpu_simulator.stopReason.limit)
+            assertSameState(interpretedCpu,jitCpu,32)
+            assert jitCpu.counters.snapshot()==interpretedCpu.counters.snapshot()
+            assert list(jit._blocks[8].loopSummaries.values())[0]!=None
+    assert jitCpu.register5.asUnsignedInteger()==2100
+
+def test_blockJIT_loopDetectionWithFastForward_haltsAtSameInstructionAsRun():
+    for program in [countdownProgram,multiplyProgram]:
+        interpretedCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+        loadProgram(interpretedCpu,program)
+        interpretedCpu.startLoopDetection()
+        expected:tuple[int,str] = interpretedCpu.run(100000)
+
+        jitCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+        loadProgram(jitCpu,program)
+        loops:cpu_simulator.loopDetector = jitCpu.startLoopDetection()
+        jit:cpu_jit.blockJIT = cpu_jit.blockJIT(jitCpu,compileThreshold=1)
+        assert jit.run(100000)==expected
+        assert list(jit._blocks[8].loopSummaries.values())[0]!=None # the counting loop was fast-forwarded
+        assertSameState(interpretedCpu,jitCpu,32)
+        assert loops._seen==interpretedCpu.loops._seen
+
+def test_analyzeLoop_doublingLoop_notACountingLoop():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,[
+        "0000000001000010", # SETLOWBITS 00001000
+        "0000000110111100", # COPY R7 R6
+        "0000000000001010", # SETLOWBITS 00000001
+        "0000000010111100", # COPY R7 R2
+        "0000000000000110", # no-op
+        "0000000000000110", # no-op
+        "0000000000000110", # no-op
+        "0000000000000110", # no-op
+        "0000000011010100", # COPY R2 R3
+        "0000000010000101", # R2+R3
+        "0000000010100100", # COPY R4 R2
+        "0000001100110101", # ALU 001100 IF 00 JUMP R6
+    ])
+    jit:cpu_jit.blockJIT = cpu_jit.blockJIT(theCpu,compileThreshold=1)
+    jit.run(100)
+    assert list(jit._blocks[8].loopSummaries.values())==[None] # register2 doubles each time round, which isn't adding a constant
+    assert theCpu.register2.asUnsignedInteger()==32768 # doubling until the value turns negative
@@ -0,0 +1,110 @@
+# Runs one program from the command line, without the GUI.
+# An assembly (.asm) or binary file is loaded into RAM, run on the fastest engine for up to a set number of instructions, and the final registers, chosen RAM addresses and run statistics are printed as text or JSON.
+
+import argparse
+import json
+import sys
+import time
+import cpu_simulator as sim
+import cpu_jit
+import cpu_run_batch
+import ml_assembler
+import ml_translate_file
+
+engines:tuple[str,...]=("jit","translate","interpret") # the ways a program can be run, fastest first.  translate caches its translations on disk.
+
+
+class runReport:
+    """What came out of runProgram.  ramValues holds the final values of ramAddresses, in the same order.  counters is the CPU's performanceCounters.snapshot()."""
+
+    def __init__(self,engine:str,retired:int,reason:str,seconds:float,registers:list[int],ramAddresses:list[int],ramValues:list[int],counters:dict[str,object]=None) -> None:
+        self.engine:str=engine
+        self.retired:int=retired
+        self.reason:str=reason
+        self.seconds:float=seconds
+        self.instructionsPerSecond:float=retired/seconds if seconds>0 else 0.0
+        self.registers:list[int]=registers
+        self.ramAddresses:list[int]=ramAddresses
+        self.ramValues:list[int]=ramValues
+        self.counters:dict[str,object]=counters
+
+
+def readProgram(programFile:str) -> list[str]:
+    """Reads a program as a list of 16-bit binary strings.  Files ending in .asm are assembled with ml_assembler; anything else is read as a binary image."""
+    if programFile.lower().endswith(".asm"):
+        with open(programFile,'r') as fileReader:
+            return ml_assembler.assembler().compile(fileReader.readlines())
+    return ml_translate_file.readBinaryFile(programFile)
+
+def runProgram(image:list[str],max_instructions:int,startAddress:int=0,registers:list[int]=None,engine:str="jit",detectLoops:bool=False,ramAddresses:list[int]=None) -> runReport:
+    """Loads image at startAddress on a fresh CPU and runs up to max_instructions instructions on the chosen engine.
+    registers optionally gives the starting values of register0, register1, ... as unsigned integers.  By default register0 starts at startAddress.
+    With detectLoops, the run stops (with stopReason.halted) as soon as the program is stuck in a loop it can never leave, which is how most programs for this CPU end."""
+    if engine not in engines:
+        raise ValueError("Unknown engine "+engine+".  Choose one of "+", ".join(engines))
+    theCPU:sim.CPU = sim.CPU()
+    theCPU.theRAM.loadValues(startAddress,[sim.cpuByte.bitStringToUnsignedInt(binary) for binary in image])
+    cpu_jit.writeRegisters(theCPU,[startAddress] if registers==None else registers)
+    if detectLoops:
+        theCPU.startLoopDetection()
+    runner = theCPU
+    if engine=="jit":
+        runner = cpu_jit.blockJIT(theCPU)
+    elif engine=="translate":
+        runner = ml_translate_file.translatedProgram(theCPU,ml_translate_file.loadTranslation(image,startAddress))
+    started:float = time.perf_counter()
+    retired, reason = runner.run(max_instructions)
+    seconds:float = time.perf_counter()-started
+    if runner is not theCPU:
+        runner.detach()
+    ramAddresses = [] if ramAddresses==None else list(ramAddresses)
+    return runReport(engine,retired,reason,seconds,cpu_jit.readRegisters(theCPU),ramAddresses,[theCPU.theRAM.getValueUsingIntegerAddress(address) for address in ramAddresses],theCPU.counters.snapshot())
+
+def formatReport(report:runReport) -> str:
+    """The report as lines of text, with registers and RAM in hex."""
+    lines:list[str] = [
+        str(report.retired)+" instructions ("+report.reason+") in "+format(report.seconds,".3f")+"s, "+format(report.instructionsPerSecond,",.0f")+" instructions/s on the "+report.engine+" engine",
+        "registers "+" ".join(format(value,"04x") for value in report.registers)
+    ]
+    if report.counters!=None:
+        counters:dict[str,object] = report.counters
+        lines.append("loads "+str(counters["loadReads"])+", stores "+str(counters["storeWrites"])+", jumps taken "+str(counters["jumpsTaken"])+" of "+str(counters["jumpsTaken"]+counters["jumpsNotTaken"])+", uninitialized reads "+str(counters["uninitializedReads"]))
+        lines.append("retired by command "+", ".join(name+" "+str(count) for name, count in counters["retiredByCommand"].items()))
+    for address, value in zip(report.ramAddresses,report.ramValues):
+        lines.append("RAM "+format(address,"04x")+" = "+format(value,"04x")+"  "+format(value,"016b"))
+    return "\n".join(lines)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Runs an assembly (.asm) or binary program without the GUI and prints the final registers, chosen RAM addresses and how fast it ran.")
+    parser.add_argument("programFile",help="the program to run.  Files ending in .asm are assembled first.")
+    parser.add_argument("--max-instructions",type=int,default=1000000,help="the most instructions to execute")
+    parser.add_argument("--start-address",type=lambda text: int(text,0),default=0,help="where the program is loaded and starts running")
+    parser.add_argument("--registers",default=None,help="starting values of register0, register1, ..., e.g. 0,0,100")
+    parser.add_argument("--addresses",default="",help="RAM addresses to report, e.g. 0,5,16:32 (ranges exclude their end)")
+    parser.add_argument("--engine",choices=engines,default="jit",help="how to run the program.  jit is the fastest.")
+    parser.add_argument("--detect-loops",action="store_true",help="stop as soon as the program is stuck in a loop it can never leave")
+    parser.add_argument("--json",action="store_true",help="print the report as JSON")
+    arguments = parser.parse_args(argv)
+
+    try:
+        image:list[str] = readProgram(arguments.programFile)
+    except (OSError,RuntimeError) as e:
+        print("Couldn't load "+arguments.programFile+": "+str(e),file=sys.stderr)
+        return 1
+    try:
+        registers:list[int] = None if arguments.registers==None else [int(value,0) for value in arguments.registers.split(",")]
+    except ValueError as e:
+        parser.error("--registers "+arguments.registers+": "+str(e))
+    try:
+        ramAddresses:list[int] = cpu_run_batch.parseAddresses(arguments.addresses)
+    except ValueError as e:
+        parser.error("--addresses "+arguments.addresses+": "+str(e))
+    report:runReport = runProgram(image,arguments.max_instructions,arguments.start_address,registers,arguments.engine,arguments.detect_loops,ramAddresses)
+    if arguments.json:
+        print(json.dumps(vars(report)))
+    else:
+        print(formatReport(report))
+    return 0
+
+if __name__=="__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,186 @@
+# Runs many programs at once on a pool of worker processes.
+# Program images go to the workers, and results come back from them, through shared memory.  Only a few small tuples per job get pickled.
+
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+from multiprocessing import shared_memory
+import numpy
+import cpu_simulator as sim
+import cpu_jit
+import ml_translate_file
+
+_timeoutSlice:int=65536 # how many instructions a job runs between checks of its timeout
+
+
+class batchJob:
+    """One program to run.  image is a list of 16-bit binary strings (or unsigned integers) loaded at startAddress.
+    registers optionally gives the starting values of register0, register1, ... as unsigned integers.  By default register0 starts at startAddress.
+    returnAddresses lists the RAM addresses whose final values are reported.  timeout is in seconds, or None for no limit.
+    With detectLoops, the job stops (with stopReason.halted, and register0 at the loop) as soon as the program is stuck in a loop it can never leave."""
+
+    def __init__(self,image:list,max_instructions:int,registers:list[int]=None,returnAddresses:list[int]=None,startAddress:int=0,timeout:float=None,detectLoops:bool=False) -> None:
+        self.image:list=image
+        self.max_instructions:int=max_instructions
+        self.registers:list[int]=[] if registers==None else list(registers)
+        self.returnAddresses:list[int]=[] if returnAddresses==None else list(returnAddresses)
+        self.startAddress:int=startAddress
+        self.timeout:float=timeout
+        self.detectLoops:bool=detectLoops
+
+
+class batchResult:
+    """What came out of running one batchJob.  jobIndex is the job's position in the list given to run_batch.
+    ramValues holds the final values of the job's returnAddresses, in the same order.  counters is the job's CPU's performanceCounters.snapshot()."""
+
+    def __init__(self,jobIndex:int,retired:int,reason:str,registers:list[int],ramValues:list[int],seconds:float,counters:dict[str,object]=None) -> None:
+        self.jobIndex:int=jobIndex
+        self.retired:int=retired
+        self.reason:str=reason
+        self.registers:list[int]=registers
+        self.ramValues:list[int]=ramValues
+        self.seconds:float=seconds
+        self.counters:dict[str,object]=counters
+
+
+def _imageValues(image:list) -> list[int]:
+    """An image as unsigned integers, whether it was given as binary strings or integers."""
+    return [sim.cpuByte.bitStringToUnsignedInt(value) if isinstance(value,str) else value for value in image]
+
+def _runChunk(imagesName:str,imagesLength:int,resultsName:str,resultsLength:int,chunk:list[tuple]) -> list[tuple[int,int,str,float,dict]]:
+    """Runs a list of jobs in a worker process.  Each job is (jobIndex, image offset, image length, startAddress, registers, max_instructions, timeout, result offset, returnAddresses, detectLoops).
+    Final registers and RAM values are written to the shared results array; the rest of each result is returned as (jobIndex, retired, reason, seconds, performance counters)."""
+    imagesMemory:shared_memory.SharedMemory = shared_memory.SharedMemory(name=imagesName)
+    resultsMemory:shared_memory.SharedMemory = shared_memory.SharedMemory(name=resultsName)
+    try:
+        images:numpy.ndarray = numpy.ndarray((imagesLength,),dtype=numpy.uint16,buffer=imagesMemory.buf)
+        results:numpy.ndarray = numpy.ndarray((resultsLength,),dtype=numpy.uint16,buffer=resultsMemory.buf)
+        finished:list[tuple[int,int,str,float,dict]] = []
+        for jobIndex, imageOffset, imageLength, startAddress, registers, max_instructions, timeout, resultOffset, returnAddresses, detectLoops in chunk:
+            started:float = time.monotonic()
+            theCPU:sim.CPU = sim.CPU()
+            theCPU.theRAM.loadValues(startAddress,images[imageOffset:imageOffset+imageLength])
+            cpu_jit.writeRegisters(theCPU,[startAddress] if len(registers)==0 else registers)
+            if detectLoops:
+                theCPU.startLoopDetection()
+            engine:cpu_jit.blockJIT = cpu_jit.blockJIT(theCPU)
+            retired:int = 0
+            reason:str = sim.stopReason.limit
+            while retired<max_instructions:
+                if (timeout!=None) and (time.monotonic()-started>timeout):
+                    reason = sim.stopReason.timeout
+                    break
+                moreRetired, reason = engine.run(min(_timeoutSlice,max_instructions-retired))
+                retired = retired+moreRetired
+                if reason!=sim.stopReason.limit:
+                    break
+            engine.detach()
+            results[resultOffset:resultOffset+8] = cpu_jit.readRegisters(theCPU)
+            for index in range(len(returnAddresses)):
+                results[resultOffset+8+index] = theCPU.theRAM.getValueUsingIntegerAddress(returnAddresses[index])
+            finished.append((jobIndex,retired,reason,time.monotonic()-started,theCPU.counters.snapshot()))
+        del images, results # the shared memory can't be closed while arrays still point into it
+        return finished
+    finally:
+        imagesMemory.close()
+        resultsMemory.close()
+
+def run_batch(jobs:list[batchJob],workers:int=os.cpu_count(),chunkSize:int=None):
+    """Runs the jobs on a pool of worker processes, yielding a batchResult for each job as soon as its chunk of jobs finishes.  Results arrive in completion order, not job order.
+    Jobs are sent to the workers in chunks of chunkSize, by default enough for about 4 chunks per worker.  With workers<=1 everything runs in this process."""
+    imageOffsets:dict[tuple,tuple[int,int]] = dict() # each distinct image only goes into shared memory once
+    imageParts:list[list[int]] = []
+    imagesLength:int = 0
+    resultsLength:int = 0
+    tasks:list[tuple] = []
+    for jobIndex in range(len(jobs)):
+        job:batchJob = jobs[jobIndex]
+        values:tuple = tuple(_imageValues(job.image))
+        if values not in imageOffsets:
+            imageOffsets[values] = (imagesLength,len(values))
+            imageParts.append(list(values))
+            imagesLength = imagesLength+len(values)
+        imageOffset, imageLength = imageOffsets[values]
+        tasks.append((jobIndex,imageOffset,imageLength,job.startAddress,tuple(job.registers),job.max_instructions,job.timeout,resultsLength,tuple(job.returnAddresses),job.detectLoops))
+        resultsLength = resultsLength+8+len(job.returnAddresses)
+
+    imagesMemory:shared_memory.SharedMemory = shared_memory.SharedMemory(create=True,size=max(2*imagesLength,1))
+    resultsMemory:shared_memory.SharedMemory = shared_memory.SharedMemory(create=True,size=max(2*resultsLength,1))
+    try:
+        images:numpy.ndarray = numpy.ndarray((imagesLength,),dtype=numpy.uint16,buffer=imagesMemory.buf)
+        images[:] = [value for part in imageParts for value in part]
+        del images
+        if chunkSize==None:
+            chunkSize = max(1,len(tasks)//(4*max(workers,1)))
+        chunks:list[list[tuple]] = [tasks[index:index+chunkSize] for index in range(0,len(tasks),chunkSize)]
+        arguments:tuple = (imagesMemory.name,imagesLength,resultsMemory.name,resultsLength)
+
+        def resultsOf(finished:list[tuple[int,int,str,float,dict]]):
+            results:numpy.ndarray = numpy.ndarray((resultsLength,),dtype=numpy.uint16,buffer=resultsMemory.buf)
+            for jobIndex, retired, reason, seconds, counters in finished:
+                resultOffset:int = tasks[jobIndex][7]
+                addressCount:int = len(tasks[jobIndex][8])
+                yield batchResult(jobIndex,retired,reason,results[resultOffset:resultOffset+8].tolist(),results[resultOffset+8:resultOffset+8+addressCount].tolist(),seconds,counters)
+
+        if workers<=1:
+            for chunk in chunks:
+                yield from resultsOf(_runChunk(*arguments,chunk))
+            return
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures:list[concurrent.futures.Future] = [pool.submit(_runChunk,*arguments,chunk) for chunk in chunks]
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    yield from resultsOf(future.result())
+            finally:
+                for future in futures: # if the caller stops early, don't start any more chunks
+                    future.cancel()
+    finally:
+        imagesMemory.close()
+        imagesMemory.unlink()
+        resultsMemory.close()
+        resultsMemory.unlink()
+
+
+def parseAddresses(text:str) -> list[int]:
+    """Parses a comma separated list of RAM addresses and ranges, like 0,5,0x10:32, as used by the --addresses option of the command-line runners.
+    Each address can be written in decimal, or in hex, octal or binary with a 0x, 0o or 0b prefix.  A range start:end includes start but not end.
+    Raises ValueError if a part isn't an address or range, or an address is outside RAM."""
+    addresses:list[int] = []
+    for part in text.split(","):
+        if ":" in part:
+            start, end = part.split(":") # more than one colon is a ValueError too
+            addresses.extend(range(int(start,0),int(end,0)))
+        elif part.strip():
+            addresses.append(int(part,0))
+    for address in addresses:
+        if (address<0) or (address>=sim.RAM._addressCount):
+            raise ValueError("The address "+str(address)+" is outside RAM")
+    return addresses
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Runs binary files (like the ones ml_compile_file.py writes) on every core and prints the results as each one finishes.")
+    parser.add_argument("binaryFiles",nargs="+",help="the binary files to run, one job each")
+    parser.add_argument("--max-instructions",type=int,default=1000000,help="the most instructions each job may execute")
+    parser.add_argument("--start-address",type=lambda text: int(text,0),default=0,help="where each program is loaded and starts running")
+    parser.add_argument("--workers",type=int,default=os.cpu_count(),help="the number of worker processes")
+    parser.add_argument("--addresses",default="",help="RAM addresses to report, e.g. 0,5,16:32")
+    parser.add_argument("--timeout",type=float,default=None,help="the most seconds each job may run")
+    parser.add_argument("--detect-loops",action="store_true",help="stop each job as soon as it's stuck in a loop it can never leave")
+    arguments = parser.parse_args(argv)
+
+    try:
+        returnAddresses:list[int] = parseAddresses(arguments.addresses)
+    except ValueError as e:
+        parser.error("--addresses "+arguments.addresses+": "+str(e))
+    jobs:list[batchJob] = [batchJob(ml_translate_file.readBinaryFile(binaryFile),arguments.max_instructions,returnAddresses=returnAddresses,startAddress=arguments.start_address,timeout=arguments.timeout,detectLoops=arguments.detect_loops) for binaryFile in arguments.binaryFiles]
+    for result in run_batch(jobs,arguments.workers):
+        line:str = arguments.binaryFiles[result.jobIndex]+": "+str(result.retired)+" instructions ("+result.reason+") in "+format(result.seconds,".3f")+"s  registers "+" ".join(format(value,"04x") for value in result.registers)
+        if len(returnAddresses)>0:
+            line = line+"  RAM "+" ".join(format(address,"04x")+"="+format(value,"04x") for address, value in zip(returnAddresses,result.ramValues))
+        print(line)
+    return 0
+
+if __name__=="__main__":
+    sys.exit(main(sys.argv[1:]))
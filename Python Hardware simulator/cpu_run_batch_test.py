@@ -0,0 +1,59 @@
+import cpu_simulator
+import cpu_run_batch
+import pytest
+from cpu_test_helpers import countdownProgram, loadProgram
+
+def expectedState(program:list[str],max_instructions:int,registers:list[int],returnAddresses:list[int]) -> tuple[list[int],list[int]]:
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,program)
+    for index in range(len(registers)):
+        theCpu.getRegister(format(index,"03b")).setFromUnsignedInteger(registers[index])
+    theCpu.run(max_instructions)
+    return [theCpu.getRegister(format(index,"03b")).asUnsignedInteger() for index in range(8)], [theCpu.theRAM.getValueUsingIntegerAddress(address) for address in returnAddresses]
+
+def test_run_batch_workerPool_sameStateAsRun():
+    jobs:list[cpu_run_batch.batchJob] = [cpu_run_batch.batchJob(countdownProgram,50*count,registers=[3,0,count],returnAddresses=[0,8]) for count in range(1,9)]
+    results:list[cpu_run_batch.batchResult] = list(cpu_run_batch.run_batch(jobs,workers=2,chunkSize=3))
+    assert sorted(result.jobIndex for result in results)==list(range(8))
+    for result in results:
+        job:cpu_run_batch.batchJob = jobs[result.jobIndex]
+        registers, ramValues = expectedState(countdownProgram,job.max_instructions,job.registers,job.returnAddresses)
+        assert result.retired==job.max_instructions
+        assert result.reason==cpu_simulator.stopReason.limit
+        assert result.registers==registers
+        assert result.ramValues==ramValues
+        assert result.counters["retired"]==job.max_instructions
+
+def test_run_batch_inProcess_integerImage():
+    image:list[int] = [cpu_simulator.cpuByte.bitStringToUnsignedInt(binary) for binary in countdownProgram]
+    results:list[cpu_run_batch.batchResult] = list(cpu_run_batch.run_batch([cpu_run_batch.batchJob(image,500)],workers=1))
+    assert results[0].registers==expectedState(countdownProgram,500,[],[])[0]
+
+def test_run_batch_timeout_stopsJob():
+    results:list[cpu_run_batch.batchResult] = list(cpu_run_batch.run_batch([cpu_run_batch.batchJob(countdownProgram,10**9,timeout=0)],workers=1))
+    assert results[0].reason==cpu_simulator.stopReason.timeout
+    assert results[0].retired<10**9
+
+def test_parseAddresses_rangesAndSingles():
+    assert cpu_run_batch.parseAddresses("0,5,0x10:0x13")==[0,5,16,17,18]
+
+def test_parseAddresses_notAnAddress_raisesValueError():
+    for text in ["5,x","1:2:3","65536","-1"]:
+        with pytest.raises(ValueError):
+            cpu_run_batch.parseAddresses(text)
+
+def test_run_batch_detectLoops_stopsAtSpinLoop():
+    results:list[cpu_run_batch.batchResult] = list(cpu_run_batch.run_batch([cpu_run_batch.batchJob(countdownProgram,10**9,detectLoops=True)],workers=1))
+    assert results[0].reason==cpu_simulator.stopReason.halted
+    assert results[0].registers[0]==11
+
+def test_run_batch_startAddressNoRegisters_startsAtProgram():
+    results:list[cpu_run_batch.batchResult] = list(cpu_run_batch.run_batch([cpu_run_batch.batchJob(["0000000001010010"],1,startAddress=100)],workers=1)) # SETLOWBITS 00001010
+    assert results[0].registers[0]==101
+    assert results[0].registers[7]==10
+
+def test_main_startAddress_runsProgramThere(tmp_path,capsys):
+    binaryFile = tmp_path/"ten.bin"
+    binaryFile.write_text("0000000001010010\n")
+    assert cpu_run_batch.main([str(binaryFile),"--max-instructions","1","--start-address","0x64","--workers","1"])==0
+    assert "registers 0065 " in capsys.readouterr().out
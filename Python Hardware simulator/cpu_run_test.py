@@ -0,0 +1,45 @@
+import json
+import cpu_simulator
+import cpu_run
+import pytest
+from cpu_test_helpers import countdownProgram, loadProgram
+
+def test_runProgram_everyEngine_sameStateAsRun(tmp_path,monkeypatch):
+    monkeypatch.setattr(cpu_run.ml_translate_file,"defaultCacheDirectory",str(tmp_path))
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,countdownProgram)
+    theCpu.run(500)
+    for engine in cpu_run.engines:
+        report:cpu_run.runReport = cpu_run.runProgram(countdownProgram,500,engine=engine,ramAddresses=[0,1])
+        assert (report.retired,report.reason)==(500,cpu_simulator.stopReason.limit)
+        assert report.registers==[theCpu.getRegister(format(index,"03b")).asUnsignedInteger() for index in range(8)]
+        assert report.ramValues==[3,322]
+        assert report.counters==theCpu.counters.snapshot()
+
+def test_runProgram_startAddressAndDetectLoops_haltsAtSpinLoop():
+    report:cpu_run.runReport = cpu_run.runProgram(countdownProgram[3:],100000,startAddress=3,registers=[3,0,20],detectLoops=True)
+    assert report.reason==cpu_simulator.stopReason.halted
+    assert report.registers[0]==11
+    assert report.registers[2]==0
+
+def test_main_assemblyFile_printsJson(tmp_path,capsys):
+    programFile = tmp_path/"five.asm"
+    programFile.write_text("SETLOWBITS 00000101\nCOPY 111 010\n")
+    assert cpu_run.main([str(programFile),"--max-instructions","2","--addresses","0:2","--json"])==0
+    report:dict = json.loads(capsys.readouterr().out)
+    assert report["retired"]==2
+    assert report["registers"][2]==5
+    assert report["ramAddresses"]==[0,1]
+
+def test_main_badRegistersOrAddresses_reportsUsageError(tmp_path,capsys):
+    programFile = tmp_path/"five.asm"
+    programFile.write_text("SETLOWBITS 00000101\n")
+    for option, value in [("--registers","1,two"),("--addresses","0:x")]:
+        with pytest.raises(SystemExit) as exitInfo:
+            cpu_run.main([str(programFile),option,value])
+        assert exitInfo.value.code==2
+        assert option in capsys.readouterr().err
+
+def test_main_missingFile_returnsError(tmp_path,capsys):
+    assert cpu_run.main([str(tmp_path/"missing.bin")])==1
+    assert "missing.bin" in capsys.readouterr().err
@@ -2,35 +2,50 @@ import typing # used to type the returned groups of regular expressions and list
 import numpy # used for sized arrays
 import re # used to match to machine language commands
 import random # used to randomly assign the starting state of bytes
+import struct # used to pack trace records
+import collections # used for the undo journal
+import weakref # used to forget cpuByte views of RAM that nobody holds any more
+import functools # used to bind decoded operands to command handlers
 
 class event():
-    """A convenient shim class for event management."""
+    """A convenient shim class for event management.
+    Firing an event whose payload is expensive to build should be guarded with hasReactions, so nothing is built when no one is listening."""
 
     def __init__(self) -> None:
         self._dictionaryOfReactions:dict[object,callable]=dict()
+        self._reactions:tuple[callable,...]=() # a snapshot of the reactions, so reactions can subscribe or unsubscribe while the event is firing
+        self.hasReactions:bool=False # cheap check for producers that want to skip building a payload
     
+    def _reactionsChanged(self) -> None:
+        self._reactions=tuple(self._dictionaryOfReactions.values())
+        self.hasReactions=len(self._reactions)>0
+
     def setReaction(self,reactingObject,reaction:callable) -> None:
         self._dictionaryOfReactions[reactingObject]=reaction # we only allow one reaction per event
+        self._reactionsChanged()
     
     def removeReaction(self,reactingObject) -> None:
-        self._dictionaryOfReactions[reactingObject] = None
+        self._dictionaryOfReactions.pop(reactingObject,None)
+        self._reactionsChanged()
     
     def clear(self) -> None:
         self._dictionaryOfReactions.clear()
+        self._reactionsChanged()
 
     def fire(self,*args,**kwArgs) -> None:
-        for reactingObject in self._dictionaryOfReactions.keys():
-            reaction:callable = self._dictionaryOfReactions[reactingObject]
-            if reaction != None:
-                reaction(*args,**kwArgs)
+        for reaction in self._reactions:
+            reaction(*args,**kwArgs)
 
 
 class cpuByte:
-    """The data type to hold a single byte in the simulated hardware. Note that the contents start in an undefined state."""
+    """The data type to hold a single byte in the simulated hardware. Note that the contents start in an undefined state.
+    Internally the byte is held as a single unsigned integer.  The bit string form is only built when someone asks for it."""
 
     # shared class variables
     _size:int = 16 # The number of bits in a byte
     _maxVal:int = (2**_size) - 1 # The maximum unsigned integer value we can store in one of these bytes
+    _signBit:int = 2**(_size-1) # The mask for the highest (sign) bit of a byte
+    _bitStringFormat:str = "0"+str(_size)+"b" # The format specifier that turns an unsigned integer into a bit string
 
     @staticmethod
     def isValidBinaryString(val:str) -> bool:
@@ -41,128 +56,242 @@ class cpuByte:
 
     @staticmethod
     def bitStringToUnsignedInt(val:str)->int:
-        valAsInt:int=0
-        multiplier:int=1
-        for position in range(cpuByte._size):
-            reversePos:int = cpuByte._size-position-1 # we have to reverse the order (endianness)
-            aChar:str = val[reversePos]
-            valAsInt = valAsInt+ multiplier if aChar=="1" else 0
-            multiplier = multiplier*2
-        return valAsInt
+        return int(val,2)
     
     @staticmethod
     def unsignedIntegerToBitString(val:int)->str:
-        output:str=""
-        for position in range(cpuByte._size):
-            output= ("1" if val%2==1 else "0")+output
-            val=val//2
-        return output
+        return format(val & cpuByte._maxVal,cpuByte._bitStringFormat)
 
     def __init__(self,randomize:bool=None):
-        self._state:numpy.ndarray=numpy.empty(self._size, dtype=bool)
+        self._value:int=0 # the unsigned integer held by this byte.  The lowest bit of the integer is the rightmost character of the bit string.
         self.onChangeEvent:event=event()
-        if randomize==None:
-            return
-        for i in range(self._size):
-            if not randomize:
-                self._state[i]=False
-            else:
-                self._state[i]=(random.getrandbits(1)==1)
+        if randomize:
+            self._value=random.getrandbits(self._size)
+
+    def _setValue(self,value:int) -> None:
+        """Stores a new unsigned integer value in this byte and alerts other interested parties to the change."""
+        oldValue:int = self._value
+        self._value=value
+        if self.onChangeEvent.hasReactions: # only build the bit strings if someone is listening
+            self.onChangeEvent.fire(self.unsignedIntegerToBitString(oldValue),self.toString()) # alert other interested parties to the change in this byte
+
+    def _bitMask(self,whichBit:int) -> int:
+        """Converts a bit position (counted from the left of the bit string) into an integer mask."""
+        if whichBit<0:
+            whichBit=whichBit+self._size # mimic negative string indexing
+        if (whichBit<0) | (whichBit>=self._size):
+            raise IndexError("Bit position "+str(whichBit)+" is outside of the byte.")
+        return 1<<(self._size-1-whichBit)
 
     def getBit(self,whichBit:int) -> bool:
         """Retrieves the specified bit from this byte"""
-        return (self.toString()[whichBit]=="1")
+        return (self._value & self._bitMask(whichBit))!=0
 
     def setBit(self,whichBit:int,val:bool) -> None:
         """Sets the specified bit from this byte"""
-        self.setBitsFromString(whichBit,"1" if val else "0")
+        mask:int = self._bitMask(whichBit)
+        self._setValue((self._value | mask) if val else (self._value & ~mask))
     
     def setBitsFromString(self,offset:int,bitString:str) -> None:
         """Sets a collection of bits in the cpuByte to match the specified string.  If the bit string is too long or offset is too large, this will (rightly) throw an error."""
-        span:tuple[int,int] = re.fullmatch("[01].*",bitString).span()
-        if len(bitString) != (span[1]-span[0]):
+        if (len(bitString)==0) | (bitString.strip("01")!=""):
             raise Exception("(Partial) bitstrings need to be composed of only 0 and 1.  Incorrect value: "+bitString)
-        oldValue:str = self.toString()
-        newValue:str = oldValue[0:offset]+bitString
-        newValue=newValue+oldValue[len(newValue):self._size] # this will rightly throw an error if the size of old value was somehow wrong
-        self.fromString(newValue)
+        shift:int = self._size-offset-len(bitString) # how far the bit string must be moved left to line up with the offset
+        if (offset<0) | (shift<0):
+            raise Exception("The bit string "+bitString+" doesn't fit into a byte at offset "+str(offset))
+        mask:int = ((1<<len(bitString))-1)<<shift
+        self._setValue((self._value & ~mask) | (int(bitString,2)<<shift))
 
     def asUnsignedInteger(self) -> int:
-        returnable:int=0
-        position:int=0
-        for aBool in self._state:
-            if aBool==True:
-                returnable = returnable + 2**position
-            position += 1
-        return returnable
+        return self._value
     
     def asSignedInteger(self) -> int:
-        returnable:int=0
-        for position in range(cpuByte._size-1):
-            aBool=self._state[position]
-            if aBool==True:
-                returnable = returnable + 2**position
-        if self._state[cpuByte._size-1]:
+        returnable:int=self._value & (self._signBit-1)
+        if self._value & self._signBit:
             returnable=returnable*(-1)
         return returnable
     
     def setFromUnsignedInteger(self,value:int) -> None:
         """Resets the value of this byte so it matches the unsigned value of the integer."""
-        oldValue:str = self.toString()
-        for position in range(cpuByte._size):
-            self._state[position]=(value % 2 == 1)
-            value=value//2
-        newValue:str = self.toString()
-        self.onChangeEvent.fire(oldValue,newValue) # alert other interested parties to the change in this byte
+        self._setValue(value & cpuByte._maxVal) # note that we don't handle overflows
     
     def setFromSignedInteger(self,value:int) -> None:
         """Resets the value of this byte so it matches the (signed) value of the integer."""
-        oldValue:str = self.toString()
-        for position in range(cpuByte._size-1):
-            self._state=(value % 2 == 1)
-            value=value//2
-        if value<0:
-            self._state[cpuByte._size-1]=True
-        else:
-            self._state[cpuByte._size-1]=False
-        newValue:str = self.toString()
-        self.onChangeEvent.fire(oldValue,newValue) # alert other interested parties to the change in this byte
+        signBit:int = self._signBit if value<0 else 0
+        self._setValue((value & (self._signBit-1)) | signBit)
 
     def toString(self) -> str:
         """Returns the contents of a byte as a string of 1s and 0s."""
-        returnable:str=""
-        for position in range(cpuByte._size):
-            thisBit:str
-            if self._state[position]:
-                thisBit="1"
-            else:
-                thisBit="0"
-            returnable=thisBit+returnable # this reverses the order (endianness)
-        return returnable
+        return format(self._value,self._bitStringFormat)
     
     def fromString(self,val:str) -> None:
         """Converts a string of 0s and 1s into a byte."""
-        oldValue:str = self.toString()
-        for position in range(cpuByte._size):
-            reversePos:int = cpuByte._size-position-1 # we have to reverse the order (endianness)
-            aChar:str = val[reversePos]
-            self._state[position]=(aChar=="1")
-        newValue:str = self.toString()
-        self.onChangeEvent.fire(oldValue,newValue) # alert other interested parties to the change in this byte
+        if len(val)<cpuByte._size:
+            raise IndexError("The bit string "+val+" is too short to fill a byte.")
+        self._setValue(int(val[0:cpuByte._size],2))
+
+
+class ramByte(cpuByte):
+    """A cpuByte that is a view onto one RAM address.  Reading or writing it reads or writes the RAM directly.
+    Writes go through RAM.setUsingUnsignedIntegerAddressAndValue, so they fire the RAM's events just like any other write."""
+
+    def __init__(self,theRAM:"RAM",addressAsInt:int):
+        self._ram:RAM=theRAM
+        self._address:int=addressAsInt
+        self.onChangeEvent:event=event()
+
+    @property
+    def _value(self) -> int:
+        return self._ram._valueViews[self._address>>RAM._pageBits][self._address & RAM._offsetMask]
+
+    @_value.setter
+    def _value(self,value:int) -> None:
+        self._ram.setUsingUnsignedIntegerAddressAndValue(self._address,value)
+
+    def _setValue(self,value:int) -> None:
+        self._ram.setUsingUnsignedIntegerAddressAndValue(self._address,value) # which also fires this view's onChangeEvent
 
 
 class RAM:
-    """This class will hold the RAM for the simulated hardware"""
+    """This class will hold the RAM for the simulated hardware.
+    The contents are split into pages of 256 words.  Each page is a numpy uint16 array, plus a bitmap recording which addresses have been initialized.  
+    Pages are shared copy-on-write: a new RAM shares one blank page everywhere, fork() shares every page with the fork, and a page is only copied when it's written.
+    cpuByte views of an address are only made when someone asks for one, and are only kept while someone holds on to them.
+    Random starting values come from a numpy generator seeded with seed, so a seeded RAM is reproducible.  A pattern, if given, is repeated across the whole RAM instead."""
     _addressCount:int=2**cpuByte._size # the number of addresses in the RAM
+    _pageBits:int=8 # an address is a page number followed by this many bits of offset into the page
+    _pageSize:int=2**_pageBits # the number of words in a page
+    _offsetMask:int=_pageSize-1 # the mask that picks the offset into a page out of an address
+    _pageCount:int=_addressCount//_pageSize # the number of pages in the RAM
 
-    def __init__(self,randomize:bool=None):
-        self._state:numpy.ndarray=numpy.empty(self._addressCount, dtype=cpuByte) # the array of bytes in the RAM
+    def __init__(self,randomize:bool=None,seed:int=None,pattern:typing.Sequence[int]=None):
+        blankValues:numpy.ndarray=numpy.zeros(self._pageSize, dtype=numpy.uint16)
+        blankInitialized:numpy.ndarray=numpy.zeros(self._pageSize, dtype=bool)
+        self._valuePages:list[numpy.ndarray]=[blankValues]*self._pageCount # the contents of the RAM, one array per page
+        self._initializedPages:list[numpy.ndarray]=[blankInitialized]*self._pageCount # which addresses hold a defined value
+        self._valueViews:list[memoryview]=[memoryview(blankValues)]*self._pageCount # reading single values through a memoryview is much faster than indexing numpy
+        self._initializedViews:list[memoryview]=[memoryview(blankInitialized)]*self._pageCount
+        self._pageIsShared:list[bool]=[True]*self._pageCount # whether each page might also be in use by another RAM (or by another page), and so has to be copied before it's written
+        self._ramBytes:weakref.WeakValueDictionary[int,ramByte]=weakref.WeakValueDictionary() # the cpuByte views still held by someone, by address.  A view nobody holds is forgotten, along with any reactions on its onChangeEvent.
         self.onChangeEvent:event=event() # we'll fire this event whenever the RAM is changed.
+        self.onWriteEvent:event=event() # a cheaper event for the same changes, fired with the address, the old value and the new value as unsigned integers
+        self.uninitializedReads:int=0 # the number of times an address was read before anything initialized it
+        self.writeCount:int=0 # the number of writes so far.  If it hasn't changed, neither has the RAM.
+        self.changes:changeTracker=None # collects the addresses written, once trackChanges() is called
         self._randomizeInitialBytes:bool=randomize # whether we randomize the values of RAM on construction
+        self._seed:int=seed
+        self._generator:numpy.random.Generator=None # made the first time a random value is needed
+        if pattern!=None:
+            self._fillAllPages(numpy.resize(numpy.asarray(pattern,dtype=numpy.int64) & cpuByte._maxVal,self._addressCount))
+            return
         if randomize==None:
             return # if we're not explicitly told to randomize or not, then we won't set the initial state of the RAM.  This can lead to exciting errors later.
-        for address in range(self._addressCount):
-            self.initializeRamByteIfNecessary(address,randomize)
+        self._fillAllPages(self._randomValues(self._addressCount) if randomize else numpy.zeros(self._addressCount,dtype=numpy.uint16)) # nothing is initialized yet, so the whole RAM can be filled at once
+
+    def fork(self) -> "RAM":
+        """Returns a new RAM with the same contents as this one.  The two share every page until one of them writes to it, so forking is cheap.
+        The fork doesn't copy this RAM's event reactions or cpuByte views."""
+        theFork:RAM = RAM()
+        theFork._randomizeInitialBytes = self._randomizeInitialBytes
+        theFork._seed = self._seed
+        if self._generator!=None: # the fork draws the same random values this RAM would have
+            theFork._generator = numpy.random.default_rng()
+            theFork._generator.bit_generator.state = self._generator.bit_generator.state
+        theFork._valuePages = list(self._valuePages)
+        theFork._initializedPages = list(self._initializedPages)
+        theFork._valueViews = list(self._valueViews)
+        theFork._initializedViews = list(self._initializedViews)
+        self._pageIsShared = [True]*self._pageCount # from now on, both sides copy a page before writing it
+        return theFork
+
+    def restoreFrom(self,other:"RAM") -> None:
+        """Writes every address that differs from another RAM (typically an earlier fork of this one) back to the other RAM's value.
+        Pages the two still share are skipped without being compared.  The writes go through setUsingUnsignedIntegerAddressAndValue, so events fire as usual."""
+        for pageNumber in range(self._pageCount):
+            if self._valuePages[pageNumber] is other._valuePages[pageNumber]:
+                continue
+            otherValues:numpy.ndarray = other._valuePages[pageNumber]
+            for offset in numpy.flatnonzero(self._valuePages[pageNumber]!=otherValues).tolist():
+                self.setUsingUnsignedIntegerAddressAndValue(pageNumber*self._pageSize+offset,int(otherValues[offset]))
+
+    def trackChanges(self) -> "changeTracker":
+        """Starts collecting the addresses written to this RAM, so a display can redraw only what changed.  Returns the tracker, which is also kept in self.changes."""
+        self.changes=changeTracker()
+        return self.changes
+
+    def stopTrackingChanges(self) -> "changeTracker":
+        """Stops collecting written addresses.  Returns the tracker, so anything it still holds can be collected."""
+        tracker:changeTracker=self.changes
+        self.changes=None
+        return tracker
+
+    def _randomValues(self,count:int) -> numpy.ndarray:
+        """Draws count random starting values."""
+        if self._generator==None:
+            self._generator = numpy.random.default_rng(self._seed)
+        return self._generator.integers(0,cpuByte._maxVal+1,size=count,dtype=numpy.uint16)
+
+    def _fillAllPages(self,values:numpy.ndarray) -> None:
+        """Replaces the whole contents of the RAM with values (one per address), marking every address initialized.  Events don't fire."""
+        valuePages:numpy.ndarray = numpy.asarray(values,dtype=numpy.uint16).reshape(self._pageCount,self._pageSize).copy()
+        initializedPages:numpy.ndarray = numpy.ones((self._pageCount,self._pageSize),dtype=bool)
+        self._valuePages = list(valuePages)
+        self._initializedPages = list(initializedPages)
+        self._valueViews = [memoryview(page) for page in self._valuePages]
+        self._initializedViews = [memoryview(page) for page in self._initializedPages]
+        self._pageIsShared = [False]*self._pageCount
+
+    def _writablePage(self,pageNumber:int) -> None:
+        """Gives this RAM its own copy of a page, if the page might be shared, so that it can be written."""
+        if not self._pageIsShared[pageNumber]:
+            return
+        values:numpy.ndarray = self._valuePages[pageNumber].copy()
+        initialized:numpy.ndarray = self._initializedPages[pageNumber].copy()
+        self._valuePages[pageNumber] = values
+        self._initializedPages[pageNumber] = initialized
+        self._valueViews[pageNumber] = memoryview(values)
+        self._initializedViews[pageNumber] = memoryview(initialized)
+        self._pageIsShared[pageNumber] = False
+
+    def _pageSlices(self,starting_address:int,endAddress:int) -> typing.Iterator[tuple[int,int,int]]:
+        """Splits the addresses from starting_address up to (but not including) endAddress into (page number, first offset, end offset) pieces."""
+        address:int = starting_address
+        while address<endAddress:
+            pageNumber:int = address>>self._pageBits
+            pageEnd:int = min(endAddress,(pageNumber+1)*self._pageSize)
+            yield pageNumber, address & self._offsetMask, pageEnd-pageNumber*self._pageSize
+            address = pageEnd
+
+    def _valuesInRange(self,starting_address:int,endAddress:int) -> numpy.ndarray:
+        """Returns a copy of the stored values from starting_address up to (but not including) endAddress.  Addresses that were never initialized hold 0."""
+        return numpy.concatenate([self._valuePages[pageNumber][start:end] for pageNumber, start, end in self._pageSlices(starting_address,endAddress)]+[numpy.zeros(0,dtype=numpy.uint16)])
+
+    def loadValues(self,starting_address:int,values:typing.Sequence[int]) -> None:
+        """Writes a run of unsigned integers into consecutive addresses (wrapping around at the top of RAM), as if each was written with setUsingUnsignedIntegerAddressAndValue.
+        onWriteEvent still fires for every address, but the values are copied a page at a time unless someone needs bit strings or holds a cpuByte view."""
+        values = numpy.asarray(values,dtype=numpy.int64) & cpuByte._maxVal
+        if self.onChangeEvent.hasReactions or (len(self._ramBytes)>0): # someone might be watching, so go one address at a time
+            for offset in range(len(values)):
+                self.setUsingUnsignedIntegerAddressAndValue((starting_address+offset) & cpuByte._maxVal,int(values[offset]))
+            return
+        self.writeCount=self.writeCount+len(values)
+        if self.changes!=None:
+            self.changes.markRange(starting_address,starting_address+len(values))
+        position:int = 0
+        while position<len(values):
+            address:int = (starting_address+position) & cpuByte._maxVal
+            count:int = min(len(values)-position,self._addressCount-address)
+            for pageNumber, start, end in self._pageSlices(address,address+count):
+                self._writablePage(pageNumber)
+                oldValues:list[int] = self._valuePages[pageNumber][start:end].tolist() if self.onWriteEvent.hasReactions else None
+                self._valuePages[pageNumber][start:end] = values[position:position+end-start]
+                self._initializedPages[pageNumber][start:end] = True
+                if oldValues!=None:
+                    pageAddress:int = pageNumber*self._pageSize
+                    newValues:list[int] = self._valuePages[pageNumber][start:end].tolist()
+                    for offset in range(end-start):
+                        self.onWriteEvent.fire(pageAddress+start+offset,oldValues[offset],newValues[offset])
+                position = position+end-start
 
     def SET(self,address:cpuByte,data:cpuByte) -> None:
         addressAsInt:int = address.asUnsignedInteger()
@@ -173,43 +302,92 @@ class RAM:
         return self.getUsingIntegerAddress(addressAsInt)
 
     def getUsingIntegerAddress(self,addressAsInt:int) ->cpuByte:
-        self.initializeRamByteIfNecessary(addressAsInt)
-        return self._state[addressAsInt]
+        if not self._initializedViews[addressAsInt>>self._pageBits][addressAsInt & self._offsetMask]:
+            self.uninitializedReads=self.uninitializedReads+1
+            self.initializeRamByteIfNecessary(addressAsInt)
+        theByte:ramByte = self._ramBytes.get(addressAsInt)
+        if theByte==None:
+            theByte = ramByte(self,addressAsInt)
+            self._ramBytes[addressAsInt] = theByte
+        return theByte
+
+    def getValueUsingIntegerAddress(self,addressAsInt:int) -> int:
+        """Returns the contents of a RAM address as an unsigned integer."""
+        pageNumber:int = addressAsInt>>8 # RAM._pageBits, written out because this is the hottest read in the simulator
+        if not self._initializedViews[pageNumber][addressAsInt & 255]:
+            self.uninitializedReads=self.uninitializedReads+1
+            self.initializeRamByteIfNecessary(addressAsInt)
+        return self._valueViews[pageNumber][addressAsInt & 255]
 
     def setUsingUnsignedIntAsAddress(self,addressAsInt:int,data:cpuByte) -> None:
-        valAsStr:str = data.toString()
-        self.setUsingUnsignedIntegerAddressAndBitStringValue(addressAsInt,valAsStr)
+        self.setUsingUnsignedIntegerAddressAndValue(addressAsInt,data.asUnsignedInteger())
+
+    def setUsingUnsignedIntegerAddressAndValue(self,addressAsInt:int,value:int) -> None:
+        self.initializeRamByteIfNecessary(addressAsInt)
+        pageNumber:int = addressAsInt>>self._pageBits
+        offset:int = addressAsInt & self._offsetMask
+        if self._pageIsShared[pageNumber]:
+            self._writablePage(pageNumber)
+        valueView:memoryview = self._valueViews[pageNumber]
+        oldValue:int = valueView[offset]
+        self.writeCount=self.writeCount+1
+        if self.changes!=None:
+            self.changes.markAddress(addressAsInt)
+        valueView[offset] = value & cpuByte._maxVal
+        theByte:ramByte = self._ramBytes.get(addressAsInt)
+        if (theByte!=None) and theByte.onChangeEvent.hasReactions: # let anyone watching this byte know that it changed
+            theByte.onChangeEvent.fire(cpuByte.unsignedIntegerToBitString(oldValue),cpuByte.unsignedIntegerToBitString(valueView[offset]))
+        if self.onChangeEvent.hasReactions: # only build the bit strings if someone is listening
+            self.onChangeEvent.fire(addressAsInt,cpuByte.unsignedIntegerToBitString(oldValue),cpuByte.unsignedIntegerToBitString(valueView[offset])) # alert other interested parties to the change in this byte
+        if self.onWriteEvent.hasReactions:
+            self.onWriteEvent.fire(addressAsInt,oldValue,valueView[offset])
 
     def setUsingBitStringAddressAndValue(self,addressAsStr:str,valAsStr:str) -> None:
         addressAsInt:int=cpuByte.bitStringToUnsignedInt(addressAsStr)
         self.setUsingUnsignedIntegerAddressAndBitStringValue(addressAsInt,valAsStr)
 
     def setUsingUnsignedIntegerAddressAndBitStringValue(self,addressAsInt:int,valAsStr:str) -> None:
-        self.initializeRamByteIfNecessary(addressAsInt)
-        oldValueByte:cpuByte = self._state[addressAsInt]
-        oldValue:str = None if oldValueByte==None else oldValueByte.toString()
-        self._state[addressAsInt].fromString(valAsStr)
-        newValue:str = self._state[addressAsInt].toString()
-        self.onChangeEvent.fire(addressAsInt,oldValue,newValue) # alert other interested parties to the change in this byte
+        if len(valAsStr)<cpuByte._size:
+            raise IndexError("The bit string "+valAsStr+" is too short to fill a byte.")
+        self.setUsingUnsignedIntegerAddressAndValue(addressAsInt,cpuByte.bitStringToUnsignedInt(valAsStr[0:cpuByte._size]))
 
     @staticmethod
     def unsignedIntegerToBitString(value:int) -> str:
-        returnString=""
-        for position in range(cpuByte._size):
-            returnString=("1" if value%2==1 else "0") + returnString
-            value = value // 2 #integer division
-        return returnString
+        return cpuByte.unsignedIntegerToBitString(value)
 
     def initializeRamByteIfNecessary(self,addressAsInt:int) -> None:
-        if self._state[addressAsInt] == None:
-            self._state[addressAsInt] = cpuByte(self._randomizeInitialBytes)
+        pageNumber:int = addressAsInt>>self._pageBits
+        offset:int = addressAsInt & self._offsetMask
+        if self._initializedViews[pageNumber][offset]:
+            return
+        self._writablePage(pageNumber)
+        self._valueViews[pageNumber][offset] = int(self._randomValues(1)[0]) if self._randomizeInitialBytes else 0
+        self._initializedViews[pageNumber][offset] = True
+
+    def initializeRamRangeIfNecessary(self,starting_address:int,endAddress:int) -> None:
+        """Gives every address from starting_address up to (but not including) endAddress that hasn't been initialized yet its starting value."""
+        for pageNumber, start, end in self._pageSlices(starting_address,endAddress):
+            uninitialized:numpy.ndarray = ~self._initializedPages[pageNumber][start:end]
+            if not uninitialized.any():
+                continue
+            self._writablePage(pageNumber)
+            values:numpy.ndarray = self._valuePages[pageNumber][start:end]
+            if self._randomizeInitialBytes:
+                randomValues:numpy.ndarray = self._randomValues(len(values))
+                values[uninitialized] = randomValues[uninitialized]
+            else:
+                values[uninitialized] = 0
+            self._initializedPages[pageNumber][start:end] = True
+
+    def initializeAllRamBytes(self) -> None:
+        """Gives every address that hasn't been initialized yet its starting value."""
+        self.initializeRamRangeIfNecessary(0,self._addressCount)
     
     def allRAM(self) -> typing.List[str]:
         """Returns a list of all of the RAM values."""
-        returnList:typing.List[str] = []
-        for address in range(self._addressCount):
-            returnList.append(self.getUsingIntegerAddress(address).toString())
-        return returnList
+        self.initializeAllRamBytes()
+        bitStringFormat:str = cpuByte._bitStringFormat
+        return [format(value,bitStringFormat) for value in self._valuesInRange(0,self._addressCount).tolist()]
 
     def ramTable(self,starting_address:int=None,how_many_addresses:int=None) -> typing.List[typing.List[str]]:
         """Returns a table of binary string RAM addresses and binary string values.
@@ -223,12 +401,12 @@ class RAM:
         elif how_many_addresses==None:
             how_many_addresses=1
         endAddress:int=min(self._addressCount,starting_address+how_many_addresses)
+        self.initializeRamRangeIfNecessary(starting_address,endAddress)
+        bitStringFormat:str = cpuByte._bitStringFormat
         returnTable:typing.List[typing.List[str]]=[]
-        for address in range(starting_address,endAddress):
-            thisRow:typing.List[str]=[]
-            thisRow.append(self.unsignedIntegerToBitString(address))
-            thisRow.append(self.getUsingIntegerAddress(address).toString())
-            returnTable.append(thisRow)
+        values:list[int] = self._valuesInRange(starting_address,endAddress).tolist()
+        for offset in range(len(values)):
+            returnTable.append([format(starting_address+offset,bitStringFormat),format(values[offset],bitStringFormat)])
         return returnTable
 
 
@@ -237,8 +415,7 @@ class ALU:
     def AND(X:cpuByte,Y:cpuByte) -> cpuByte:
         """Takes the bitwise AND of two bytes."""
         returnable:cpuByte=cpuByte()
-        for position in range(cpuByte._size):
-            returnable._state[position] = X._state[position] & Y._state[position]
+        returnable._value = X._value & Y._value
         return returnable
 
     @staticmethod
@@ -260,41 +437,37 @@ class ALU:
         returnable:cpuByte=cpuByte()
         carry:bool=False
         result:bool
+        out:int=0
         for position in range(cpuByte._size): # -1,-1,-1
-            xDigit:bool=X._state[position]
-            yDigit:bool=Y._state[position]
+            xDigit:bool=(X._value>>position)&1==1
+            yDigit:bool=(Y._value>>position)&1==1
             result,carry = ALU.addOneDigit(xDigit,yDigit,carry)
-            returnable._state[position]=result
+            if result:
+                out = out | (1<<position)
+        returnable._value=out
         return returnable
 
     @staticmethod
     def negation(X:cpuByte) -> cpuByte:
         """Bitwise negation of a cpuByte"""
         returnable:cpuByte=cpuByte()
-        for position in range(cpuByte._size):
-            returnable._state[position] = not(X._state[position])
+        returnable._value = X._value ^ cpuByte._maxVal
         return returnable
 
     @staticmethod
     def zero() -> cpuByte:
         """Returns the 'zero byte'.  That is to say, it returns the byte that is false in all bits."""
-        returnable:cpuByte=cpuByte()
-        for position in range(cpuByte._size):
-            returnable._state[position] = False
-        return returnable
+        return cpuByte(False)
 
     @staticmethod
     def isZero(X:cpuByte)->bool:
         """Checks if X represents 0 or -0 by checking if all of the bits except the highest bit are FALSE."""
-        for position in range (cpuByte._size-1):
-            if X._state[position]:
-                return False # we've found a single bit where X deviates from 0
-        return True
+        return (X._value & (cpuByte._signBit-1))==0
 
     @staticmethod
     def isNegative(X:cpuByte) -> bool:
         """Checks if the leading (sign) bit is true (making a negative number) or false (making a positive number)."""
-        return X._state[cpuByte._size-1]
+        return (X._value & cpuByte._signBit)!=0
 
     @staticmethod
     def preprocessor(X:cpuByte,zeroX:bool,negateX:bool) -> cpuByte:
@@ -305,33 +478,81 @@ class ALU:
             internalX=ALU.negation(internalX)
         return internalX
 
+    @staticmethod
+    def directiveExpression(aluDirectives:int,xName:str="x",yName:str="y") -> str:
+        """The Python expression for the ALU output given the 6 ALU directive bits as an integer (zeroX,negateX,zeroY,negateY,addOrAnd,negateOut, highest bit first).
+        The expression reads the unsigned integer inputs from the variables named xName and yName."""
+        mask:str = str(cpuByte._maxVal)
+        def preprocessor(name:str,zero:bool,negate:bool) -> str:
+            if zero:
+                return mask if negate else "0"
+            return "("+name+" ^ "+mask+")" if negate else name
+        x:str = preprocessor(xName,(aluDirectives & 32)!=0,(aluDirectives & 16)!=0)
+        y:str = preprocessor(yName,(aluDirectives & 8)!=0,(aluDirectives & 4)!=0)
+        out:str
+        if aluDirectives & 2:
+            out = "(("+x+" + "+y+") & "+mask+")"
+        else:
+            out = "("+x+" & "+y+")"
+        if aluDirectives & 1:
+            out = "("+out+" ^ "+mask+")"
+        return out
+
+    @staticmethod
+    def evaluateUnsigned(x:int,y:int,aluDirectives:str) -> tuple[int,bool,bool]:
+        """The same as evaluate, but on unsigned integers, with the 6 ALU directive bits given as a bit string.  Nothing is allocated."""
+        out:int = ALU.directiveTable[aluDirectives](x,y)
+        return out,(out & cpuByte._signBit)!=0,(out & (cpuByte._signBit-1))==0
+
     @staticmethod
     def evaluate(X:cpuByte,Y:cpuByte,zeroX:bool,negateX:bool,zeroY:bool,negateY:bool,addOrAnd:bool,negateOut:bool) -> tuple[cpuByte,bool,bool]:
         """Simulates the operation of the ALU given the inputs.  Returns a tuple with the following information:
                 1) A byte containing the result of the evaluation
                 2) A bool that copies the highest bit of the result (the "2's complement sign" of the result)
                 3) A bool that says if all of the bits except the highest are FALSE."""
-        internalX:cpuByte = ALU.preprocessor(X,zeroX,negateX)
-        internalY:cpuByte = ALU.preprocessor(Y,zeroY,negateY)
-        out:cpuByte
-        if addOrAnd:
-            out=ALU.ADD(internalX,internalY)
-        else:
-            out=ALU.AND(internalX,internalY)
-        if negateOut:
-            out=ALU.negation(out)
-        outIsNegative:bool = ALU.isNegative(out)
-        outIsZero:bool = ALU.isZero(out)
+        aluDirectives:str = "".join(["1" if flag else "0" for flag in [zeroX,negateX,zeroY,negateY,addOrAnd,negateOut]])
+        value, outIsNegative, outIsZero = ALU.evaluateUnsigned(X._value,Y._value,aluDirectives)
+        out:cpuByte = cpuByte()
+        out._value = value
         return out,outIsNegative,outIsZero
 
+    @staticmethod
+    def evaluate_batch(X:numpy.ndarray,Y:numpy.ndarray,aluDirectives) -> tuple[numpy.ndarray,numpy.ndarray,numpy.ndarray]:
+        """The same as evaluate, but on whole arrays of unsigned 16-bit operands at once.
+        aluDirectives is either one set of directives shared by every element (as a 6-bit string or an integer) or an array holding an integer for each element, highest bit zeroX and lowest bit negateOut.
+        Returns a uint16 array of outputs, a bool array saying which outputs are negative and a bool array saying which are zero."""
+        if isinstance(aluDirectives,str):
+            aluDirectives = cpuByte.bitStringToUnsignedInt(aluDirectives)
+        X = numpy.asarray(X,dtype=numpy.uint16)
+        Y = numpy.asarray(Y,dtype=numpy.uint16)
+        aluDirectives = numpy.asarray(aluDirectives)
+        zero:numpy.uint16 = numpy.uint16(0)
+        X = numpy.where((aluDirectives & 32)!=0,zero,X)
+        X = numpy.where((aluDirectives & 16)!=0,~X,X)
+        Y = numpy.where((aluDirectives & 8)!=0,zero,Y)
+        Y = numpy.where((aluDirectives & 4)!=0,~Y,Y)
+        out:numpy.ndarray = numpy.where((aluDirectives & 2)!=0,X+Y,X & Y) # uint16 addition wraps around just like the hardware
+        out = numpy.where((aluDirectives & 1)!=0,~out,out)
+        outIsNegative:numpy.ndarray = (out & cpuByte._signBit)!=0
+        outIsZero:numpy.ndarray = (out & (cpuByte._signBit-1))==0
+        return out,outIsNegative,outIsZero
+
+# The ALU function for each of the 64 combinations of ALU directives, indexed by the directives as an integer (highest bit zeroX, lowest bit negateOut).
+# Each one is the masked add/and/invert expression from directiveExpression, which gives the same answers as the preprocessor, ADD, AND and negation functions above.
+ALU.directiveFunctions:list[callable] = [eval("lambda x,y: "+ALU.directiveExpression(aluDirectives)) for aluDirectives in range(64)]
+ALU.directiveTable:dict[str,callable] = {format(aluDirectives,"06b"): ALU.directiveFunctions[aluDirectives] for aluDirectives in range(64)} # the same functions, keyed by the 6-bit directive string
+
 
 class machineLanguageCommand:
     """A convenient bucket to hold ML commands for this CPU."""
 
     def __init__(self) -> None:
         self.reMatch:str="" # regular expression matcher
+        self.name:str="" # short name, used to label performance counters
         self.description:str="" # human readable description
         self.action:callable[list[str]] = (lambda aSequenceOfStrings : None) # default to doing no action
+        self.integerAction:callable=None # if set, and action is still actWithIntegers, the CPU calls this with each parsed parameter as an unsigned integer
+        self.retiredCount:int=0 # how many times the CPU has carried out this command since its counters were last reset
 
     def tryStringMatchesCommand(self,mlBinaryString:str) -> typing.Sequence[str]:
         """If the binary string matches this command, the parameter sequence parsed from the binary string will be returned."""
@@ -340,6 +561,326 @@ class machineLanguageCommand:
             return None
         return reResult.groups()
 
+    def actWithIntegers(self,parsedCommandParams:typing.Sequence[str]) -> None:
+        """Calls integerAction with the bit string parameters converted to unsigned integers.  Commands with an integerAction use this as their action."""
+        self.integerAction(*[int(param,2) for param in parsedCommandParams])
+
+    def bind(self,parsedCommandParams:typing.Sequence[str]) -> callable:
+        """Returns a function of no arguments that carries out this command with the parameters parsed from one opcode.
+        For a command with an integerAction, the parameters are converted to unsigned integers here, once.  A command whose action has been replaced carries out that action instead."""
+        if (self.integerAction==None) or (self.action!=self.actWithIntegers):
+            return functools.partial(self.action,parsedCommandParams)
+        return functools.partial(self.integerAction,*[int(param,2) for param in parsedCommandParams])
+
+
+class commandList(list):
+    """The machineLanguageCommands a CPU understands, in the order they're matched.
+    It's an ordinary list, except that any change to it calls onChange, so the CPU can throw away opcodes it decoded with the old commands."""
+
+    def __init__(self,commands:typing.Iterable[machineLanguageCommand]=(),onChange:callable=None) -> None:
+        super().__init__(commands)
+        self.onChange:callable=onChange
+
+    def _changed(self) -> None:
+        if self.onChange!=None:
+            self.onChange()
+
+    def __setitem__(self,index,value) -> None:
+        super().__setitem__(index,value)
+        self._changed()
+
+    def __delitem__(self,index) -> None:
+        super().__delitem__(index)
+        self._changed()
+
+    def __iadd__(self,commands) -> "commandList":
+        super().__iadd__(commands)
+        self._changed()
+        return self
+
+    def __imul__(self,count:int) -> "commandList":
+        super().__imul__(count)
+        self._changed()
+        return self
+
+    def append(self,command:machineLanguageCommand) -> None:
+        super().append(command)
+        self._changed()
+
+    def extend(self,commands:typing.Iterable[machineLanguageCommand]) -> None:
+        super().extend(commands)
+        self._changed()
+
+    def insert(self,index:int,command:machineLanguageCommand) -> None:
+        super().insert(index,command)
+        self._changed()
+
+    def pop(self,index:int=-1) -> machineLanguageCommand:
+        command:machineLanguageCommand = super().pop(index)
+        self._changed()
+        return command
+
+    def remove(self,command:machineLanguageCommand) -> None:
+        super().remove(command)
+        self._changed()
+
+    def clear(self) -> None:
+        super().clear()
+        self._changed()
+
+    def sort(self,*args,**kwargs) -> None:
+        super().sort(*args,**kwargs)
+        self._changed()
+
+    def reverse(self) -> None:
+        super().reverse()
+        self._changed()
+
+
+class stopReason:
+    """The reasons that CPU.run can give for returning."""
+    limit:str="limit" # the requested number of instructions was executed
+    timeout:str="timeout" # the time allowed ran out first
+    breakpoint:str="breakpoint" # register0 reached an armed breakpoint.  The instruction there hasn't been executed.
+    halted:str="halted" # the CPU came back to a state it had already been in, so it would loop there forever.  See loopDetector.
+
+
+class cpuBreakpoint:
+    """A RAM address that CPU.run stops in front of.
+    If there's a condition, it's called with the CPU and the breakpoint is ignored when it returns False.  Otherwise each arrival counts as a hit, and run stops once there have been hitCount hits."""
+
+    def __init__(self,address:int,hitCount:int=1,condition:callable=None) -> None:
+        self.address:int=address
+        self.hitCount:int=hitCount
+        self.condition:callable=condition
+        self.hits:int=0 # how many times execution has arrived here with the condition true
+
+
+class performanceCounters:
+    """Plain integer counters that a CPU keeps up to date as it runs, cheap enough to leave on all the time.
+    They count what CPU.run, CPU.step and CPU.tick do.  The block JIT and translated programs add what their compiled code did when their run() returns."""
+
+    def __init__(self,theCPU:"CPU") -> None:
+        self._cpu:CPU=theCPU
+        self.reset()
+
+    def reset(self) -> None:
+        """Sets every counter back to zero."""
+        self.ticks:int=0 # clock ticks, including the three ticks that make up each instruction CPU.run executes
+        self.fetchReads:int=0 # RAM reads made to fetch instructions
+        self.loadReads:int=0 # RAM reads made by the load command
+        self.storeWrites:int=0 # RAM writes made by the store command
+        self.jumpsTaken:int=0 # ALU commands with a jump register whose condition matched
+        self.jumpsNotTaken:int=0 # ALU commands with a jump register whose condition didn't match
+        for mlCommand in self._cpu.mlCommandList:
+            mlCommand.retiredCount=0
+        self._cpu.theRAM.uninitializedReads=0
+
+    def snapshot(self) -> dict[str,object]:
+        """Returns the current value of every counter.  retiredByCommand maps the name of each command (or its reMatch if it has no name) to the number of times it was executed."""
+        retiredByCommand:dict[str,int] = dict()
+        for mlCommand in self._cpu.mlCommandList:
+            label:str = mlCommand.name if mlCommand.name else mlCommand.reMatch
+            retiredByCommand[label] = retiredByCommand.get(label,0)+mlCommand.retiredCount
+        return {
+            "retired":sum(retiredByCommand.values()),
+            "retiredByCommand":retiredByCommand,
+            "ticks":self.ticks,
+            "fetchReads":self.fetchReads,
+            "loadReads":self.loadReads,
+            "storeWrites":self.storeWrites,
+            "jumpsTaken":self.jumpsTaken,
+            "jumpsNotTaken":self.jumpsNotTaken,
+            "uninitializedReads":self._cpu.theRAM.uninitializedReads,
+        }
+
+
+class changeTracker:
+    """Collects the RAM addresses written since the last collect().  A display can then redraw just those addresses instead of the whole RAM.
+    Single writes go into a set, which is cheap to add to, and bulk loads mark a bitmap of the whole RAM.  collect() merges the two into ranges.
+    A tracker isn't thread safe: don't collect on one thread while another is writing the RAM."""
+
+    def __init__(self) -> None:
+        self._addresses:set[int]=set() # addresses written one at a time
+        self._bitmap:numpy.ndarray=numpy.zeros(RAM._addressCount,dtype=bool) # addresses written by bulk loads
+        self._bitmapUsed:bool=False
+
+    def markAddress(self,addressAsInt:int) -> None:
+        self._addresses.add(addressAsInt)
+
+    def markRange(self,starting_address:int,endAddress:int) -> None:
+        """Marks the addresses from starting_address up to (but not including) endAddress, wrapping around at the top of RAM."""
+        if endAddress-starting_address>=RAM._addressCount:
+            self._bitmap[:]=True
+        elif endAddress>RAM._addressCount:
+            self._bitmap[starting_address:]=True
+            self._bitmap[0:endAddress-RAM._addressCount]=True
+        else:
+            self._bitmap[starting_address:endAddress]=True
+        self._bitmapUsed=True
+
+    def hasChanges(self) -> bool:
+        return self._bitmapUsed or (len(self._addresses)>0)
+
+    def collect(self) -> list[tuple[int,int]]:
+        """Returns the addresses written since the last call as sorted (start, end) ranges, each end excluded, with neighbouring addresses merged into one range.  Then starts collecting afresh."""
+        if not self.hasChanges():
+            return []
+        if len(self._addresses)>0:
+            self._bitmap[numpy.fromiter(self._addresses,dtype=numpy.int64,count=len(self._addresses))]=True
+        edges:numpy.ndarray = numpy.flatnonzero(numpy.diff(numpy.concatenate(([0],self._bitmap.view(numpy.int8),[0])))) # where runs of marked addresses start and end
+        self._addresses.clear()
+        self._bitmap[:]=False
+        self._bitmapUsed=False
+        return list(zip(edges[0::2].tolist(),edges[1::2].tolist()))
+
+
+class traceRecorder:
+    """Records the last capacity instructions a CPU retired in a preallocated numpy ring buffer, one fixed-size record per instruction.
+    Each record holds the address the instruction was fetched from (pc), the opcode, register4 after the instruction, the RAM address and value it wrote (if wrote is 1) and whether it jumped (if jumped is 1).
+    An instruction counts as jumping if it left register0 anywhere other than the next address."""
+    recordType:numpy.dtype=numpy.dtype([("pc",numpy.uint16),("opcode",numpy.uint16),("register4",numpy.uint16),("writeAddress",numpy.uint16),("writeValue",numpy.uint16),("wrote",numpy.uint16),("jumped",numpy.uint16)])
+    _recordSize:int=recordType.itemsize
+
+    def __init__(self,capacity:int=65536) -> None:
+        self.capacity:int=capacity
+        self.count:int=0 # the number of instructions recorded so far, including any that have been overwritten
+        self._records:numpy.ndarray=numpy.zeros(capacity,dtype=self.recordType)
+        self._bytes:memoryview=memoryview(self._records.view(numpy.uint8)) # the raw bytes of the records
+        self._packRecord:callable=struct.Struct("="+"H"*len(self.recordType.names)).pack_into # writing a whole record with one pack is much faster than setting numpy fields
+        self._next:int=0 # the slot the next record goes in
+        self._wrote:bool=False # whether the instruction in progress has written to RAM
+        self._writeAddress:int=0
+        self._writeValue:int=0
+
+    def reactToWrite(self,addressAsInt:int,oldValue:int,value:int) -> None:
+        """Notes a RAM write made by the instruction in progress."""
+        self._wrote=True
+        self._writeAddress=addressAsInt
+        self._writeValue=value
+
+    def record(self,pc:int,opcode:int,register4:int,jumped:bool) -> None:
+        """Adds the record for an instruction that just retired, overwriting the oldest record if the buffer is full."""
+        if self._wrote:
+            self._packRecord(self._bytes,self._next*self._recordSize,pc,opcode,register4,self._writeAddress,self._writeValue,1,jumped)
+            self._wrote=False
+        else:
+            self._packRecord(self._bytes,self._next*self._recordSize,pc,opcode,register4,0,0,0,jumped)
+        self._next=self._next+1
+        if self._next==self.capacity:
+            self._next=0
+        self.count=self.count+1
+
+    def records(self) -> numpy.ndarray:
+        """Returns a copy of the records still in the buffer, oldest first."""
+        if self.count<self.capacity:
+            return self._records[0:self._next].copy()
+        return numpy.concatenate([self._records[self._next:],self._records[0:self._next]])
+
+    def clear(self) -> None:
+        self.count=0
+        self._next=0
+        self._wrote=False
+
+
+class loopDetector:
+    """Spots a CPU that's stuck in a loop.  This CPU has no halt instruction, so programs usually finish by jumping back to themselves forever.
+    Every loop has to jump backwards (or to itself) somewhere, so the state of the registers is remembered after each backward jump.  If a state comes round again without RAM being written in between, the CPU is repeating itself exactly and will never get out.
+    Up to window states are remembered at a time.  loopAddress is set to the address the loop was caught at (where register0 is left) when a loop is found."""
+
+    def __init__(self,window:int=64) -> None:
+        self.window:int=window
+        self.loopAddress:int=None
+        self._seen:set[tuple[int,...]]=set() # register states seen since the RAM was last written
+        self._writeCount:int=-1 # RAM.writeCount when _seen was started
+
+    def check(self,registers:tuple[int,...],writeCount:int) -> bool:
+        """Called with registers 0 to 7 and the RAM's writeCount after a backward jump.  Returns whether the CPU has been in exactly this state before."""
+        if writeCount!=self._writeCount:
+            self._seen.clear()
+            self._writeCount=writeCount
+        elif registers in self._seen:
+            self.loopAddress=registers[0]
+            return True
+        elif len(self._seen)>=self.window:
+            self._seen.clear()
+        self._seen.add(registers)
+        return False
+
+    def checkMany(self,count:int,stateAt:callable,indexOf:callable,writeCount:int) -> int:
+        """Does what count calls to check would, for count states that all differ from each other and are checked with the same writeCount.  The block JIT uses this to go round a counting loop many times at once.
+        stateAt(index) returns one of the states, and indexOf(state) returns where a state comes among them (or None), so only the states that matter get worked out.
+        Returns the index of the state the loop is caught at, or None if none of them had been seen before."""
+        if writeCount!=self._writeCount:
+            self._seen.clear()
+            self._writeCount=writeCount
+        lastMatchable:int = self.window-len(self._seen) # check forgets the states seen so far once there are window of them, so states after this can't match them
+        caught:int = None
+        for registers in self._seen:
+            index:int = indexOf(registers)
+            if (index!=None) and (index<count) and (index<=lastMatchable) and ((caught==None) or (index<caught)):
+                caught = index
+        added:int = count if caught==None else caught # the states check would have remembered before stopping
+        kept:int = added # how many of them check would still be remembering
+        if len(self._seen)+added>self.window:
+            kept = (len(self._seen)+added-self.window-1)%self.window+1
+            self._seen.clear()
+        for index in range(added-kept,added):
+            self._seen.add(stateAt(index))
+        if caught!=None:
+            self.loopAddress=stateAt(caught)[0]
+        return caught
+
+    def clear(self) -> None:
+        self.loopAddress=None
+        self._seen.clear()
+        self._writeCount=-1
+
+
+class undoJournal:
+    """Remembers enough about the last capacity instructions a CPU retired to undo them.
+    Each entry is (the address the instruction was fetched from, ((register number, old value), ...) for registers 1 to 7 that changed, ((RAM address, old value), ...) for RAM it wrote).
+    Every snapshotInterval instructions the journal also keeps a snapshot of the whole CPU (the RAM is forked, so this is cheap), so long rewinds can restore a snapshot and re-run forward instead of undoing every instruction."""
+
+    def __init__(self,capacity:int=1000000,snapshotInterval:int=4096) -> None:
+        self.capacity:int=capacity
+        self.snapshotInterval:int=snapshotInterval
+        self.position:int=0 # the number of instructions journaled so far, less any that have been undone
+        self._entries:collections.deque=collections.deque(maxlen=capacity)
+        self._snapshots:list[tuple[int,tuple[int,...],RAM]]=[] # (position, registers 0 to 7, RAM) oldest first
+        self._pendingWrites:list[tuple[int,int]]=[] # RAM writes made by the instruction in progress
+
+    def reactToWrite(self,addressAsInt:int,oldValue:int,value:int) -> None:
+        """Notes a RAM write made by the instruction in progress."""
+        self._pendingWrites.append((addressAsInt,oldValue))
+
+    def record(self,pc:int,before:tuple[int,...],after:tuple[int,...]) -> None:
+        """Adds the entry for an instruction that just retired, given registers 1 to 7 before and after it."""
+        registerDeltas:tuple[tuple[int,int],...] = ()
+        if before!=after:
+            registerDeltas = tuple([(index+1,before[index]) for index in range(7) if before[index]!=after[index]])
+        if self._pendingWrites:
+            self._entries.append((pc,registerDeltas,tuple(self._pendingWrites)))
+            self._pendingWrites.clear()
+        else:
+            self._entries.append((pc,registerDeltas,()))
+        self.position=self.position+1
+
+    def oldestPosition(self) -> int:
+        """The earliest position the journal can rewind to."""
+        return self.position-len(self._entries)
+
+    def takeSnapshot(self,theCPU:"CPU") -> None:
+        self._snapshots.append((self.position,tuple(register._value for register in theCPU._allRegisters()),theCPU.theRAM.fork()))
+        while (len(self._snapshots)>0) and (self._snapshots[0][0]<self.oldestPosition()):
+            self._snapshots.pop(0) # the journal can't rewind that far any more
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._snapshots.clear()
+        self._pendingWrites.clear()
+
+
 class CPU():
 
     def __init__(self) -> None:
@@ -353,7 +894,10 @@ class CPU():
         self.register5:cpuByte=cpuByte() # Holds a value typically used as a RAM address
         self.register6:cpuByte=cpuByte() # This register can be written to RAM
         self.register7:cpuByte=cpuByte() # This register can be copied from a RAM address
+        self._registers:list[cpuByte]=self._allRegisters() # indexed by register number
+        self._decodeTable:dict[int,tuple[int,typing.Sequence[str],machineLanguageCommand,callable]]=dict() # opcode -> the decoded instruction.  See decodeML.
         self.mlCommandList:list[machineLanguageCommand]=self.setupML()
+        self.counters:performanceCounters=performanceCounters(self)
 
         self.register0_description:str="The RAM address to pull the next instruction from.  Incremented during clock tick 1."
         self.register1_description:str="The instruction we're currently working on.  *Only* set during clock tick 0."
@@ -367,64 +911,233 @@ class CPU():
         self.onAluCommand:event = event()
         self.onTick:event=event()
         self.onParseML:event=event()
+        self.trace:traceRecorder=None # set by startTrace
+        self.journal:undoJournal=None # set by startJournal
+        self._journalBefore:tuple[int,...]=None # registers 1 to 7 at the start of the instruction in progress, for the journal
+        self.breakpoints:dict[int,cpuBreakpoint]=dict() # armed breakpoints, keyed by address
+        self.loops:loopDetector=None # set by startLoopDetection
+        self._fetchedFrom:int=0 # the address of the instruction in progress
+
+        self.register0.setFromUnsignedInteger(0) # We initialize the starting value of register 0 to point to RAM address 0
+
+    def addBreakpoint(self,address:int,hitCount:int=1,condition:callable=None) -> cpuBreakpoint:
+        """Arms a breakpoint at a RAM address, replacing any breakpoint already there.  See cpuBreakpoint for hitCount and condition."""
+        self.breakpoints[address]=cpuBreakpoint(address,hitCount,condition)
+        return self.breakpoints[address]
 
-        self.register0.fromString("0000000000000000") # We initialize the starting value of register 0 to point to RAM address 0
+    def removeBreakpoint(self,address:int) -> None:
+        self.breakpoints.pop(address,None)
+
+    def _breakpointReached(self,address:int) -> bool:
+        """Decides whether run should stop at an address that has a breakpoint."""
+        theBreakpoint:cpuBreakpoint=self.breakpoints[address]
+        if (theBreakpoint.condition!=None) and not theBreakpoint.condition(self):
+            return False
+        theBreakpoint.hits=theBreakpoint.hits+1
+        return theBreakpoint.hits>=theBreakpoint.hitCount
+
+    def startLoopDetection(self,window:int=64) -> loopDetector:
+        """Makes run stop with stopReason.halted once the CPU is stuck in a loop it can never leave.  Returns the detector, which is also kept in self.loops and reports the loop's address."""
+        self.loops=loopDetector(window)
+        return self.loops
+
+    def stopLoopDetection(self) -> None:
+        self.loops=None
+
+    def _loopFound(self) -> bool:
+        """Whether the CPU, which just jumped backwards, has been in its current state before."""
+        return self.loops.check((self.register0._value,self.register1._value,self.register2._value,self.register3._value,self.register4._value,self.register5._value,self.register6._value,self.register7._value),self.theRAM.writeCount)
+
+    def needsInterpreter(self) -> bool:
+        """Whether something (a trace, an undo journal or a breakpoint) has to see every instruction, so compiled code can't be used."""
+        return (self.trace!=None) or (self.journal!=None) or (len(self.breakpoints)>0)
+
+    def startTrace(self,capacity:int=65536) -> traceRecorder:
+        """Starts recording every instruction this CPU retires into a ring buffer holding the last capacity instructions.  Returns the recorder, which is also kept in self.trace."""
+        self.stopTrace()
+        self.trace=traceRecorder(capacity)
+        self.theRAM.onWriteEvent.setReaction(self.trace,self.trace.reactToWrite)
+        return self.trace
+
+    def stopTrace(self) -> traceRecorder:
+        """Stops recording instructions.  Returns the recorder, so its records can still be inspected."""
+        recorder:traceRecorder=self.trace
+        if recorder!=None:
+            self.theRAM.onWriteEvent.removeReaction(recorder)
+        self.trace=None
+        return recorder
+
+    def startJournal(self,capacity:int=1000000,snapshotInterval:int=4096) -> undoJournal:
+        """Starts journaling every instruction this CPU retires, so that the last capacity of them can be undone with step_back.  Returns the journal, which is also kept in self.journal.
+        The CPU must be between instructions."""
+        if self.theClock!=2:
+            raise Exception("The CPU is part way through an instruction.  Finish it with CPU.step() first.")
+        self.stopJournal()
+        self.journal=undoJournal(capacity,snapshotInterval)
+        self.journal.takeSnapshot(self)
+        self.theRAM.onWriteEvent.setReaction(self.journal,self.journal.reactToWrite)
+        return self.journal
+
+    def stopJournal(self) -> undoJournal:
+        """Stops journaling instructions.  Returns the journal."""
+        journal:undoJournal=self.journal
+        if journal!=None:
+            self.theRAM.onWriteEvent.removeReaction(journal)
+        self.journal=None
+        return journal
+
+    def _allRegisters(self) -> list[cpuByte]:
+        return [self.register0,self.register1,self.register2,self.register3,self.register4,self.register5,self.register6,self.register7]
+
+    def step_back(self,n:int=1) -> int:
+        """Undoes the last n instructions retired, or as many as the journal holds, and returns the number undone.
+        Short rewinds apply the journal's deltas in reverse.  Longer ones restore the latest snapshot before the target and re-run forward from it, which is much quicker than undoing instructions one by one.
+        Either way the registers and RAM are changed through their usual setters, so their events fire."""
+        journal:undoJournal=self.journal
+        if journal==None:
+            raise Exception("There's no journal to step back through.  Call CPU.startJournal() first.")
+        if self.theClock!=2:
+            raise Exception("The CPU is part way through an instruction.  Finish it with CPU.step() first.")
+        n=max(0,min(n,len(journal._entries)))
+        target:int=journal.position-n
+        if self.loops!=None:
+            self.loops.clear() # the states it remembers are from the instructions being undone, and will come round again
+        if n>journal.snapshotInterval:
+            for snapshot in reversed(journal._snapshots):
+                if snapshot[0]<=target:
+                    self._replayFromSnapshot(snapshot,target)
+                    return n
+        registers:list[cpuByte]=self._allRegisters()
+        for count in range(n):
+            pc, registerDeltas, ramDeltas = journal._entries.pop()
+            for address, oldValue in reversed(ramDeltas):
+                self.theRAM.setUsingUnsignedIntegerAddressAndValue(address,oldValue)
+            for index, oldValue in registerDeltas:
+                registers[index].setFromUnsignedInteger(oldValue)
+            registers[0].setFromUnsignedInteger(pc)
+        journal.position=target
+        self._forgetUndoneWrites()
+        while (len(journal._snapshots)>0) and (journal._snapshots[-1][0]>target):
+            journal._snapshots.pop()
+        return n
+
+    def _replayFromSnapshot(self,snapshot:tuple[int,tuple[int,...],RAM],target:int) -> None:
+        """Puts the CPU back to a journal snapshot, then runs it forward to the journal position target with the journal, trace, breakpoints and loop detection out of the way."""
+        journal:undoJournal=self.journal
+        position, registerValues, snapshotRAM = snapshot
+        self.theRAM.restoreFrom(snapshotRAM)
+        registers:list[cpuByte]=self._allRegisters()
+        for index in range(len(registers)):
+            registers[index].setFromUnsignedInteger(registerValues[index])
+        trace:traceRecorder=self.trace
+        breakpoints:dict[int,cpuBreakpoint]=self.breakpoints
+        loops:loopDetector=self.loops
+        self.journal, self.trace, self.breakpoints, self.loops = None, None, dict(), None
+        try:
+            retired, reason = self.run(target-position) # the instructions being re-run are still in the journal, so they don't need journaling again
+        finally:
+            self.journal, self.trace, self.breakpoints, self.loops = journal, trace, breakpoints, loops
+        if retired!=target-position:
+            raise Exception("Replaying from the snapshot stopped after "+str(retired)+" of "+str(target-position)+" instructions ("+reason+").")
+        for count in range(journal.position-target):
+            journal._entries.pop()
+        journal.position=target
+        self._forgetUndoneWrites()
+        while journal._snapshots[-1][0]>target:
+            journal._snapshots.pop()
+
+    def _forgetUndoneWrites(self) -> None:
+        """RAM writes made while rewinding reach the journal and trace too, but don't belong to the next instruction."""
+        self.journal._pendingWrites.clear()
+        if self.trace!=None:
+            self.trace._wrote=False
+
+    def run_back_until(self,address:int) -> int:
+        """Steps back until register0 holds the given address, i.e. until the CPU is about to execute the instruction there again.
+        Returns the number of instructions undone.  If the journal runs out first, the CPU is left at the oldest instruction it holds."""
+        undone:int=0
+        while len(self.journal._entries)>0:
+            undone=undone+self.step_back(1)
+            if self.register0._value==address:
+                break
+        return undone
+
+    def fork(self) -> "CPU":
+        """Returns a new CPU that carries on from exactly where this one is.  Registers and the clock are copied, and the RAM is forked so that pages are only copied when either CPU writes them.
+        The fork runs the standard instruction set and starts with no event reactions, since both are bound to this CPU."""
+        theFork:CPU = CPU()
+        theFork.theRAM = self.theRAM.fork()
+        theFork.theClock = self.theClock
+        forkRegisters:list[cpuByte] = theFork._allRegisters()
+        registers:list[cpuByte] = self._allRegisters()
+        for index in range(len(registers)):
+            forkRegisters[index]._value = registers[index]._value
+        return theFork
 
     def getRegister(self,threeBits:str) -> cpuByte:
-        if threeBits=="000":
-            return self.register0
-        if threeBits=="001":
-            return self.register1
-        if threeBits=="010":
-            return self.register2
-        if threeBits=="011":
-            return self.register3
-        if threeBits=="100":
-            return self.register4
-        if threeBits=="101":
-            return self.register5
-        if threeBits=="110":
-            return self.register6
-        if threeBits=="111":
-            return self.register7
-        raise Exception("the bit string "+threeBits+" doesn't correspond to a register.")
-
-    def aluCommand(self,conditionalFlags:str,aluDirectives:str,jumpRegisterDirective:str) -> None:
-        """Carry out the ALU operation specified by the 6-bits in the aluDirective.  
+        if (len(threeBits)!=3) or (threeBits.strip("01")!=""):
+            raise Exception("the bit string "+threeBits+" doesn't correspond to a register.")
+        return self._registers[int(threeBits,2)]
+
+    def storeCommand(self) -> None:
+        """Stores the contents of register7 into the RAM address specified by register5."""
+        self.counters.storeWrites=self.counters.storeWrites+1
+        self.theRAM.setUsingUnsignedIntegerAddressAndValue(self.register5._value,self.register7._value)
+
+    def loadCommand(self) -> None:
+        """Loads into register6 the contents of the RAM address specified by register5."""
+        self.counters.loadReads=self.counters.loadReads+1
+        self.register6.setFromUnsignedInteger(self.theRAM.getValueUsingIntegerAddress(self.register5._value))
+
+    def setLowBitsCommand(self,literal:int) -> None:
+        """Sets the low (rightmost) 8 bits of register7 to the 8-bit literal."""
+        self.register7.setFromUnsignedInteger((self.register7._value & 0xFF00) | literal)
+
+    def setTopBitsCommand(self,literal:int) -> None:
+        """Sets the high (leftmost) 8 bits of register7 to the 8-bit literal."""
+        self.register7.setFromUnsignedInteger((literal<<8) | (self.register7._value & 0x00FF))
+
+    def copyCommand(self,targetRegister:int,sourceRegister:int) -> None:
+        """Copies the contents of the register numbered sourceRegister into the one numbered targetRegister, unless the target is register1."""
+        if targetRegister!=1:
+            self._registers[targetRegister].setFromUnsignedInteger(self._registers[sourceRegister]._value)
+
+    def aluCommand(self,conditionalFlags:int,aluDirectives:int,jumpRegister:int) -> None:
+        """Carry out the ALU operation specified by the 6-bit aluDirectives.  
         Register2 is used as the X-input, register3 is used as the Y-input, and the output will be stored to register4.  
-        If the 2-bits of the conditionalFlags match the bool output of the ALU, then the contents of the register indicated by 
-        the 3-bit jumpRegisterDirective will be copied to register0 (unless SSS=000), thereby causing program flow to 'jump'."""
-        
-        # parse the conditional flag bits and the ALU directive bits
-        JumpIfOutIsZero:bool = (conditionalFlags[0]=="1")
-        JumpIfOutIsNeg:bool = (conditionalFlags[1]=="1")
-        setXtoZero:bool = (aluDirectives[0]=="1")
-        negateX:bool = (aluDirectives[1]=="1")
-        setYtoZero:bool = (aluDirectives[2]=="1")
-        negateY:bool = (aluDirectives[3]=="1")
-        addOrAnd:bool = (aluDirectives[4]=="1")
-        negateOut:bool = (aluDirectives[5]=="1")
-        jumpRegisterDirective = jumpRegisterDirective[0:3]
-
-        self.onAluCommand.fire(conditionalFlags,aluDirectives,jumpRegisterDirective)
-
-        # Carry out the ALU operation, using registers 2 and 3 as inputs and the ALU directives parsed above, storing the result to register 4
-        aluOut:tuple[cpuByte,bool,bool] =  ALU.evaluate(self.register2,self.register3,setXtoZero,negateX,setYtoZero,negateY,addOrAnd,negateOut)
-        self.register4=aluOut[0]
-
-        # Use the conditional flags parsed above and the jumpRegisterDirective to decide if we're rewriting register0 (to jump the code flow)
-        if (jumpRegisterDirective!="000") & (JumpIfOutIsNeg==aluOut[1]) & (JumpIfOutIsZero==aluOut[2]):
-            sourceRegister:cpuByte = self.getRegister(jumpRegisterDirective)
-            self.register0.fromString(sourceRegister.toString())
+        If the 2-bit conditionalFlags (jump-if-zero high, jump-if-negative low) match the bool output of the ALU, then the contents of the register 
+        numbered jumpRegister will be copied to register0 (unless it's 0), thereby causing program flow to 'jump'.
+        The fields are unsigned integers, as decoded from the opcode.  onAluCommand is still fired with them as bit strings."""
+        if self.onAluCommand.hasReactions:
+            self.onAluCommand.fire(format(conditionalFlags,"02b"),format(aluDirectives,"06b"),format(jumpRegister,"03b"))
+
+        # Carry out the ALU operation, using registers 2 and 3 as inputs and the ALU directives, storing the result to register 4
+        out:int = ALU.directiveFunctions[aluDirectives](self.register2._value,self.register3._value)
+        self.register4.setFromUnsignedInteger(out)
+
+        # Use the conditional flags and the jump register to decide if we're rewriting register0 (to jump the code flow)
+        if jumpRegister==0:
+            return
+        if (((conditionalFlags & 1)!=0)==((out & cpuByte._signBit)!=0)) & (((conditionalFlags & 2)!=0)==((out & (cpuByte._signBit-1))==0)):
+            self.counters.jumpsTaken=self.counters.jumpsTaken+1
+            self.register0.setFromUnsignedInteger(self._registers[jumpRegister]._value)
+        else:
+            self.counters.jumpsNotTaken=self.counters.jumpsNotTaken+1
 
     def tick(self) -> None:
         """Causes the CPU clock to 'tick' forward to it's next state and perform the actions associated with that state."""
         self.theClock = (self.theClock+1)%3
-        self.onTick.fire(self.theClock) # fire the events for the clock, passing in the current clock counter
+        self.counters.ticks=self.counters.ticks+1
+        if self.onTick.hasReactions:
+            self.onTick.fire(self.theClock) # fire the events for the clock, passing in the current clock counter
 
         if self.theClock==0:
             # on tick 0 we copy the RAM addressed by the "code pointer" (register 0) into the "instruction register" (register 1).  This is the only time we write register 1.
-            self.register1.fromString(self.theRAM.GET(self.register0).toString())
+            self._fetchedFrom=self.register0.asUnsignedInteger() # remembered for the trace and the journal
+            if self.journal!=None:
+                self._journalBefore=(self.register1._value,self.register2._value,self.register3._value,self.register4._value,self.register5._value,self.register6._value,self.register7._value)
+            self.counters.fetchReads=self.counters.fetchReads+1
+            self.register1.setFromUnsignedInteger(self.theRAM.getValueUsingIntegerAddress(self.register0.asUnsignedInteger()))
             return
         if self.theClock==1:
             # On tick 1 we'll increment register0 by 1.  This will move the instruction pointer it to the presumptive next instruction.
@@ -434,74 +1147,244 @@ class CPU():
             return
         if self.theClock==2:
             # On tick 2 we'll execute the ML instruction in register 1 to do the actual work
-            matchedCommand, parsedCommandParams = self.findAndParseML(self.register1) # parse the ML binary
-            matchedCommand.action(parsedCommandParams) # carry out the operation.  This will rightly throw an eror if the binary command didn't match an instruction
+            self.executeML(self.register1._value) # decode the ML binary and carry out the operation.  This will rightly throw an error if the binary command didn't match an instruction
+            if self.trace!=None:
+                self.trace.record(self._fetchedFrom,self.register1._value,self.register4._value,self.register0._value!=((self._fetchedFrom+1) & cpuByte._maxVal))
+            if (self.journal!=None) and (self._journalBefore!=None):
+                self.journal.record(self._fetchedFrom,self._journalBefore,(self.register1._value,self.register2._value,self.register3._value,self.register4._value,self.register5._value,self.register6._value,self.register7._value))
+                self._journalBefore=None
+                if self.journal.position%self.journal.snapshotInterval==0:
+                    self.journal.takeSnapshot(self)
             return
         raise Exception("Undefined clock tick detected.") # this should never happen!
 
+    def step(self) -> None:
+        """Executes one whole instruction.  This is the same as calling tick() until the clock counter comes back around to 2."""
+        self.run(1)
+
+    def run(self,max_instructions:int) -> tuple[int,str]:
+        """Executes up to max_instructions whole instructions and returns the number of instructions retired along with the stopReason.
+        The CPU ends in exactly the state that the equivalent sequence of ticks would leave it in, but onTick is not fired.
+        If the CPU is part way through an instruction, that instruction is finished off with ticks and counts as the first one retired.
+        Execution stops in front of any armed breakpoint, except one at the address the run starts from, so calling run again carries on past it.
+        With loop detection on, execution also stops as soon as the CPU is found to be stuck in a loop."""
+        retired:int=0
+        if (self.theClock!=2) & (max_instructions>0):
+            while self.theClock!=2:
+                self.tick()
+            retired=1
+
+        # hoist everything the loop touches into locals
+        theRAM:RAM=self.theRAM
+        register0:cpuByte=self.register0
+        register1:cpuByte=self.register1
+        executeML:callable=self.executeML
+        trace:traceRecorder=self.trace
+        journal:undoJournal=self.journal
+        breakpoints:dict[int,cpuBreakpoint]=self.breakpoints
+        loops:loopDetector=self.loops
+        reason:str=stopReason.limit
+        loopStart:int=retired
+        try:
+            if journal!=None: # the same loop, noting what each instruction changes
+                register2:cpuByte=self.register2
+                register3:cpuByte=self.register3
+                register4:cpuByte=self.register4
+                register5:cpuByte=self.register5
+                register6:cpuByte=self.register6
+                register7:cpuByte=self.register7
+                record:callable=journal.record
+                snapshotInterval:int=journal.snapshotInterval
+                while retired<max_instructions:
+                    pc:int=register0._value
+                    if (pc in breakpoints) and (retired!=loopStart) and self._breakpointReached(pc):
+                        reason=stopReason.breakpoint
+                        break
+                    before:tuple[int,...]=(register1._value,register2._value,register3._value,register4._value,register5._value,register6._value,register7._value)
+                    register1.setFromUnsignedInteger(theRAM.getValueUsingIntegerAddress(pc)) # clock tick 0: fetch
+                    register0.setFromUnsignedInteger(pc+1) # clock tick 1: increment the code pointer
+                    executeML(register1._value) # clock tick 2: execute
+                    if trace!=None:
+                        trace.record(pc,register1._value,register4._value,register0._value!=((pc+1) & 65535))
+                    record(pc,before,(register1._value,register2._value,register3._value,register4._value,register5._value,register6._value,register7._value))
+                    if journal.position%snapshotInterval==0:
+                        journal.takeSnapshot(self)
+                    retired=retired+1
+                    if (loops!=None) and (register0._value<=pc) and self._loopFound():
+                        reason=stopReason.halted
+                        break
+            elif trace!=None: # the same loop, with traceRecorder.record written out inline
+                register4:cpuByte=self.register4
+                packRecord:callable=trace._packRecord
+                recordBytes:memoryview=trace._bytes
+                recordSize:int=trace._recordSize
+                endOffset:int=trace.capacity*recordSize
+                offset:int=trace._next*recordSize
+                try:
+                    while retired<max_instructions:
+                        pc:int=register0._value
+                        if (pc in breakpoints) and (retired!=loopStart) and self._breakpointReached(pc):
+                            reason=stopReason.breakpoint
+                            break
+                        register1.setFromUnsignedInteger(theRAM.getValueUsingIntegerAddress(pc)) # clock tick 0: fetch
+                        register0.setFromUnsignedInteger(pc+1) # clock tick 1: increment the code pointer
+                        executeML(register1._value) # clock tick 2: execute
+                        if trace._wrote:
+                            packRecord(recordBytes,offset,pc,register1._value,register4._value,trace._writeAddress,trace._writeValue,1,register0._value!=((pc+1) & 65535))
+                            trace._wrote=False
+                        else:
+                            packRecord(recordBytes,offset,pc,register1._value,register4._value,0,0,0,register0._value!=((pc+1) & 65535))
+                        offset=offset+recordSize
+                        if offset==endOffset:
+                            offset=0
+                        retired=retired+1
+                        if (loops!=None) and (register0._value<=pc) and self._loopFound():
+                            reason=stopReason.halted
+                            break
+                finally:
+                    trace._next=offset//recordSize
+                    trace.count=trace.count+retired-loopStart
+            else:
+                while retired<max_instructions:
+                    pc:int=register0._value
+                    if (pc in breakpoints) and (retired!=loopStart) and self._breakpointReached(pc):
+                        reason=stopReason.breakpoint
+                        break
+                    register1.setFromUnsignedInteger(theRAM.getValueUsingIntegerAddress(pc)) # clock tick 0: fetch
+                    register0.setFromUnsignedInteger(pc+1) # clock tick 1: increment the code pointer
+                    executeML(register1._value) # clock tick 2: execute
+                    retired=retired+1
+                    if (loops!=None) and (register0._value<=pc) and self._loopFound():
+                        reason=stopReason.halted
+                        break
+        finally:
+            self.counters.ticks=self.counters.ticks+3*(retired-loopStart)
+            self.counters.fetchReads=self.counters.fetchReads+retired-loopStart
+        return retired,reason
+
     def findAndParseML(self,mlByte:cpuByte) -> tuple[machineLanguageCommand,typing.Sequence[str]]:
-        """Finds the machine language command from the list of ML commands and parses out the parameters from the binary string."""
-        mlBinaryString:str = mlByte.toString()
-        matchedCommand:machineLanguageCommand = None
-        parsedCommandParams:typing.Sequence[str] = None
-        for mlCommand in self.mlCommandList:
-            parsedCommandParams=mlCommand.tryStringMatchesCommand(mlBinaryString)
+        """Finds the machine language command from the list of ML commands and parses out the parameters from the binary string.
+        This counts as the command being retired, and fires onParseML, but doesn't carry the command out.  See executeML for that."""
+        commandIndex, parsedCommandParams, matchedCommand, handler = self._decodeTable.get(mlByte._value) or self._decode(mlByte._value)
+        if matchedCommand!=None:
+            matchedCommand.retiredCount = matchedCommand.retiredCount+1
+        if self.onParseML.hasReactions: # only build the bit string if someone is listening
+            self.onParseML.fire(mlByte.toString(),matchedCommand,parsedCommandParams) # fire the event that alerts others that a ML command will be executed
+        return matchedCommand,parsedCommandParams
+
+    def executeML(self,opcode:int) -> None:
+        """Decodes the opcode and carries out the command it matches, firing onParseML first.  Raises an exception if no command matches."""
+        commandIndex, parsedCommandParams, matchedCommand, handler = self._decodeTable.get(opcode) or self._decode(opcode)
+        if self.onParseML.hasReactions: # only build the bit string if someone is listening
+            self.onParseML.fire(cpuByte.unsignedIntegerToBitString(opcode),matchedCommand,parsedCommandParams)
+        handler()
+        matchedCommand.retiredCount = matchedCommand.retiredCount+1
+
+    @property
+    def mlCommandList(self) -> list[machineLanguageCommand]:
+        """The commands this CPU understands, matched in order.  Changing the list, or replacing it, is noticed automatically.  
+        Call resetDecodeTable after changing a command in it in place, such as its reMatch or action."""
+        return self._mlCommandList
+
+    @mlCommandList.setter
+    def mlCommandList(self,commands:list[machineLanguageCommand]) -> None:
+        self._mlCommandList:commandList = commandList(commands,self.resetDecodeTable)
+        self.resetDecodeTable()
+
+    def resetDecodeTable(self) -> None:
+        """Forgets every decoded opcode, so each one is matched against mlCommandList again the next time it's used."""
+        self._decodeTable.clear()
+
+    def decodeML(self,opcode:int) -> tuple[int,typing.Sequence[str]]:
+        """Returns the position in mlCommandList of the command matching the opcode, and the parameters parsed out of the opcode's binary string.
+        Each opcode is matched against the reMatch patterns only once; after that the answer comes straight from the decode table."""
+        commandIndex, parsedCommandParams, matchedCommand, handler = self._decodeTable.get(opcode) or self._decode(opcode)
+        return commandIndex,parsedCommandParams
+
+    def _decode(self,opcode:int) -> tuple[int,typing.Sequence[str],machineLanguageCommand,callable]:
+        """Matches the opcode against mlCommandList and adds it to the decode table.
+        An entry holds the position of the command, the bit string parameters (for decodeML and onParseML), the command, and the command bound to its parameters as integers, ready to call."""
+        mlBinaryString:str = cpuByte.unsignedIntegerToBitString(opcode)
+        entry:tuple[int,typing.Sequence[str],machineLanguageCommand,callable] = (None,None,None,functools.partial(self._unknownCommand,mlBinaryString)) # the result if no command matches
+        for commandIndex in range(len(self.mlCommandList)):
+            mlCommand:machineLanguageCommand = self.mlCommandList[commandIndex]
+            parsedCommandParams:typing.Sequence[str] = mlCommand.tryStringMatchesCommand(mlBinaryString)
             if parsedCommandParams==None:
                 continue
-            matchedCommand=mlCommand
+            entry = (commandIndex,parsedCommandParams,mlCommand,mlCommand.bind(parsedCommandParams))
             break
-        self.onParseML.fire(mlBinaryString,matchedCommand,parsedCommandParams) # fire the event that alerts others that a ML command will be executed
-        return matchedCommand,parsedCommandParams
+        self._decodeTable[opcode] = entry
+        return entry
+
+    @staticmethod
+    def _unknownCommand(mlBinaryString:str) -> None:
+        raise Exception("The binary string "+mlBinaryString+" doesn't match any machine language command.")
 
     def setupML(self) -> list[machineLanguageCommand]:
         returnList:list[machineLanguageCommand] = []
 
         storeCommand:machineLanguageCommand=machineLanguageCommand()
         storeCommand.reMatch=".{13}000"
+        storeCommand.name="STORE"
         storeCommand.description="Stores the contents of register7 into the RAM address specified by register5."
-        storeCommand.action = lambda unused : self.theRAM.SET(self.register5,self.register7)
+        storeCommand.integerAction = self.storeCommand
+        storeCommand.action = storeCommand.actWithIntegers
         returnList.append(storeCommand)
 
         loadCommand:machineLanguageCommand=machineLanguageCommand()
         loadCommand.reMatch=".{13}001"
+        loadCommand.name="LOAD"
         loadCommand.description="Load into register6 the contents of the RAM address specified by register5.  Will error if the RAM is unset."
-        loadCommand.action = lambda unused : self.register6.setFromUnsignedInteger(self.theRAM.GET(self.register5).asUnsignedInteger())
+        loadCommand.integerAction = self.loadCommand
+        loadCommand.action = loadCommand.actWithIntegers
         returnList.append(loadCommand)
 
         setlowCommand:machineLanguageCommand=machineLanguageCommand()
         setlowCommand.reMatch=".{5}([01]{8})010"
+        setlowCommand.name="SETLOWBITS"
         setlowCommand.description="Commands of the form '.....dddddddd010' set the low (rightmost) 8 bits of register7 to the literal value specifed by the 'dddddddd' bits of this command."
-        setlowCommand.action=lambda aSequence : self.register7.setBitsFromString(8,aSequence[0])
+        setlowCommand.integerAction=self.setLowBitsCommand
+        setlowCommand.action=setlowCommand.actWithIntegers
         returnList.append(setlowCommand)
 
         settopCommand:machineLanguageCommand=machineLanguageCommand()
         settopCommand.reMatch=".{5}([01]{8})011"
+        settopCommand.name="SETTOPBITS"
         settopCommand.description="Commands of the form '.....dddddddd011' set the high (leftmost) 8 bits of register7 to the literal value specifed by the 'dddddddd' bits of this command."
-        settopCommand.action=lambda aSequence : self.register7.setBitsFromString(0,aSequence[0])
+        settopCommand.integerAction=self.setTopBitsCommand
+        settopCommand.action=settopCommand.actWithIntegers
         returnList.append(settopCommand)
 
         copyCommand:machineLanguageCommand=machineLanguageCommand()
         copyCommand.reMatch=".{7}([01]{3})([01]{3})100"
+        copyCommand.name="COPY"
         copyCommand.description="Commands of the form '.......TTTsss100' copy the contents of the register specified by the 'sss' bits into the register specified by the 'TTT' bits (unless TTT=001)."
-        copyCommand.action=lambda aSequence : None if aSequence[0]=="001" else self.getRegister(aSequence[0]).fromString(self.getRegister(aSequence[1]).toString()) # copy to any register except register 1
+        copyCommand.integerAction=self.copyCommand # copy to any register except register 1
+        copyCommand.action=copyCommand.actWithIntegers
         returnList.append(copyCommand)
 
         aluCommand:machineLanguageCommand=machineLanguageCommand()
         aluCommand.reMatch="..([01]{2})([01]{6})([01]{3})101"
+        aluCommand.name="ALU"
         aluCommand.description="Commands of the form '..ccAAAAAAsss101' carry out the ALU operation specified by the 'AAAAAA' bits.  Register2 is used as the X-input, register3 is used as the Y-input, and the output will be stored to register4.  If the 'cc' bits match the output of the ALU, then the contents of the register indicated by SSS will be copied to register0 (unless SSS=000), thereby causing program flow to 'jump'."
-        aluCommand.action=lambda aSequence : self.aluCommand(aSequence[0],aSequence[1],aSequence[2])
+        aluCommand.integerAction=self.aluCommand
+        aluCommand.action=aluCommand.actWithIntegers
         returnList.append(aluCommand)
 
         noCommand1:machineLanguageCommand=machineLanguageCommand()
         noCommand1.reMatch=".{13}110"
+        noCommand1.name="NOOP110"
         noCommand1.description="The CPU doesn't use this command, and no load bits will get set.  Essentially, this is a 'pass' or 'no-op' directive."
-        noCommand1.action = lambda aSequence : None
+        noCommand1.integerAction = lambda : None
+        noCommand1.action = noCommand1.actWithIntegers
         returnList.append(noCommand1)
 
         noCommand2:machineLanguageCommand=machineLanguageCommand()
         noCommand2.reMatch=".{13}111"
+        noCommand2.name="NOOP111"
         noCommand2.description="The CPU doesn't use this command, and no load bits will get set.  Essentially, this is a 'pass' or 'no-op' directive."
-        noCommand2.action = lambda aSequence : None
+        noCommand2.integerAction = lambda : None
+        noCommand2.action = noCommand2.actWithIntegers
         returnList.append(noCommand2)
 
         return returnList
@@ -1,7 +1,11 @@
 import typing
+import threading # the CPU runs on a worker thread so the window stays responsive
+import time
 import PySimpleGUI as sg
 from PySimpleGUI.PySimpleGUI import popup, popup_error
 import cpu_simulator as sim # used to simulate hardware
+import cpu_jit # the fastest way to run lots of instructions
+import cpu_event_log # the bounded log behind the CPU Action Log
 import ml_assembler
 
 # A GUI front-end for a cpu simulator.
@@ -9,6 +13,10 @@ import ml_assembler
 # A quick tutorial is here:  https://realpython.com/pysimplegui-python/#installing-pysimplegui
 
 verbose_window_events:bool = True # False # 
+frame_seconds:float = 0.05 # while the CPU runs in the background, the display is refreshed at most this often
+run_slice:int = 2000 # how many instructions the background run executes between checks for a pause or a frame
+log_capacity:int = 1000 # the most records the action log remembers
+log_lines:int = 500 # the most lines the action log widget holds
 
 # The data model and controller
 theCPU:sim.CPU = sim.CPU()
@@ -16,6 +24,26 @@ theCPU.tick() # Make sure we start at tick 0
 
 # This will be a convenient place to put output
 terminal_ouput:sg.Multiline = sg.Multiline(autoscroll=True,size=(80,10),write_only=True,key="STDOUT")
+event_log:cpu_event_log.eventLog = cpu_event_log.eventLog(log_capacity)
+log_filter_checkboxes:list[sg.Checkbox] = [sg.Checkbox(category,default=True,enable_events=True,key="LOG_"+category) for category in cpu_event_log.logCategory.all]
+last_log_flush:float = 0.0
+
+def log_print(*parts) -> None:
+    """Adds a message to the action log.  Takes the same arguments as print, but they're only joined into text if the message is shown."""
+    event_log.add(cpu_event_log.logCategory.messages,None,*parts)
+
+def flush_log() -> None:
+    """Appends the records logged since the last flush to the action log widget, then trims the widget to its last log_lines lines.
+    Does nothing if the last flush was less than frame_seconds ago, so the widget is written at most once a frame however fast records arrive."""
+    global last_log_flush
+    if (not event_log.hasNew()) or (time.monotonic()-last_log_flush<frame_seconds):
+        return
+    new_lines, missed = event_log.takeNew()
+    if missed>0:
+        new_lines.insert(0,"... "+str(missed)+" older records were dropped before they could be shown")
+    terminal_ouput.update(value="\n".join(new_lines)+"\n",append=True)
+    terminal_ouput.Widget.delete("1.0","end - "+str(log_lines)+" lines")
+    last_log_flush = time.monotonic()
 
 
 ############################## CPU Register ######################################
@@ -72,6 +100,16 @@ def update_reg7_display() -> None:
     register7_display.update(theCPU.register7.toString())
     update_register7_appearance() 
 
+register_displays:list[sg.In] = [register0_display,register1_display,register2_display,register3_display,register4_display,register5_display,register6_display,register7_display]
+displayed_register_values:list[int] = [None]*8 # what each register field was last set to, so frames only touch registers that changed
+
+def update_changed_registers(registerValues:list[int]) -> None:
+    """Updates the register fields whose values differ from what's on screen."""
+    for index in range(len(registerValues)):
+        if registerValues[index]!=displayed_register_values[index]:
+            register_displays[index].update(sim.cpuByte.unsignedIntegerToBitString(registerValues[index]))
+            displayed_register_values[index]=registerValues[index]
+
 # Functions that set the color and responsivity of the register input fields
 def update_register0_appearance() -> None:
     update_input_field_appearance(register0_display,setRegister0_Button,theCPU.register0.toString)
@@ -102,7 +140,13 @@ def update_register7_appearance() -> None:
 
 ram_address_and_values:typing.List[typing.List[str]]=[["address","value"]]
 ram_table_headings = ["Binary address      ","Binary value      "]
-ram_states_display_table:sg.Table=sg.Table(display_row_numbers=True,values=ram_address_and_values,headings=ram_table_headings,enable_events=True,key="RAM_TABLE",select_mode="browse")
+ram_view_rows:int=24 # the number of rows the RAM table shows
+ram_buffer_rows:int=24 # rows fetched above and below the visible ones, so scrolling a little doesn't fetch RAM again.  Only these and the visible rows are fetched when the table is redrawn.
+ram_view_start:int=0 # the address in the top visible row of the RAM table
+ram_fetch_start:int=0 # the address in the first row the RAM table holds, which is up to ram_buffer_rows above ram_view_start
+ram_scroll_rows:int=4 # how far one notch of the mouse wheel moves the RAM table
+ram_states_display_table:sg.Table=sg.Table(display_row_numbers=False,values=ram_address_and_values,headings=ram_table_headings,num_rows=ram_view_rows,enable_events=True,key="RAM_TABLE",select_mode="browse")
+ram_jump_box:sg.In=sg.In(size=(18,1),default_text="",key="RAM_JUMP_ADDRESS")
 
 ram_last_user_address:int=None
 ram_address_display:sg.Text=sg.Text(size=(22,1)) 
@@ -120,7 +164,7 @@ def update_ram_modifier()->None:
     else:
         value_visible=True
         address_display_string="RAM "+theCPU.theRAM.unsignedIntegerToBitString(address)+": "
-        value_string=theCPU.theRAM.getUsingIntegerAddress(address).toString()
+        value_string=theCPU.theRAM.unsignedIntegerToBitString(theCPU.theRAM.getValueUsingIntegerAddress(address))
     ram_address_display.Size=(len(address_display_string),1)
     ram_address_display.set_size(size=(len(address_display_string),None))
     ram_address_display.update(value=address_display_string)
@@ -132,27 +176,183 @@ def toggle_ram_modifier()->None:
     def ram_retriever() -> str:
         if ram_last_user_address==None:
             return ""
-        return theCPU.theRAM.getUsingIntegerAddress(ram_last_user_address).toString()
+        return theCPU.theRAM.unsignedIntegerToBitString(theCPU.theRAM.getValueUsingIntegerAddress(ram_last_user_address))
     update_input_field_appearance(ram_update_box,ram_update_ok_button,ram_retriever)
 
 def mark_ram_dirty(ram_is_dirty:list[bool])->None:
     ram_is_dirty.pop()
     ram_is_dirty.append(True)
     if verbose_window_events == True:
-        print("\nRAM display is dirty: ",ram_is_dirty)
+        log_print("\nRAM display is dirty: ",list(ram_is_dirty)) # a copy, since the record is only formatted when it's shown
 
 def update_ram_table(ram_is_dirty:list[bool])->None:
     if verbose_window_events == True:
-        print("\nRAM display is dirty: ",ram_is_dirty)
+        log_print("\nRAM display is dirty: ",list(ram_is_dirty))
     local_ram_is_dirty:bool = ram_is_dirty.pop()
+    changes:sim.changeTracker = theCPU.theRAM.changes
     if local_ram_is_dirty:
         if verbose_window_events:
-            print("Updating RAM display")
-        ram_states_display_table.update(values=theCPU.theRAM.ramTable())
+            log_print("Updating RAM display")
+        if changes!=None:
+            changes.collect() # every row is about to be fetched again, so earlier changes don't matter
+        fetch_start, fetch_count = ram_fetch_range(ram_view_start)
+        show_ram_rows(fetch_start,theCPU.theRAM.ramTable(fetch_start,fetch_count))
+    elif (changes!=None) and changes.hasChanges():
+        update_changed_ram_rows(changes.collect())
     ram_is_dirty.append(False)
     if verbose_window_events == True:
-        print("\nRAM display is dirty: ",ram_is_dirty)
+        log_print("\nRAM display is dirty: ",list(ram_is_dirty))
         
+def update_changed_ram_rows(changed_ranges:list[tuple[int,int]])->None:
+    """Redraws only the rows of the RAM table whose addresses were written, leaving the rest of the table alone."""
+    table_rows:list[list[str]] = ram_states_display_table.Values
+    for start,end in changed_ranges:
+        for address in range(max(start,ram_fetch_start),min(end,ram_fetch_start+len(table_rows))): # only the rows the table holds
+            row:int = address-ram_fetch_start
+            table_rows[row] = theCPU.theRAM.ramTable(address)[0]
+            ram_states_display_table.Widget.item(ram_states_display_table.tree_ids[row],values=table_rows[row])
+
+def ram_fetch_range(view_start:int)->tuple[int,int]:
+    """The first address and the number of rows the RAM table holds when its top visible row is view_start: the visible rows plus ram_buffer_rows either side."""
+    fetch_start:int = max(0,view_start-ram_buffer_rows)
+    fetch_end:int = min(theCPU.theRAM._addressCount,view_start+ram_view_rows+ram_buffer_rows)
+    return fetch_start,fetch_end-fetch_start
+
+def ram_rows_cover_view(fetch_start:int,fetch_count:int)->bool:
+    """Whether rows fetched from fetch_start include every visible row."""
+    return (fetch_start<=ram_view_start) and (ram_view_start+ram_view_rows<=fetch_start+fetch_count)
+
+def show_ram_rows(fetch_start:int,rows:list[list[str]])->None:
+    """Puts rows fetched from fetch_start into the RAM table and scrolls it to ram_view_start."""
+    global ram_fetch_start
+    ram_fetch_start=fetch_start
+    ram_states_display_table.update(values=rows)
+    scroll_ram_table_to_view()
+
+def scroll_ram_table_to_view()->None:
+    """Scrolls the rows the table already holds so ram_view_start is the top visible row."""
+    ram_states_display_table.Widget.yview_moveto((ram_view_start-ram_fetch_start)/max(1,len(ram_states_display_table.Values)))
+
+def scroll_ram_view(starting_address:int,ram_is_dirty:list[bool])->None:
+    """Moves the RAM table so its top visible row is starting_address (or as near as possible at the ends of RAM).
+    If the rows the table holds still cover the view it's only scrolled.  Otherwise the rows around it are fetched, by the worker thread if the CPU is running in the background, in which case they arrive with the next frame."""
+    global ram_view_start
+    ram_view_start=max(0,min(theCPU.theRAM._addressCount-ram_view_rows,starting_address))
+    if ram_rows_cover_view(ram_fetch_start,len(ram_states_display_table.Values)):
+        scroll_ram_table_to_view()
+        return
+    if cpu_is_running():
+        ram_rows_wanted.set()
+        return
+    mark_ram_dirty(ram_is_dirty)
+    update_ram_table(ram_is_dirty)
+
+def parse_address(text:str)->int:
+    """Reads an address typed as a 16-bit binary string, as hex starting 0x or as decimal.  Returns None if it isn't an address."""
+    text=text.strip()
+    if sim.cpuByte.isValidBinaryString(text):
+        return sim.cpuByte.bitStringToUnsignedInt(text)
+    try:
+        address:int=int(text,0)
+    except ValueError:
+        return None
+    if (address<0) or (address>=theCPU.theRAM._addressCount):
+        return None
+    return address
+
+############################## Background Running ######################################
+
+instructions_per_second_display:sg.Text = sg.Text("",size=(24,1))
+run_count_box:sg.In = sg.In(size=(10,1),default_text="1000000",key="RUN_COUNT")
+pause_requested:threading.Event = threading.Event()
+ram_written_while_running:threading.Event = threading.Event() # set by the worker thread whenever the program writes RAM
+ram_rows_wanted:threading.Event = threading.Event() # set when the RAM table scrolls during a run, so the next frame brings the new rows
+window_closing:threading.Event = threading.Event() # once set, the worker thread sends the window no more events
+cpu_worker:threading.Thread = None # the thread running the CPU, if it's running
+
+def cpu_is_running() -> bool:
+    return (cpu_worker!=None) and cpu_worker.is_alive()
+
+def send_to_window(key:str,value) -> None:
+    """Sends an event from the worker thread, unless the window is closing."""
+    if not window_closing.is_set():
+        window.write_event_value(key,value)
+
+def run_cpu_in_background(max_instructions:int) -> None:
+    """Runs on the worker thread.  Executes instructions in slices on a blockJIT until max_instructions have been retired, something stops the CPU or a pause is requested.
+    At most every frame_seconds a snapshot is sent to the window as a CPU_FRAME event: the registers, the instruction rate, and the rows of the RAM table if RAM was written or the table scrolled.
+    The snapshot is taken here, between slices, so the window's thread never reads RAM while the program is writing it.  CPU_STOPPED is sent at the end."""
+    engine:cpu_jit.blockJIT = cpu_jit.blockJIT(theCPU)
+    retired:int = 0
+    reason:str = sim.stopReason.limit
+    lastFrameTime:float = time.monotonic()
+    lastFrameRetired:int = 0
+    try:
+        while (retired<max_instructions) and not pause_requested.is_set():
+            moreRetired, reason = engine.run(min(run_slice,max_instructions-retired))
+            retired = retired+moreRetired
+            if reason!=sim.stopReason.limit:
+                break
+            now:float = time.monotonic()
+            if now-lastFrameTime>=frame_seconds:
+                fetch_start, fetch_count = ram_fetch_range(ram_view_start)
+                ram_rows:list[list[str]] = None
+                if ram_written_while_running.is_set() or ram_rows_wanted.is_set():
+                    ram_written_while_running.clear()
+                    ram_rows_wanted.clear()
+                    ram_rows = theCPU.theRAM.ramTable(fetch_start,fetch_count)
+                send_to_window("CPU_FRAME",(cpu_jit.readRegisters(theCPU),(retired-lastFrameRetired)/(now-lastFrameTime),fetch_start,ram_rows))
+                lastFrameTime = now
+                lastFrameRetired = retired
+    finally:
+        engine.detach()
+        send_to_window("CPU_STOPPED",(retired,reason))
+
+def start_background_run(max_instructions:int) -> None:
+    """Starts the CPU running on a worker thread.  The per-change print reactions are detached while it runs, since they'd slow it down and mustn't touch the window from another thread."""
+    global cpu_worker
+    if cpu_is_running():
+        return
+    detach_display_reactions()
+    theCPU.theRAM.onWriteEvent.setReaction(window,lambda address,oldValue,newValue: ram_written_while_running.set())
+    pause_requested.clear()
+    ram_rows_wanted.clear()
+    for key in cpu_changing_events:
+        window[key].update(disabled=True)
+    window["PAUSE"].update(disabled=False)
+    cpu_worker = threading.Thread(target=run_cpu_in_background,args=(max_instructions,),daemon=True)
+    cpu_worker.start()
+
+def show_frame(registerValues:list[int],instructionsPerSecond:float,fetch_start:int,ram_rows:list[list[str]]) -> None:
+    """Shows a snapshot sent by the worker thread.  Nothing here reads the CPU or RAM, which the worker owns."""
+    update_changed_registers(registerValues)
+    instructions_per_second_display.update(format(instructionsPerSecond,",.0f")+" instructions/s")
+    if ram_rows!=None:
+        if ram_rows_cover_view(fetch_start,len(ram_rows)):
+            show_ram_rows(fetch_start,ram_rows)
+        else:
+            ram_rows_wanted.set() # the table scrolled again after the worker read these rows
+
+def finish_background_run(retired:int,reason:str) -> None:
+    """Called on the window's thread once the worker has stopped."""
+    cpu_worker.join()
+    theCPU.theRAM.onWriteEvent.removeReaction(window)
+    attach_display_reactions()
+    for key in cpu_changing_events:
+        window[key].update(disabled=False)
+    window["PAUSE"].update(disabled=True)
+    log_print("\nRan "+str(retired)+" instructions ("+reason+")")
+    ram_written_while_running.clear()
+    mark_ram_dirty(ram_is_dirty) # the last frame may have missed writes, or come before the table last scrolled
+    update_full_display()
+    update_ram_table(ram_is_dirty)
+
+def stop_background_run() -> None:
+    """Stops any background run and waits for the worker thread to finish, so it can't send events to a window that has been closed."""
+    window_closing.set()
+    pause_requested.set()
+    while cpu_is_running():
+        window.read(timeout=10) # keeps the window's thread handling any event the worker was already sending
 
 #################################### Utility Functions ######################################
 
@@ -193,6 +393,7 @@ def update_full_display() -> None:
     update_reg5_display()
     update_reg6_display()
     update_reg7_display()
+    displayed_register_values[:] = cpu_jit.readRegisters(theCPU)
     update_ram_modifier()
     toggle_ram_modifier()
 
@@ -201,14 +402,14 @@ def update_full_display() -> None:
 def loadBinaryFile(startingRam:int=0):
     fname = sg.popup_get_file('Binary RAM file to open')
     if verbose_window_events == True:
-        print("\nFile to open: ",fname)
+        log_print("\nFile to open: ",fname)
     if not fname:
         return # no filename passed in, or read was cancelled, so we return to normal program flo
     fileReader=None
     try:
         fileReader=open(fname,'r')
         if verbose_window_events == True:
-            print("file ",fname," opened")
+            log_print("file ",fname," opened")
         count=0
         ramAddress=startingRam
         while True:
@@ -217,7 +418,7 @@ def loadBinaryFile(startingRam:int=0):
             if not line: # stop if we've reached the end of the file
                 break
             if verbose_window_events==True:
-                print("Line read from file: '"+line+"'")
+                log_print("Line read from file: '"+line+"'")
             binary = line.strip()
             if not binary: # skip blank lines
                 continue
@@ -233,23 +434,20 @@ def loadBinaryFile(startingRam:int=0):
         if fileReader != None:
             fileReader.close()
             if verbose_window_events==True:
-                print("file ",fname," closed")
+                log_print("file ",fname," closed")
 
 def saveBinaryFile(startingRam:int=0,endingRam:int=theCPU.theRAM._addressCount):
     fname = sg.popup_get_file('Binary RAM file save RAM to')
     if verbose_window_events == True:
-        print("\nFile to open: ",fname)
+        log_print("\nFile to open: ",fname)
     if not fname:
         return # no filename passed in, or read was cancelled, so we return to normal program flo
     fileWriter=None
     try:
         fileWriter=open(fname,'w')
         if verbose_window_events == True:
-            print("file ",fname," opened")
-        binaryList=[]
-        for ramAddress in range(startingRam,endingRam):
-            binary = theCPU.theRAM.getUsingIntegerAddress(ramAddress).toString()+"\n"
-            binaryList.append(binary)
+            log_print("file ",fname," opened")
+        binaryList=[value_string+"\n" for address_string, value_string in theCPU.theRAM.ramTable(startingRam,endingRam-startingRam)] # read in bulk, without making a cpuByte per address
         fileWriter.writelines(binaryList)
     except:
         sg.popup('Could not open file')
@@ -258,19 +456,19 @@ def saveBinaryFile(startingRam:int=0,endingRam:int=theCPU.theRAM._addressCount):
         if fileWriter != None:
             fileWriter.close()
             if verbose_window_events==True:
-                print("file ",fname," closed")
+                log_print("file ",fname," closed")
 
 def loadAssemblyFile(startingRam:int=0):
     fname = sg.popup_get_file('Binary RAM file to open')
     if verbose_window_events == True:
-        print("\nFile to open: ",fname)
+        log_print("\nFile to open: ",fname)
     if not fname:
         return # no filename passed in, or read was cancelled, so we return to normal program flo
     fileReader=None
     try:
         fileReader=open(fname,'r')
         if verbose_window_events == True:
-            print("file ",fname," opened")
+            log_print("file ",fname," opened")
         assemblyLines:list(str)=fileReader.readlines()
         theAssembler = ml_assembler.assembler()
         binaryLines=None
@@ -278,7 +476,7 @@ def loadAssemblyFile(startingRam:int=0):
             binaryLines=theAssembler.compile(assemblyLines)
         except Exception as e:
             if verbose_window_events:
-                print("Compiler error: "+str(e))
+                log_print("Compiler error: "+str(e))
             sg.popup_error("Error compiling file:\n"+str(e))
         if binaryLines!=None:
             for whichBinaryLine in range(0,len(binaryLines)):
@@ -292,7 +490,7 @@ def loadAssemblyFile(startingRam:int=0):
         if fileReader != None:
             fileReader.close()
             if verbose_window_events==True:
-                print("file ",fname," closed")
+                log_print("file ",fname," closed")
 
 #################################### Display and Layout ######################################
 
@@ -302,6 +500,13 @@ registers_column = [
         sg.Button(button_text="CPU Tick",key="TICK")
         ,sg.Button(button_text="Reset CPU",key="RESET")
     ],
+    [
+        sg.Button(button_text="Run",key="RUN"),
+        sg.Button(button_text="Run N",key="RUN_N"),
+        run_count_box,
+        sg.Button(button_text="Pause",key="PAUSE",disabled=True)
+    ],
+    [instructions_per_second_display],
     [sg.Text("Clock Counter: "),clockTickDisplay],
     [sg.HorizontalSeparator()],
     [
@@ -361,6 +566,13 @@ ram_column = [
     [
         ram_states_display_table
     ],
+    [
+        sg.Button(button_text="Page Up",key="RAM_PAGE_UP"),
+        sg.Button(button_text="Page Down",key="RAM_PAGE_DOWN"),
+        sg.Text("Go to address: "),
+        ram_jump_box,
+        sg.Button(button_text="Go",key="RAM_JUMP")
+    ],
     [
         ram_address_display,
         ram_update_box,
@@ -369,6 +581,7 @@ ram_column = [
 ]
 terminal_section = [
     [sg.Text("CPU Action Log")],
+    log_filter_checkboxes,
     [terminal_ouput] 
 ]
 layout = [
@@ -386,78 +599,130 @@ layout = [
 ]
 
 
-# Wire up the RAM and CPU events for display
-def reactToParseML(mlBinaryString:str,matchedCommand:sim.machineLanguageCommand,parsedCommandParams:typing.Sequence)->None:
-    print("\nMachine language directive encountered by the CPU: "+str(mlBinaryString))
+# Wire up the RAM and CPU events for display.  Each reaction only stores a record; the text is built when the record is shown.
+def format_parsed_ml(mlBinaryString:str,matchedCommand:sim.machineLanguageCommand,parsedCommandParams:typing.Sequence)->str:
+    lines:list[str] = ["Machine language directive encountered by the CPU: "+str(mlBinaryString)]
     if matchedCommand==None:
-        print("Binary string could not be interpreted by the CPU.")
+        lines.append("Binary string could not be interpreted by the CPU.")
     else:
-        print("Binary string matches to the machine language directive:")
-        print(matchedCommand.description)
-    if (parsedCommandParams!=None) & (len(parsedCommandParams)>0):
-        print("The following data was parsed out of the binary: ")
-        for i in range(len(parsedCommandParams)):
-            print(parsedCommandParams[i])
+        lines.append("Binary string matches to the machine language directive:")
+        lines.append(matchedCommand.description)
+    if (parsedCommandParams!=None) and (len(parsedCommandParams)>0):
+        lines.append("The following data was parsed out of the binary: ")
+        lines.extend([str(param) for param in parsedCommandParams])
+    return "\n".join(lines)
+
+def reactToParseML(mlBinaryString:str,matchedCommand:sim.machineLanguageCommand,parsedCommandParams:typing.Sequence)->None:
+    event_log.add(cpu_event_log.logCategory.decode,format_parsed_ml,mlBinaryString,matchedCommand,parsedCommandParams)
 
 def reactToALU(conditionalFlags:str,aluDirectives:str,jumpRegisterDirective:str) ->None:
-    print("\nThe ALU was invoked with the 6 ALU command bits of "+aluDirectives)
-    print("The two jump-condition bits were "+conditionalFlags+", and the jump register to copy to register0 was "+jumpRegisterDirective)
+    event_log.add(cpu_event_log.logCategory.alu,"The ALU was invoked with the 6 ALU command bits of {}\nThe two jump-condition bits were {}, and the jump register to copy to register0 was {}",aluDirectives,conditionalFlags,jumpRegisterDirective)
 
 def reactToRegister0(oldValue,newValue)->None:
-    print("\nRegister 0 has changed value from "+oldValue+" to "+newValue)
+    event_log.add(cpu_event_log.logCategory.registers,"Register 0 has changed value from {} to {}",oldValue,newValue)
 def reactToRegister1(oldValue,newValue)->None:
-    print("\nRegister 1 has changed value from "+oldValue+" to "+newValue)
+    event_log.add(cpu_event_log.logCategory.registers,"Register 1 has changed value from {} to {}",oldValue,newValue)
 def reactToRegister2(oldValue,newValue)->None:
-    print("\nRegister 2 has changed value from "+oldValue+" to "+newValue)
+    event_log.add(cpu_event_log.logCategory.registers,"Register 2 has changed value from {} to {}",oldValue,newValue)
 def reactToRegister3(oldValue,newValue)->None:
-    print("\nRegister 3 has changed value from "+oldValue+" to "+newValue)
+    event_log.add(cpu_event_log.logCategory.registers,"Register 3 has changed value from {} to {}",oldValue,newValue)
 def reactToRegister4(oldValue,newValue)->None:
-    print("\nRegister 4 has changed value from "+oldValue+" to "+newValue)
+    event_log.add(cpu_event_log.logCategory.registers,"Register 4 has changed value from {} to {}",oldValue,newValue)
 def reactToRegister5(oldValue,newValue)->None:
-    print("\nRegister 5 has changed value from "+oldValue+" to "+newValue)
+    event_log.add(cpu_event_log.logCategory.registers,"Register 5 has changed value from {} to {}",oldValue,newValue)
 def reactToRegister6(oldValue,newValue)->None:
-    print("\nRegister 6 has changed value from "+oldValue+" to "+newValue)
+    event_log.add(cpu_event_log.logCategory.registers,"Register 6 has changed value from {} to {}",oldValue,newValue)
 def reactToRegister7(oldValue,newValue)->None:
-    print("\nRegister 7 has changed value from "+oldValue+" to "+newValue)
+    event_log.add(cpu_event_log.logCategory.registers,"Register 7 has changed value from {} to {}",oldValue,newValue)
 
-def reactToRAM(ram_is_dirty:list[bool],addressAsInt:int,oldValue:str,newValue:str)->None:
-    addressAsByteString:str=sim.cpuByte.unsignedIntegerToBitString(addressAsInt)
-    print("\nThe RAM at location ",addressAsByteString," (",str(addressAsInt),") was changed")
-    print("Old value: ",oldValue)
-    print("New value: ",newValue)
-    if oldValue!=newValue:
-        mark_ram_dirty(ram_is_dirty)
+def reactToRAM(addressAsInt:int,oldValue:int,newValue:int)->None:
+    event_log.add(cpu_event_log.logCategory.ram,"The RAM at location {0:016b} ({0}) was changed from {1:016b} to {2:016b}",addressAsInt,oldValue,newValue) # the RAM's change tracker tells the table which rows to redraw
 
 
 ########################### Window Creation and Event Handling #########################
 
 # Create the Window
 window = sg.Window("CPU Simulator", layout,finalize=True)
-terminal_ouput.reroute_stdout_to_here() # we dump stdout here so print commands from the CPU simulator show up nicely.
 ram_is_dirty:list[bool] = [True]
 
-theCPU.onParseML.setReaction(window,reactToParseML)
-theCPU.onAluCommand.setReaction(window,reactToALU)
-theCPU.register0.onChangeEvent.setReaction(window,reactToRegister0)
-theCPU.register1.onChangeEvent.setReaction(window,reactToRegister1)
-theCPU.register2.onChangeEvent.setReaction(window,reactToRegister2)
-theCPU.register3.onChangeEvent.setReaction(window,reactToRegister3)
-theCPU.register4.onChangeEvent.setReaction(window,reactToRegister4)
-theCPU.register5.onChangeEvent.setReaction(window,reactToRegister5)
-theCPU.register6.onChangeEvent.setReaction(window,reactToRegister6)
-theCPU.register7.onChangeEvent.setReaction(window,reactToRegister7)
-theCPU.theRAM.onChangeEvent.setReaction(window,lambda a,b,c: reactToRAM(ram_is_dirty,a,b,c))
+def attach_log_reactions() -> None:
+    """Subscribes the action log to the events of each enabled log category.  A disabled category's events get no reaction at all, so the CPU doesn't build bit strings for them."""
+    if cpu_event_log.logCategory.decode in event_log.enabled:
+        theCPU.onParseML.setReaction(window,reactToParseML)
+    if cpu_event_log.logCategory.alu in event_log.enabled:
+        theCPU.onAluCommand.setReaction(window,reactToALU)
+    if cpu_event_log.logCategory.registers in event_log.enabled:
+        theCPU.register0.onChangeEvent.setReaction(window,reactToRegister0)
+        theCPU.register1.onChangeEvent.setReaction(window,reactToRegister1)
+        theCPU.register2.onChangeEvent.setReaction(window,reactToRegister2)
+        theCPU.register3.onChangeEvent.setReaction(window,reactToRegister3)
+        theCPU.register4.onChangeEvent.setReaction(window,reactToRegister4)
+        theCPU.register5.onChangeEvent.setReaction(window,reactToRegister5)
+        theCPU.register6.onChangeEvent.setReaction(window,reactToRegister6)
+        theCPU.register7.onChangeEvent.setReaction(window,reactToRegister7)
+    if cpu_event_log.logCategory.ram in event_log.enabled:
+        theCPU.theRAM.onWriteEvent.setReaction(event_log,reactToRAM) # the write event passes integers, so no bit strings are built for the log
+
+def detach_log_reactions() -> None:
+    theCPU.theRAM.onWriteEvent.removeReaction(event_log)
+    for anEvent in [theCPU.onParseML,theCPU.onAluCommand]+[register.onChangeEvent for register in [theCPU.register0,theCPU.register1,theCPU.register2,theCPU.register3,theCPU.register4,theCPU.register5,theCPU.register6,theCPU.register7]]:
+        anEvent.removeReaction(window)
+
+def set_log_category_enabled(category:str,enabled:bool) -> None:
+    """Switches a log category on or off, re-attaching the log's reactions to match unless the worker thread is running the CPU (they're re-attached when it stops)."""
+    event_log.setEnabled(category,enabled)
+    if not cpu_is_running():
+        detach_log_reactions()
+        attach_log_reactions()
+
+def attach_display_reactions() -> None:
+    attach_log_reactions()
+    theCPU.theRAM.trackChanges()
+
+def detach_display_reactions() -> None:
+    detach_log_reactions()
+    theCPU.theRAM.stopTrackingChanges() # the tracker can't be collected while the worker thread writes RAM
+
+cpu_changing_events:list[str] = ["TICK","RESET","RUN","RUN_N","LOAD","LOADASM","SAVE","RAM_OK","R0_OK","R1_OK","R2_OK","R3_OK","R4_OK","R5_OK","R6_OK","R7_OK"] # buttons that can't be used while the CPU runs in the background, because they read or change it
+ram_reading_events:list[str] = ["RAM_TABLE","EDITABLE_RAM_VALUE"] # events that read RAM on the window's thread, so they're ignored while the CPU runs in the background
+attach_display_reactions()
+
+ram_states_display_table.bind("<MouseWheel>","_WHEEL") # Windows and macOS report the mouse wheel like this
+ram_states_display_table.bind("<Button-4>","_WHEEL_UP") # X11 reports it as buttons 4 and 5
+ram_states_display_table.bind("<Button-5>","_WHEEL_DOWN")
 
 update_ram_table(ram_is_dirty)
 update_full_display()
 
 # Create an event loop to catch events raised by the window itself
 while True:
-    windowEvent,values = window.read() # returns any events, and also the state of the entire window along with that event.
-    if verbose_window_events == True:
-        print("\nWindow event: ",windowEvent,values)
+    flush_log()
+    windowEvent,values = window.read(timeout=int(frame_seconds*1000) if event_log.hasNew() else None) # returns any events, and also the state of the entire window along with that event.  Log records still waiting for the next frame bring us back here in time to flush them.
+    if windowEvent == sg.TIMEOUT_EVENT:
+        continue
+    if (verbose_window_events == True) and (windowEvent not in ["CPU_FRAME","CPU_STOPPED"]): # frames arrive many times a second
+        log_print("\nWindow event: ",windowEvent,values)
     if windowEvent == "CLOSE_BUTTON" or windowEvent == sg.WIN_CLOSED:
         break # end the program if the user closes the window or clicks the OK button
+    if windowEvent in [checkbox.key for checkbox in log_filter_checkboxes]:
+        set_log_category_enabled(windowEvent[len("LOG_"):],values[windowEvent])
+    if windowEvent == "CPU_FRAME":
+        show_frame(*values["CPU_FRAME"])
+        continue
+    if windowEvent == "CPU_STOPPED":
+        finish_background_run(*values["CPU_STOPPED"])
+        continue
+    if cpu_is_running() and ((windowEvent in cpu_changing_events) or (windowEvent in ram_reading_events)):
+        continue # the worker thread owns the CPU until it stops
+    if windowEvent == "RUN":
+        start_background_run(2**62)
+    if windowEvent == "RUN_N":
+        try:
+            start_background_run(int(run_count_box.get()))
+        except ValueError:
+            sg.popup_error("Run N needs a whole number of instructions")
+    if windowEvent == "PAUSE":
+        pause_requested.set()
     if windowEvent == "LOAD":
         loadBinaryFile()
         update_ram_table(ram_is_dirty)
@@ -466,8 +731,24 @@ while True:
         update_ram_table(ram_is_dirty)
     if windowEvent == "SAVE":
         saveBinaryFile()
-    if windowEvent == "RAM_TABLE":
-        ram_last_user_address=values["RAM_TABLE"][0]
+    if windowEvent == "RAM_TABLE_WHEEL":
+        scroll_ram_view(ram_view_start+(ram_scroll_rows if ram_states_display_table.user_bind_event.delta<0 else -ram_scroll_rows),ram_is_dirty)
+    if windowEvent == "RAM_TABLE_WHEEL_UP":
+        scroll_ram_view(ram_view_start-ram_scroll_rows,ram_is_dirty)
+    if windowEvent == "RAM_TABLE_WHEEL_DOWN":
+        scroll_ram_view(ram_view_start+ram_scroll_rows,ram_is_dirty)
+    if windowEvent == "RAM_PAGE_UP":
+        scroll_ram_view(ram_view_start-ram_view_rows,ram_is_dirty)
+    if windowEvent == "RAM_PAGE_DOWN":
+        scroll_ram_view(ram_view_start+ram_view_rows,ram_is_dirty)
+    if windowEvent == "RAM_JUMP":
+        jump_address:int=parse_address(ram_jump_box.get())
+        if jump_address==None:
+            popup_error("Type the address as 16 binary digits, as hex starting 0x, or as decimal")
+        else:
+            scroll_ram_view(jump_address,ram_is_dirty)
+    if (windowEvent == "RAM_TABLE") and (len(values["RAM_TABLE"])>0):
+        ram_last_user_address=ram_fetch_start+values["RAM_TABLE"][0] # the table only holds the rows around the view, so its row numbers are relative to the first of them
         update_ram_modifier()
         toggle_ram_modifier()
     if windowEvent == "EDITABLE_RAM_VALUE":
@@ -525,4 +806,5 @@ while True:
         update_full_display()
         update_ram_table(ram_is_dirty)
 
+stop_background_run() # let a background run stop cleanly before the window goes
 window.close()
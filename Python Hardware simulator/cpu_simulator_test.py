@@ -1,6 +1,9 @@
 import typing
+import random
+import numpy
 import cpu_simulator
 import pytest
+from cpu_test_helpers import countdownProgram, loadProgram, assertSameState
 
 ############### event tests ###############
 def test_event_eventFiresCorrectly():
@@ -93,6 +96,37 @@ def test_multipleEventRaisers_singleEventFiresCorrectly():
     assert event_listener.state==True # the listener should have responded to the event by setting it's state
 
 
+def test_event_subscribeAndRemove_hasReactionsTracksSubscribers():
+    theEvent:cpu_simulator.event = cpu_simulator.event()
+    assert theEvent.hasReactions==False
+    theEvent.setReaction("listener",lambda *args: None)
+    assert theEvent.hasReactions==True
+    theEvent.removeReaction("listener")
+    assert theEvent.hasReactions==False
+
+def test_event_reactionRemovesItself_otherReactionsStillFire():
+    theEvent:cpu_simulator.event = cpu_simulator.event()
+    calls:list[str] = []
+    def firstReaction():
+        calls.append("first")
+        theEvent.removeReaction("first")
+    theEvent.setReaction("first",firstReaction)
+    theEvent.setReaction("second",lambda: calls.append("second"))
+    theEvent.fire()
+    theEvent.fire()
+    assert calls==["first","second","second"]
+
+def test_run_noListeners_noBitStringsBuilt(monkeypatch):
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndValue(0,0b0000000000111100) # COPY R7 R0
+    theCpu.decodeML(0b0000000000111100) # the first decode of an opcode builds its bit string
+    def toStringShouldNotBeCalled(*args):
+        raise AssertionError("A bit string was built with no one listening")
+    monkeypatch.setattr(cpu_simulator.cpuByte,"toString",toStringShouldNotBeCalled)
+    monkeypatch.setattr(cpu_simulator.cpuByte,"unsignedIntegerToBitString",toStringShouldNotBeCalled)
+    theCpu.run(10)
+    assert theCpu.register0.asUnsignedInteger()==0
+
 ############### cpuByte tests ###############
 
 def test_isValidByte_1010_returnFalse():
@@ -224,6 +258,33 @@ def test_cpuByte_0010000000000101_setMiddle5bits_bitSetCorrectly():
     aByte.setBitsFromString(8,"11111")
     assert aByte.toString() == "0010000011111101"
 
+def test_cpuByte_0010000000000101_getBit_readsFromTheLeft():
+    byteString:str="0010000000000101"
+    aByte:cpu_simulator.cpuByte = cpu_simulator.cpuByte()
+    aByte.fromString(byteString)
+    assert aByte.getBit(0)==False
+    assert aByte.getBit(2)==True
+    assert aByte.getBit(15)==True
+    assert aByte.getBit(14)==False
+
+def test_cpuByte_setBitsFromString_tooLong_raisesError():
+    aByte:cpu_simulator.cpuByte = cpu_simulator.cpuByte(False)
+    with pytest.raises(Exception):
+        aByte.setBitsFromString(10,"1111111")
+
+def test_cpuByte_setBitsFromString_notBinary_raisesError():
+    aByte:cpu_simulator.cpuByte = cpu_simulator.cpuByte(False)
+    with pytest.raises(Exception):
+        aByte.setBitsFromString(0,"1021")
+
+def test_cpuByte_bitStringToUnsignedInt_0000000000010101_is21():
+    assert cpu_simulator.cpuByte.bitStringToUnsignedInt("0000000000010101")==21
+
+def test_cpuByte_neg8_setFromSignedInteger_signBitSet():
+    aByte:cpu_simulator.cpuByte = cpu_simulator.cpuByte()
+    aByte.setFromSignedInteger(-8)
+    assert aByte.toString()=="1111111111111000"
+
 
 ############### RAM tests ###############
 
@@ -294,7 +355,85 @@ def test_ram_unsignedIntegerToBitString_convertsNumbers():
     assert cpu_simulator.RAM.unsignedIntegerToBitString(0)=="0000000000000000"
     assert cpu_simulator.RAM.unsignedIntegerToBitString(4)=="0000000000000100"
     assert cpu_simulator.RAM.unsignedIntegerToBitString(65535)=="1111111111111111"
-    
+
+
+def test_ram_randomize_allAddressesInitialized():
+    theRAM:cpu_simulator.RAM = cpu_simulator.RAM(randomize=True)
+    assert all(page.all() for page in theRAM._initializedPages)
+    assert len(set(theRAM.allRAM()))>1 # it would be astonishing for random RAM to hold a single value
+
+def test_ram_randomizeWithSeed_reproducible():
+    theRAM:cpu_simulator.RAM = cpu_simulator.RAM(randomize=True,seed=17)
+    assert theRAM.allRAM()==cpu_simulator.RAM(randomize=True,seed=17).allRAM()
+    assert theRAM.allRAM()!=cpu_simulator.RAM(randomize=True,seed=18).allRAM()
+
+def test_ram_seededLazyInitialization_reproducible():
+    values:list[list[int]] = []
+    for trial in range(2):
+        theRAM:cpu_simulator.RAM = cpu_simulator.RAM(randomize=None,seed=5)
+        theRAM._randomizeInitialBytes = True # initialize addresses as they're read, rather than all at once
+        values.append([theRAM.getValueUsingIntegerAddress(address) for address in [9,4000,9]])
+    assert values[0]==values[1]
+
+def test_ram_pattern_repeatedAcrossRam():
+    theRAM:cpu_simulator.RAM = cpu_simulator.RAM(pattern=[0xDEAD,0xBEEF,-1])
+    assert [theRAM.getValueUsingIntegerAddress(address) for address in [0,1,2,3,65535]]==[0xDEAD,0xBEEF,65535,0xDEAD,0xDEAD]
+    assert theRAM.uninitializedReads==0
+
+def test_ram_fork_writesOnlyVisibleOnOneSide():
+    theRAM:cpu_simulator.RAM = cpu_simulator.RAM(randomize=False)
+    theRAM.setUsingUnsignedIntegerAddressAndValue(300,7)
+    theFork:cpu_simulator.RAM = theRAM.fork()
+    assert theFork._valuePages[1] is theRAM._valuePages[1] # nothing is copied until someone writes
+    theFork.setUsingUnsignedIntegerAddressAndValue(300,8)
+    theRAM.setUsingUnsignedIntegerAddressAndValue(301,9)
+    assert theRAM.getValueUsingIntegerAddress(300)==7
+    assert theFork.getValueUsingIntegerAddress(300)==8
+    assert theFork.getValueUsingIntegerAddress(301)==0
+    assert theFork._valuePages[2] is theRAM._valuePages[2] # untouched pages stay shared
+
+def test_ram_loadValues_wrapsAroundAndInitializes():
+    theRAM:cpu_simulator.RAM = cpu_simulator.RAM(randomize=True)
+    theRAM.loadValues(65535,[1,2,3])
+    assert [theRAM.getValueUsingIntegerAddress(address) for address in [65535,0,1]]==[1,2,3]
+
+def test_ram_notRandomized_allZero():
+    theRAM:cpu_simulator.RAM = cpu_simulator.RAM(randomize=False)
+    assert theRAM.ramTable(100,3)==[["0000000001100100","0000000000000000"],["0000000001100101","0000000000000000"],["0000000001100110","0000000000000000"]]
+
+def test_ram_byteFromGet_writesThroughToRam():
+    theRAM:cpu_simulator.RAM = cpu_simulator.RAM()
+    theByte:cpu_simulator.cpuByte = theRAM.getUsingIntegerAddress(1234)
+    theByte.fromString("1111000011110000")
+    assert theRAM.getValueUsingIntegerAddress(1234)==0b1111000011110000
+    assert theRAM.getUsingIntegerAddress(1234) is theByte
+
+def test_ram_byteFromGetDropped_viewForgotten():
+    theRAM:cpu_simulator.RAM = cpu_simulator.RAM()
+    theByte:cpu_simulator.cpuByte = theRAM.getUsingIntegerAddress(1234)
+    assert len(theRAM._ramBytes)==1
+    del theByte
+    assert len(theRAM._ramBytes)==0 # so bulk loads can go back to copying whole pages
+    theRAM.loadValues(1234,[5])
+    assert theRAM.getUsingIntegerAddress(1234).asUnsignedInteger()==5
+
+def test_ram_writeThroughByteFromGet_eventsFired():
+    theRAM:cpu_simulator.RAM = cpu_simulator.RAM()
+    theByte:cpu_simulator.cpuByte = theRAM.getUsingIntegerAddress(1234)
+    theByte.setFromUnsignedInteger(5)
+    writes:list[tuple[int,int,int]] = []
+    changes:list[str] = []
+    theRAM.onWriteEvent.setReaction("listener",lambda address,oldValue,newValue: writes.append((address,oldValue,newValue)))
+    theByte.onChangeEvent.setReaction("listener",lambda oldValue,newValue: changes.append(newValue))
+    theByte.setFromUnsignedInteger(7)
+    assert writes==[(1234,5,7)]
+    assert changes==["0000000000000111"]
+
+def test_ram_setUsingIntegers_byteFromGetSeesChange():
+    theRAM:cpu_simulator.RAM = cpu_simulator.RAM()
+    theByte:cpu_simulator.cpuByte = theRAM.getUsingIntegerAddress(1234)
+    theRAM.setUsingUnsignedIntegerAddressAndValue(1234,77)
+    assert theByte.asUnsignedInteger()==77    
 
 ############### ALU tests ###############
 
@@ -414,6 +553,54 @@ def test_alu_1000000000000001_minus_0000000000000010_is0111111111111111():
     assert outByte.toString()=="0111111111111111"
 
 
+def test_alu_directiveTable_matchesRippleAdder():
+    generator:random.Random = random.Random(7)
+    values:list[int] = [0,1,32767,32768,65535]+[generator.getrandbits(16) for i in range(20)]
+    for aluDirectives in range(64):
+        flags:list[bool] = [character=="1" for character in format(aluDirectives,"06b")]
+        for x in values:
+            for y in values:
+                X:cpu_simulator.cpuByte=cpu_simulator.cpuByte()
+                X.setFromUnsignedInteger(x)
+                Y:cpu_simulator.cpuByte=cpu_simulator.cpuByte()
+                Y.setFromUnsignedInteger(y)
+                internalX:cpu_simulator.cpuByte = cpu_simulator.ALU.preprocessor(X,flags[0],flags[1])
+                internalY:cpu_simulator.cpuByte = cpu_simulator.ALU.preprocessor(Y,flags[2],flags[3])
+                expected:cpu_simulator.cpuByte = cpu_simulator.ALU.ADD(internalX,internalY) if flags[4] else cpu_simulator.ALU.AND(internalX,internalY)
+                if flags[5]:
+                    expected = cpu_simulator.ALU.negation(expected)
+                out, outIsNegative, outIsZero = cpu_simulator.ALU.evaluateUnsigned(x,y,format(aluDirectives,"06b"))
+                assert out==expected.asUnsignedInteger()
+                assert outIsNegative==cpu_simulator.ALU.isNegative(expected)
+                assert outIsZero==cpu_simulator.ALU.isZero(expected)
+
+def test_aluCommand_register4WrittenInPlace():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    register4:cpu_simulator.cpuByte = theCpu.register4
+    changes:list[str] = []
+    register4.onChangeEvent.setReaction("listener",lambda oldValue,newValue: changes.append(newValue))
+    theCpu.register2.setFromUnsignedInteger(5)
+    theCpu.register3.setFromUnsignedInteger(3)
+    theCpu.aluCommand(0b00,0b000010,0b000) # X+Y
+    assert theCpu.register4 is register4
+    assert changes==["0000000000001000"]
+
+def test_alu_evaluateBatch_everyDirective_sameAsEvaluate():
+    generator:random.Random = random.Random(99)
+    X:list[int] = [generator.getrandbits(16) for i in range(64)]+[0,32768]
+    Y:list[int] = [generator.getrandbits(16) for i in range(64)]+[32768,0]
+    for aluDirectives in range(64):
+        out, outIsNegative, outIsZero = cpu_simulator.ALU.evaluate_batch(numpy.array(X,dtype=numpy.uint16),numpy.array(Y,dtype=numpy.uint16),format(aluDirectives,"06b"))
+        for index in range(len(X)):
+            expected:tuple[int,bool,bool] = cpu_simulator.ALU.evaluateUnsigned(X[index],Y[index],format(aluDirectives,"06b"))
+            assert (int(out[index]),bool(outIsNegative[index]),bool(outIsZero[index]))==expected
+
+def test_alu_evaluateBatch_perElementDirectives():
+    out, outIsNegative, outIsZero = cpu_simulator.ALU.evaluate_batch(numpy.array([5,5,5]),numpy.array([3,3,3]),numpy.array([0b000010,0b000000,0b000111]))
+    assert out.tolist()==[8,1,65534] # X+Y, X&Y and Y-X
+    assert outIsNegative.tolist()==[False,False,True]
+    assert outIsZero.tolist()==[False,False,False]
+
 ############### machineLanguage tests ###############
 
 def test_machineLanguage_create_noError():
@@ -711,3 +898,312 @@ def test_cpu_copyCommand_001_110_TargetUnchanged():
     # Test that the command does what it's supposed to
     theCpu.tick() # let the CPU execute the specified command in register1
     assert targetRegister.toString()=="1111111111111111" # verify that the RAM address is properly set
+
+def test_cpu_decodeML_matchesRegularExpressions():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    for opcode in range(0,65536,97): # a spread of opcodes covering every command
+        mlBinaryString:str=cpu_simulator.cpuByte.unsignedIntegerToBitString(opcode)
+        commandIndex, parsedCommandParams = theCpu.decodeML(opcode)
+        for expectedIndex in range(len(theCpu.mlCommandList)):
+            expectedParams=theCpu.mlCommandList[expectedIndex].tryStringMatchesCommand(mlBinaryString)
+            if expectedParams!=None:
+                break
+        assert commandIndex==expectedIndex
+        assert parsedCommandParams==expectedParams
+
+def test_cpu_customCommandAdded_decodeTableUsesIt():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    theCpu.theClock=1 # The next tick of the CPU will execute the command in register1
+    theCpu.register1.fromString("1111111111111111") # normally a no-op
+    theCpu.tick() # make sure the decode table has seen this opcode before the instruction set changes
+
+    customCommand:cpu_simulator.machineLanguageCommand=cpu_simulator.machineLanguageCommand()
+    customCommand.reMatch="1{13}111"
+    customCommand.description="Sets register7 to all ones."
+    customCommand.action=lambda unused : theCpu.register7.fromString("1111111111111111")
+    theCpu.mlCommandList.insert(0,customCommand)
+    theCpu.register7.fromString("0000000000000000")
+
+    theCpu.theClock=1
+    theCpu.tick() # execute the custom command
+    assert theCpu.register7.toString()=="1111111111111111"
+
+def test_cpu_commandReplacedInPlace_decodeTableUsesIt():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    theCpu.theClock=1
+    theCpu.register1.fromString("0000000000000111") # a no-op with the standard commands
+    theCpu.tick()
+
+    customCommand:cpu_simulator.machineLanguageCommand=cpu_simulator.machineLanguageCommand()
+    customCommand.reMatch="([01]{5})([01]{8})111"
+    customCommand.description="Sets register7 to the middle 8 bits."
+    customCommand.integerAction=lambda unused, literal : theCpu.register7.setFromUnsignedInteger(literal)
+    customCommand.action=customCommand.actWithIntegers
+    theCpu.mlCommandList[7]=customCommand # replaces NOOP111
+    theCpu.register7.setFromUnsignedInteger(0)
+    theCpu.register1.fromString("0000000001010111")
+
+    theCpu.theClock=1
+    theCpu.tick()
+    assert theCpu.register7.asUnsignedInteger()==0b00001010
+    assert customCommand.retiredCount==1
+
+def test_cpu_standardActionReplaced_replacementCarriedOut():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    theCpu.theClock=1
+    theCpu.register1.fromString("0000000000111100") # COPY R7 R0
+    theCpu.tick() # make sure the decode table has seen this opcode before the action changes
+    calls:list[typing.Sequence[str]] = []
+    theCpu.mlCommandList[4].action = lambda aSequence : calls.append(aSequence)
+    theCpu.resetDecodeTable()
+    theCpu.register0.setFromUnsignedInteger(5)
+
+    theCpu.theClock=1
+    theCpu.tick()
+    assert calls==[("000","111")]
+    assert theCpu.register0.asUnsignedInteger()==5
+
+def test_cpu_getRegister_notThreeBits_raises():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    assert theCpu.getRegister("110") is theCpu.register6
+    for threeBits in ["11","1100","1a0"]:
+        with pytest.raises(Exception):
+            theCpu.getRegister(threeBits)
+
+def test_cpu_run_sameStateAsTicks():
+    tickedCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(tickedCpu,countdownProgram)
+    for i in range(3*500):
+        tickedCpu.tick()
+
+    runCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(runCpu,countdownProgram)
+    retired, reason = runCpu.run(500)
+
+    assert retired==500
+    assert reason==cpu_simulator.stopReason.limit
+    assert runCpu.theClock==tickedCpu.theClock
+    for register in ["000","001","010","011","100","101","110","111"]:
+        assert runCpu.getRegister(register).toString()==tickedCpu.getRegister(register).toString()
+    assert runCpu.theRAM.ramTable(0,32)==tickedCpu.theRAM.ramTable(0,32)
+
+def test_cpu_step_partwayThroughInstruction_finishesInstruction():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,countdownProgram)
+    theCpu.step()
+    theCpu.tick() # fetch the second instruction
+    theCpu.step() # finish it off
+    assert theCpu.theClock==2
+    assert theCpu.register0.asUnsignedInteger()==2
+    assert theCpu.register7.toString()=="0000000000101000"
+
+def test_fork_differentPerturbations_runIndependently():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,countdownProgram)
+    theCpu.run(3) # register2 now holds 40
+    theFork:cpu_simulator.CPU = theCpu.fork()
+    theFork.register2.setFromUnsignedInteger(5)
+    theCpu.run(500)
+    theFork.run(500)
+    assert theCpu.register0.asUnsignedInteger() in [11,12] # both end up spinning
+    assert theFork.register0.asUnsignedInteger() in [11,12]
+    assert theCpu.register2.asUnsignedInteger()==0
+    assert theFork.register2.asUnsignedInteger()==0
+    assert theFork.theClock==theCpu.theClock
+
+def test_startTrace_countdown_recordsLastInstructions():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,countdownProgram)
+    trace:cpu_simulator.traceRecorder = theCpu.startTrace(capacity=4)
+    theCpu.run(11) # up to and including the first jump back to the top of the loop
+    records = trace.records()
+    assert trace.count==11
+    assert records["pc"].tolist()==[7,8,9,10]
+    assert records["opcode"][-1]==0b0000001100110101
+    assert records["jumped"].tolist()==[0,0,0,1]
+    assert records["register4"][-1]==39
+
+def test_startTrace_store_recordsWrite():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndValue(0,0b0000000000101010) # SETLOWBITS 00000101
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndValue(1,0b0000000101111100) # COPY R7 R5
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndValue(2,0b0000000000000000) # STORE
+    trace:cpu_simulator.traceRecorder = theCpu.startTrace()
+    theCpu.run(2)
+    for tick in range(3):
+        theCpu.tick() # the store goes through the ticks, which are recorded too
+    records = trace.records()
+    assert records["wrote"].tolist()==[0,0,1]
+    assert (records["writeAddress"][2],records["writeValue"][2])==(5,5)
+    theCpu.stopTrace()
+    theCpu.run(1)
+    assert trace.count==3
+
+def test_counters_countdown_countsEachKindOfEvent():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,countdownProgram)
+    theCpu.counters.reset() # loading the program isn't part of the run
+    theCpu.run(11) # up to and including the first jump back to the top of the loop
+    theCpu.tick() # and the fetch of the next instruction
+    counters:dict = theCpu.counters.snapshot()
+    assert counters["retired"]==11
+    assert counters["retiredByCommand"]["ALU"]==2
+    assert counters["retiredByCommand"]["SETLOWBITS"]==3
+    assert counters["ticks"]==34
+    assert counters["fetchReads"]==12
+    assert (counters["jumpsTaken"],counters["jumpsNotTaken"])==(1,0)
+    assert counters["uninitializedReads"]==0
+
+def test_counters_loadAndStoreOfUnsetRAM_countedThenReset():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndValue(0,0b0000000000000001) # LOAD from address 0 (register5 is 0)
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndValue(1,0b0000011111111010) # SETLOWBITS 11111111
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndValue(2,0b0000000101111100) # COPY R7 R5
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndValue(3,0b0000000000000001) # LOAD from address 255, which was never set
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndValue(4,0b0000000000000000) # STORE
+    theCpu.run(5)
+    counters:dict = theCpu.counters.snapshot()
+    assert (counters["loadReads"],counters["storeWrites"],counters["uninitializedReads"])==(2,1,1)
+    theCpu.counters.reset()
+    assert theCpu.counters.snapshot()["retired"]==0
+    assert theCpu.counters.snapshot()["uninitializedReads"]==0
+
+def test_addBreakpoint_loopTop_stopsBeforeExecuting():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,countdownProgram)
+    theCpu.addBreakpoint(8)
+    retired, reason = theCpu.run(1000)
+    assert (retired,reason)==(8,cpu_simulator.stopReason.breakpoint)
+    assert theCpu.register0.asUnsignedInteger()==8
+    assert theCpu.register2.asUnsignedInteger()==40 # R2-R3 hasn't run yet
+    retired, reason = theCpu.run(1000) # carries on past the breakpoint it's sitting on, round the loop once
+    assert (retired,reason)==(3,cpu_simulator.stopReason.breakpoint)
+    assert theCpu.register2.asUnsignedInteger()==39
+
+def test_addBreakpoint_hitCountAndCondition():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,countdownProgram)
+    theCpu.addBreakpoint(8,hitCount=2,condition=lambda cpu: cpu.register2.asUnsignedInteger()<30)
+    retired, reason = theCpu.run(1000)
+    assert reason==cpu_simulator.stopReason.breakpoint
+    assert theCpu.register2.asUnsignedInteger()==28 # the condition is first true at 29, and the second hit is at 28
+    theCpu.removeBreakpoint(8)
+    assert theCpu.run(1000)==(1000,cpu_simulator.stopReason.limit)
+
+def test_step_back_store_registersAndRamRestored():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndValue(0,0b0000000000101010) # SETLOWBITS 00000101
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndValue(1,0b0000000101111100) # COPY R7 R5
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndValue(2,0b0000000000000000) # STORE
+    theCpu.startJournal()
+    theCpu.run(2)
+    for tick in range(3):
+        theCpu.tick() # the store goes through the ticks, which are journaled too
+    assert theCpu.theRAM.getValueUsingIntegerAddress(5)==5
+    assert theCpu.step_back()==1
+    assert theCpu.theRAM.getValueUsingIntegerAddress(5)==0
+    assert theCpu.register0.asUnsignedInteger()==2
+    assert theCpu.register1.asUnsignedInteger()==0b0000000101111100
+    assert theCpu.step_back(10)==2 # only two more instructions are in the journal
+    assert theCpu.register0.asUnsignedInteger()==0
+    assert theCpu.register7.asUnsignedInteger()==0
+
+def test_run_back_until_countdown_sameStateAsShorterRun():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,countdownProgram)
+    theCpu.startJournal()
+    theCpu.run(100)
+    undone:int = theCpu.run_back_until(8)
+    assert theCpu.register0.asUnsignedInteger()==8
+    shorterCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(shorterCpu,countdownProgram)
+    shorterCpu.run(100-undone)
+    assertSameState(theCpu,shorterCpu,32)
+
+def test_step_back_longRewind_restoresSnapshotAndReplays():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,countdownProgram)
+    journal:cpu_simulator.undoJournal = theCpu.startJournal(snapshotInterval=16)
+    theCpu.run(300)
+    assert theCpu.step_back(250)==250
+    assert journal.position==50
+    shorterCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(shorterCpu,countdownProgram)
+    shorterCpu.run(50)
+    assertSameState(theCpu,shorterCpu,32)
+    assert theCpu.step_back(5)==5 # the journal still holds the replayed instructions
+    theCpu.run(255)
+    shorterCpu.run(250)
+    assertSameState(theCpu,shorterCpu,32)
+
+def test_startLoopDetection_countdown_haltsAtSpinLoop():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,countdownProgram)
+    loops:cpu_simulator.loopDetector = theCpu.startLoopDetection()
+    retired, reason = theCpu.run(100000)
+    assert reason==cpu_simulator.stopReason.halted
+    assert retired<200
+    assert loops.loopAddress==theCpu.register0.asUnsignedInteger()==11
+    assert theCpu.register2.asUnsignedInteger()==0
+
+def test_startLoopDetection_loopThatStores_notHalted():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndValue(0,0b0000000000000000) # STORE
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndValue(1,0b0000000000111100) # COPY R7 R0, and register7 is 0
+    theCpu.startLoopDetection()
+    assert theCpu.run(1000)==(1000,cpu_simulator.stopReason.limit) # the store might be changing RAM, so the loop isn't known to be stuck
+
+def test_loopDetector_checkMany_sameAsCheckingEachState():
+    for seenCount, count, repeatAt in [(1,2,None),(3,10,None),(2,13,None),(2,6,1),(2,6,2),(3,6,None)]: # with window 4, a repeat of a state seen before is only caught until the window fills
+        states:list[tuple[int,...]] = [(1,2,3,index) for index in range(count)]
+        oneAtATime:cpu_simulator.loopDetector = cpu_simulator.loopDetector(window=4)
+        allAtOnce:cpu_simulator.loopDetector = cpu_simulator.loopDetector(window=4)
+        for detector in [oneAtATime,allAtOnce]:
+            for index in range(seenCount):
+                detector.check((0,0,0,index),7)
+            if repeatAt!=None:
+                detector.check(states[repeatAt],7)
+        expected:int = None
+        for index in range(count):
+            if oneAtATime.check(states[index],7):
+                expected = index
+                break
+        assert allAtOnce.checkMany(count,lambda index: states[index],lambda state: states.index(state) if state in states else None,7)==expected
+        assert allAtOnce._seen==oneAtATime._seen
+        assert allAtOnce.loopAddress==oneAtATime.loopAddress
+
+def test_trackChanges_writesAndLoads_collectedAsMergedRanges():
+    theRAM:cpu_simulator.RAM = cpu_simulator.RAM()
+    tracker:cpu_simulator.changeTracker = theRAM.trackChanges()
+    for address in [5,6,7,9]:
+        theRAM.setUsingUnsignedIntegerAddressAndValue(address,1)
+    theRAM.loadValues(65534,[1,2,3,4]) # wraps around to addresses 0 and 1
+    assert tracker.collect()==[(0,2),(5,8),(9,10),(65534,65536)]
+    assert tracker.collect()==[] # collecting starts afresh
+    theRAM.getUsingIntegerAddress(100).setFromUnsignedInteger(3)
+    assert tracker.collect()==[(100,101)]
+
+def test_trackChanges_storeDuringRun_collectedUntilStopped():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndValue(0,0b0000000001010010) # SETLOWBITS 00001010
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndValue(1,0b0000000101111100) # COPY R7 R5
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndValue(2,0b0000000000000000) # STORE
+    tracker:cpu_simulator.changeTracker = theCpu.theRAM.trackChanges()
+    theCpu.run(3)
+    assert tracker.collect()==[(10,11)]
+    theCpu.theRAM.stopTrackingChanges()
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndValue(20,1)
+    assert not tracker.hasChanges()
+
+def test_step_back_longRewindWithLoopDetection_sameStateAsShorterRun():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,countdownProgram)
+    theCpu.startLoopDetection()
+    theCpu.startJournal(snapshotInterval=16)
+    theCpu.run(100)
+    assert theCpu.step_back(80)==80
+    shorterCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(shorterCpu,countdownProgram)
+    shorterCpu.run(20)
+    assertSameState(theCpu,shorterCpu,32)
+    assert theCpu.run(60)==(60,cpu_simulator.stopReason.limit) # the states seen before the rewind don't count as a loop
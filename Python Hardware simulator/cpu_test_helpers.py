@@ -0,0 +1,32 @@
+# Programs and checks shared by the tests of the different ways of running the CPU.
+
+import cpu_simulator
+
+# A small counting loop.  It counts register2 down to zero and then spins in place.
+countdownProgram:list[str]=[
+    "0000000000000011", # SETTOPBITS 00000000
+    "0000000101000010", # SETLOWBITS 00101000
+    "0000000010111100", # COPY R7 R2
+    "0000000000000011", # SETTOPBITS 00000000
+    "0000000000001010", # SETLOWBITS 00000001
+    "0000000011111100", # COPY R7 R3
+    "0000000001000010", # SETLOWBITS 00001000
+    "0000000110111100", # COPY R7 R6
+    "0000010011000101", # R2-R3
+    "0000000010100100", # COPY R4 R2
+    "0000001100110101", # ALU 001100 IF 00 JUMP R6
+    "0000000001011010", # SETLOWBITS 00001011
+    "0000000000111100", # COPY R7 R0
+]
+
+def loadProgram(theCpu:cpu_simulator.CPU,program:list[str],startAddress:int=0) -> None:
+    """Writes the binary strings of program into RAM from startAddress on."""
+    for address in range(len(program)):
+        theCpu.theRAM.setUsingUnsignedIntegerAddressAndBitStringValue(startAddress+address,program[address])
+
+def assertSameState(cpu1:cpu_simulator.CPU,cpu2:cpu_simulator.CPU,ramAddresses:int) -> None:
+    """Asserts that the two CPUs have the same clock, the same registers and the same values in RAM below ramAddresses."""
+    assert cpu1.theClock==cpu2.theClock
+    for register in ["000","001","010","011","100","101","110","111"]:
+        assert cpu1.getRegister(register).toString()==cpu2.getRegister(register).toString()
+    assert cpu1.theRAM.ramTable(0,ramAddresses)==cpu2.theRAM.ramTable(0,ramAddresses)
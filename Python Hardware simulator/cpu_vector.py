@@ -0,0 +1,125 @@
+# A lockstep, vectorized engine that runs many copies of the simulated CPU at once.
+# Every machine executes one instruction per step, and each kind of instruction is carried out for all of the machines that are on it with a handful of numpy operations.
+
+import numpy
+import cpu_simulator as sim
+import cpu_jit
+
+
+class BatchCPU:
+    """Holds N machines that all run the standard instruction set in lockstep.
+    registers is an N x 8 uint16 matrix.  RAM is paged: every machine starts out sharing the pages of one base image, and a page is only copied for a machine when that machine writes to it.
+    Machines that take different jumps simply carry different values in register0.  Addresses that were never written read as 0."""
+
+    _pageSize:int=sim.RAM._pageSize # the number of words in a RAM page, the same as the pages of an ordinary RAM
+    _pagesPerMachine:int=sim.RAM._pageCount
+
+    def __init__(self,machineCount:int,baseRAM:sim.RAM=None) -> None:
+        self.machineCount:int=machineCount
+        self.registers:numpy.ndarray=numpy.zeros((machineCount,8),dtype=numpy.uint16) # one row of registers per machine
+        baseImage:numpy.ndarray = numpy.zeros(sim.RAM._addressCount,dtype=numpy.uint16) if baseRAM==None else baseRAM._valuesInRange(0,sim.RAM._addressCount)
+        self._pages:numpy.ndarray=baseImage.reshape(self._pagesPerMachine,self._pageSize).copy() # the pool of RAM pages.  The first rows are the base image.
+        self._pageIsShared:numpy.ndarray=numpy.ones(self._pagesPerMachine,dtype=bool) # whether each pooled page belongs to the base image
+        self._pagesInUse:int=self._pagesPerMachine
+        self._pageTable:numpy.ndarray=numpy.tile(numpy.arange(self._pagesPerMachine,dtype=numpy.int32),(machineCount,1)) # machine, page number -> row of the page pool.  int32 halves its size and still counts far more pages than fit in memory
+        self._allMachines:numpy.ndarray=numpy.arange(machineCount)
+
+    @staticmethod
+    def fromCPU(theCPU:sim.CPU,machineCount:int) -> "BatchCPU":
+        """Makes machineCount copies of a CPU's registers and RAM.  The CPU must be between instructions."""
+        if theCPU.theClock!=2:
+            raise Exception("The CPU is part way through an instruction.  Finish it with CPU.step() first.")
+        if not cpu_jit.usesStandardInstructionSet(theCPU):
+            raise Exception("The CPU has a custom instruction set, but BatchCPU only runs the standard one.  Run it with CPU.run instead.")
+        batch:BatchCPU = BatchCPU(machineCount,theCPU.theRAM)
+        batch.registers[:,:] = numpy.array([register.asUnsignedInteger() for register in [theCPU.register0,theCPU.register1,theCPU.register2,theCPU.register3,theCPU.register4,theCPU.register5,theCPU.register6,theCPU.register7]],dtype=numpy.uint16)
+        return batch
+
+    def toCPU(self,whichMachine:int) -> sim.CPU:
+        """Builds an ordinary CPU holding the registers and RAM of one machine, e.g. to inspect it or to carry on running it alone."""
+        theCPU:sim.CPU = sim.CPU()
+        theCPU.theRAM.loadValues(0,self._pages[self._pageTable[whichMachine]].reshape(-1))
+        registerBytes:list[sim.cpuByte] = [theCPU.register0,theCPU.register1,theCPU.register2,theCPU.register3,theCPU.register4,theCPU.register5,theCPU.register6,theCPU.register7]
+        for index in range(8):
+            registerBytes[index].setFromUnsignedInteger(int(self.registers[whichMachine,index]))
+        return theCPU
+
+    def readRAM(self,machines:numpy.ndarray,addresses:numpy.ndarray) -> numpy.ndarray:
+        """Reads one address for each of the given machines."""
+        addresses = numpy.asarray(addresses,dtype=numpy.int64)
+        return self._pages[self._pageTable[machines,addresses>>sim.RAM._pageBits],addresses & sim.RAM._offsetMask]
+
+    def writeRAM(self,machines:numpy.ndarray,addresses:numpy.ndarray,values:numpy.ndarray) -> None:
+        """Writes one address for each of the given machines, copying any page that's still shared first.  Each machine may only appear once."""
+        machines = numpy.asarray(machines,dtype=numpy.int64)
+        addresses = numpy.broadcast_to(numpy.asarray(addresses,dtype=numpy.int64),machines.shape)
+        pageNumbers:numpy.ndarray = addresses>>sim.RAM._pageBits
+        rows:numpy.ndarray = self._pageTable[machines,pageNumbers]
+        needsCopy:numpy.ndarray = self._pageIsShared[rows]
+        if needsCopy.any():
+            copyCount:int = int(needsCopy.sum())
+            newRows:numpy.ndarray = self._allocatePages(copyCount)
+            self._pages[newRows] = self._pages[rows[needsCopy]]
+            self._pageTable[machines[needsCopy],pageNumbers[needsCopy]] = newRows
+            rows = rows.copy()
+            rows[needsCopy] = newRows
+        self._pages[rows,addresses & sim.RAM._offsetMask] = values
+
+    def _allocatePages(self,count:int) -> numpy.ndarray:
+        """Hands out count unused rows of the page pool, growing the pool if it's full."""
+        if self._pagesInUse+count>len(self._pages):
+            newSize:int = max(2*len(self._pages),self._pagesInUse+count)
+            self._pages = numpy.concatenate([self._pages,numpy.zeros((newSize-len(self._pages),self._pageSize),dtype=numpy.uint16)])
+            self._pageIsShared = numpy.concatenate([self._pageIsShared,numpy.zeros(newSize-len(self._pageIsShared),dtype=bool)])
+        newRows:numpy.ndarray = numpy.arange(self._pagesInUse,self._pagesInUse+count)
+        self._pagesInUse = self._pagesInUse+count
+        return newRows
+
+    def step(self) -> None:
+        """Every machine executes one whole instruction."""
+        registers:numpy.ndarray = self.registers
+        opcodes:numpy.ndarray = self.readRAM(self._allMachines,registers[:,0]) # clock tick 0: fetch
+        registers[:,1] = opcodes
+        registers[:,0] = registers[:,0]+numpy.uint16(1) # clock tick 1: increment the code pointer
+        kinds:numpy.ndarray = opcodes & 7
+
+        machines:numpy.ndarray = numpy.flatnonzero(kinds==0) # STORE
+        if len(machines)>0:
+            self.writeRAM(machines,registers[machines,5],registers[machines,7])
+
+        machines = numpy.flatnonzero(kinds==1) # LOAD
+        if len(machines)>0:
+            registers[machines,6] = self.readRAM(machines,registers[machines,5])
+
+        machines = numpy.flatnonzero(kinds==2) # SETLOWBITS
+        if len(machines)>0:
+            registers[machines,7] = (registers[machines,7] & numpy.uint16(0xFF00)) | ((opcodes[machines]>>3) & numpy.uint16(255))
+
+        machines = numpy.flatnonzero(kinds==3) # SETTOPBITS
+        if len(machines)>0:
+            registers[machines,7] = (registers[machines,7] & numpy.uint16(255)) | (((opcodes[machines]>>3) & numpy.uint16(255))<<8)
+
+        machines = numpy.flatnonzero(kinds==4) # COPY, into any register except register1
+        if len(machines)>0:
+            targets:numpy.ndarray = (opcodes[machines]>>6) & 7
+            sources:numpy.ndarray = (opcodes[machines]>>3) & 7
+            values:numpy.ndarray = registers[machines,sources]
+            copies:numpy.ndarray = targets!=1
+            registers[machines[copies],targets[copies]] = values[copies]
+
+        machines = numpy.flatnonzero(kinds==5) # ALU, with an optional jump
+        if len(machines)>0:
+            aluOpcodes:numpy.ndarray = opcodes[machines]
+            out, outIsNegative, outIsZero = sim.ALU.evaluate_batch(registers[machines,2],registers[machines,3],(aluOpcodes>>6) & 63)
+            registers[machines,4] = out
+            jumpRegisters:numpy.ndarray = (aluOpcodes>>3) & 7
+            jumps:numpy.ndarray = (jumpRegisters!=0) & (outIsZero==((aluOpcodes & 8192)!=0)) & (outIsNegative==((aluOpcodes & 4096)!=0))
+            jumpingMachines:numpy.ndarray = machines[jumps]
+            registers[jumpingMachines,0] = registers[jumpingMachines,jumpRegisters[jumps]]
+        # kinds 6 and 7 are no-ops
+
+    def run(self,steps:int) -> int:
+        """Every machine executes the given number of instructions.  Returns the number of instructions retired by each machine."""
+        for count in range(steps):
+            self.step()
+        return steps
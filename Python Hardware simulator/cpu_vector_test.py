@@ -0,0 +1,60 @@
+import random
+import numpy
+import cpu_simulator
+import cpu_vector
+import pytest
+from cpu_test_helpers import countdownProgram, loadProgram, assertSameState
+
+def test_batchCPU_differentStartingCounts_eachMatchesRun():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    loadProgram(theCpu,countdownProgram)
+    theCpu.register0.setFromUnsignedInteger(3) # skip the code that sets register2, so each machine counts down from its own value
+    batch:cpu_vector.BatchCPU = cpu_vector.BatchCPU.fromCPU(theCpu,5)
+    batch.registers[:,2] = [0,1,7,20,65535]
+    batch.run(300)
+
+    for machine in range(5):
+        interpretedCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+        loadProgram(interpretedCpu,countdownProgram)
+        interpretedCpu.register0.setFromUnsignedInteger(3)
+        interpretedCpu.register2.setFromUnsignedInteger([0,1,7,20,65535][machine])
+        interpretedCpu.run(300)
+        assertSameState(interpretedCpu,batch.toCPU(machine),32)
+
+def test_batchCPU_randomPrograms_sameStateAsRun():
+    generator:random.Random = random.Random(4321)
+    for trial in range(4):
+        mask:int = 0b0000000111111111 if trial%2==0 else 0b1111111111111111 # small literal fields keep jumps and stores near the program, full opcodes cover every ALU directive
+        program:list[str] = [cpu_simulator.cpuByte.unsignedIntegerToBitString(generator.getrandbits(16) & mask) for i in range(64)]
+        theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+        loadProgram(theCpu,program)
+        batch:cpu_vector.BatchCPU = cpu_vector.BatchCPU.fromCPU(theCpu,3)
+        batch.registers[:,2] = [0,100,40000]
+        batch.run(300)
+
+        for machine in range(3):
+            interpretedCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+            loadProgram(interpretedCpu,program)
+            interpretedCpu.register2.setFromUnsignedInteger([0,100,40000][machine])
+            interpretedCpu.run(300)
+            assertSameState(interpretedCpu,batch.toCPU(machine),512)
+
+def test_writeRAM_sharedPage_copiedForThatMachineOnly():
+    batch:cpu_vector.BatchCPU = cpu_vector.BatchCPU(3)
+    batch.writeRAM(numpy.array([1]),1000,numpy.array([7],dtype=numpy.uint16))
+    assert list(batch.readRAM(numpy.arange(3),numpy.full(3,1000)))==[0,7,0]
+    assert batch._pagesInUse==cpu_vector.BatchCPU._pagesPerMachine+1
+
+def test_fromCPU_partWayThroughInstruction_raisesError():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    theCpu.tick()
+    with pytest.raises(Exception):
+        cpu_vector.BatchCPU.fromCPU(theCpu,2)
+
+def test_fromCPU_customInstructionSet_raisesError():
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    customCommand:cpu_simulator.machineLanguageCommand=cpu_simulator.machineLanguageCommand()
+    customCommand.reMatch="1{13}111"
+    theCpu.mlCommandList.insert(0,customCommand)
+    with pytest.raises(Exception,match="custom instruction set"):
+        cpu_vector.BatchCPU.fromCPU(theCpu,2)
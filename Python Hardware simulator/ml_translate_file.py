@@ -0,0 +1,279 @@
+# An ahead-of-time translator for the cpu simulator.
+# A binary image (like the ones written by ml_compile_file.py) is translated into a standalone Python module, with one function per reachable code address.
+# Translated modules are cached on disk, keyed by a hash of the image, so each image only gets translated and decoded once.
+
+import argparse
+import hashlib # used to key the translation cache
+import importlib.util # used to import translated modules from the cache
+import inspect # used to hash the source of the code generator
+import os
+import sys
+import types
+import cpu_simulator as sim
+import cpu_jit
+
+translatorVersion:str="2" # mixed into the image hash along with emitterHash().  Bump it for changes to the generated code that don't show up in the emitter source.
+defaultCacheDirectory:str=os.path.join(os.path.expanduser("~"),".cache","cpu_simulator")
+maxBlockLength:int=32 # the longest straight-line run translated into one function.  Every entry point gets its own copy of the code after it, so this bounds the module size.
+_loadedTranslations:dict[str,types.ModuleType]=dict() # translations already imported by this process, keyed by image hash
+
+def readBinaryFile(binaryFile:str) -> list[str]:
+    """Reads a binary image, one 16-bit binary string per line.  Blank lines are skipped."""
+    image:list[str]=[]
+    with open(binaryFile,'r') as fileReader:
+        lineNumber:int=0
+        for line in fileReader:
+            lineNumber=lineNumber+1
+            binary:str=line.strip()
+            if not binary: # skip blank lines
+                continue
+            if not sim.cpuByte.isValidBinaryString(binary):
+                raise RuntimeError("Line "+str(lineNumber)+" of "+binaryFile+" isn't a binary string: "+binary)
+            image.append(binary)
+    return image
+
+_emitterHash:str=None # cached by emitterHash
+
+def emitterHash() -> str:
+    """A hash of the source of every function that writes translated code, so editing the code generator never picks up stale translations from the cache."""
+    global _emitterHash
+    if _emitterHash==None:
+        hasher = hashlib.sha256()
+        for emitter in [translate,findEntryPoints,_imageReader,cpu_jit.blockSource,cpu_jit.aluExpression,cpu_jit._registerExpression,cpu_jit._exitLines,sim.ALU.directiveExpression]:
+            hasher.update(inspect.getsource(emitter).encode())
+        _emitterHash = hasher.hexdigest()
+    return _emitterHash
+
+def imageHash(image:list[str],startAddress:int=0) -> str:
+    """A hash of everything that goes into a translation: the image, the address it's loaded at and the version of the translator."""
+    hasher = hashlib.sha256()
+    hasher.update((translatorVersion+":"+emitterHash()+":"+str(startAddress)+":").encode())
+    hasher.update("\n".join(image).encode())
+    return hasher.hexdigest()
+
+def _imageReader(image:list[str],startAddress:int) -> callable:
+    """Returns readOpcode(address), which gives the instruction at an address in the image or None outside of it."""
+    opcodes:list[int] = [sim.cpuByte.bitStringToUnsignedInt(binary) for binary in image]
+    def readOpcode(address:int) -> int:
+        offset:int = (address-startAddress) & sim.cpuByte._maxVal
+        return opcodes[offset] if offset<len(opcodes) else None
+    return readOpcode
+
+def findEntryPoints(image:list[str],startAddress:int=0) -> list[int]:
+    """Finds the addresses that execution can reach the start of a block at, starting from startAddress.
+    Jumps go through registers, so jump targets are found by following the constant values that SETTOPBITS, SETLOWBITS and COPY put in registers.
+    Anything this misses is still run correctly, because translatedProgram interprets addresses that have no translated function."""
+    readOpcode:callable = _imageReader(image,startAddress)
+    mask:int = sim.cpuByte._maxVal
+    unknown:list[tuple[int,int]] = [(0,0)]*8 # the (value, mask of known bits) of each register
+    entryStates:dict[int,list[tuple[int,int]]] = {startAddress:unknown}
+    toVisit:list[int] = [startAddress]
+    entryPoints:list[int] = []
+    while len(toVisit)>0:
+        address:int = toVisit.pop()
+        if address in entryPoints:
+            continue
+        entryPoints.append(address)
+        registers:list[tuple[int,int]] = list(entryStates[address])
+        successors:list[tuple[int,int]] = [] # (value, mask of known bits) of the addresses execution may go to next
+        for count in range(maxBlockLength):
+            opcode:int = readOpcode(address)
+            if opcode==None:
+                break # we've run off the end of the image
+            nextAddress:int = (address+1) & mask
+            kind:int = opcode & 7
+            if kind==0: # STORE
+                successors.append((nextAddress,mask))
+                break
+            elif kind==1: # LOAD
+                registers[6] = (0,0)
+            elif kind==2: # SETLOWBITS
+                registers[7] = ((registers[7][0] & (mask ^ 255)) | ((opcode>>3) & 255), registers[7][1] | 255)
+            elif kind==3: # SETTOPBITS
+                registers[7] = ((registers[7][0] & 255) | (((opcode>>3) & 255)<<8), registers[7][1] | (mask ^ 255))
+            elif kind==4: # COPY
+                target:int = (opcode>>6) & 7
+                source:int = (opcode>>3) & 7
+                value:tuple[int,int] = (nextAddress,mask) if source==0 else ((opcode,mask) if source==1 else registers[source])
+                if target==0:
+                    successors.append(value)
+                    break
+                if target!=1:
+                    registers[target] = value
+            elif kind==5: # ALU
+                registers[4] = (0,0)
+                if (registers[2][1]==mask) & (registers[3][1]==mask):
+                    registers[4] = (eval(cpu_jit.aluExpression((opcode>>6) & 63),{"r2":registers[2][0],"r3":registers[3][0]}),mask)
+                jumpRegister:int = (opcode>>3) & 7
+                if jumpRegister!=0:
+                    successors.append((opcode,mask) if jumpRegister==1 else registers[jumpRegister])
+                    successors.append((nextAddress,mask))
+                    break
+            address = nextAddress
+        else:
+            successors.append((address,mask)) # the block hit its length limit
+        for value, knownBits in successors:
+            if (knownBits!=mask) | (readOpcode(value)==None):
+                continue # not a constant, or outside of the image
+            if value not in entryStates:
+                entryStates[value] = registers
+                toVisit.append(value)
+    entryPoints.sort()
+    return entryPoints
+
+def translate(image:list[str],startAddress:int=0) -> str:
+    """Returns the source of a Python module that runs the image.  It holds one function per reachable code address and a dictionary that dispatches jumps to them."""
+    readOpcode:callable = _imageReader(image,startAddress)
+    lines:list[str] = [
+        "# Translated from a binary image by ml_translate_file.py.  Don't edit this file; translate the image again instead.",
+        "",
+        "imageHash = "+repr(imageHash(image,startAddress)),
+        "startAddress = "+str(startAddress),
+        "imageOpcodes = "+repr(tuple(readOpcode(startAddress+offset) for offset in range(len(image)))),
+        "",
+    ]
+    blockTable:list[str] = []
+    for entryPoint in findEntryPoints(image,startAddress):
+        functionName:str = "block_"+format(entryPoint,"04x")
+        addresses, source = cpu_jit.blockSource(readOpcode,entryPoint,functionName,maxBlockLength)
+        lines.append(source)
+        blockTable.append("    "+str(entryPoint)+": ("+functionName+", "+str(len(addresses))+"),")
+    lines.append("# RAM address -> (function, instructions retired by the function)")
+    lines.append("blocks = {")
+    lines.extend(blockTable)
+    lines.append("}")
+    return "\n".join(lines)+"\n"
+
+def loadTranslation(image:list[str],startAddress:int=0,cacheDirectory:str=None) -> types.ModuleType:
+    """Returns the translated module for the image, translating it only if it isn't already in the cache directory."""
+    key:str = imageHash(image,startAddress)
+    if key in _loadedTranslations:
+        return _loadedTranslations[key]
+    if cacheDirectory==None:
+        cacheDirectory = defaultCacheDirectory
+    moduleName:str = "ml_image_"+key
+    modulePath:str = os.path.join(cacheDirectory,moduleName+".py")
+    if not os.path.exists(modulePath):
+        os.makedirs(cacheDirectory,exist_ok=True)
+        temporaryPath:str = modulePath+"."+str(os.getpid())+".tmp"
+        with open(temporaryPath,'w') as fileWriter:
+            fileWriter.write(translate(image,startAddress))
+        os.replace(temporaryPath,modulePath) # other processes never see a half-written module
+    spec = importlib.util.spec_from_file_location(moduleName,modulePath)
+    translation:types.ModuleType = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(translation)
+    _loadedTranslations[key] = translation
+    return translation
+
+def loadImage(theCPU:sim.CPU,image:list[str],startAddress:int=0) -> None:
+    """Copies a binary image into the CPU's RAM."""
+    for offset in range(len(image)):
+        theCPU.theRAM.setUsingUnsignedIntegerAddressAndBitStringValue((startAddress+offset) & sim.cpuByte._maxVal,image[offset])
+
+
+class translatedProgram:
+    """Runs a CPU using a translated module.
+    Addresses the translation has no function for, and code that no longer matches RAM (because it was overwritten), are run by CPU.run instead.
+    Like the blockJIT, translated code doesn't fire the CPU's onParseML, onAluCommand or register events, and brings the CPU's performance counters up to date when run() returns."""
+
+    def __init__(self,theCPU:sim.CPU,translation:types.ModuleType) -> None:
+        self.cpu:sim.CPU=theCPU
+        self.translation:types.ModuleType=translation
+        self._blocks:dict[int,tuple[callable,int]]=dict() # the translated functions that still match RAM
+        self._counts:list[cpu_jit.blockCounts]=[] # what running each translated function adds to the CPU's performance counters
+        for startAddress, (function, length) in translation.blocks.items():
+            function, tally = cpu_jit.blockCounts.rebind(function) # the module may be shared with other programs, so count our runs separately
+            self._blocks[startAddress] = (function,length)
+            self._counts.append(cpu_jit.blockCounts(theCPU,[translation.imageOpcodes[(startAddress+offset-translation.startAddress) & sim.cpuByte._maxVal] for offset in range(length)],tally))
+        self._maxBlockLength:int=max([length for function, length in translation.blocks.values()],default=0)
+        theCPU.theRAM.onWriteEvent.setReaction(self,self.reactToRAM)
+        for offset in range(len(translation.imageOpcodes)): # throw away anything translated from code that isn't what's in RAM
+            address:int = (translation.startAddress+offset) & sim.cpuByte._maxVal
+            if theCPU.theRAM.getValueUsingIntegerAddress(address)!=translation.imageOpcodes[offset]:
+                self.reactToRAM(address)
+
+    def detach(self) -> None:
+        """Stops listening to the CPU's RAM."""
+        self.cpu.theRAM.onWriteEvent.removeReaction(self)
+
+    def reactToRAM(self,addressAsInt:int,*unused) -> None:
+        """Stops using every translated function whose code includes the RAM address that just changed."""
+        for distance in range(self._maxBlockLength):
+            startAddress:int = (addressAsInt-distance) & sim.cpuByte._maxVal
+            entry:tuple[callable,int] = self._blocks.get(startAddress)
+            if (entry!=None) and (distance<entry[1]):
+                del self._blocks[startAddress]
+
+    def addCounts(self) -> None:
+        """Adds the runs of every translated function to the CPU's performance counters."""
+        for counts in self._counts:
+            counts.addTo(self.cpu)
+
+    def run(self,max_instructions:int) -> tuple[int,str]:
+        """Executes up to max_instructions whole instructions and returns the number retired along with the stopReason, just like CPU.run.
+        The CPU's loop detector sees the same states CPU.run would show it, so a stuck program halts after the same instruction."""
+        theCPU:sim.CPU=self.cpu
+        retired:int=0
+        if (theCPU.theClock!=2) & (max_instructions>0):
+            retired,unused = theCPU.run(1) # finish off the instruction that's part way through its ticks
+        if (not cpu_jit.usesStandardInstructionSet(theCPU)) or theCPU.needsInterpreter(): # compiled code doesn't record traces or stop at breakpoints
+            moreRetired,reason = theCPU.run(max_instructions-retired)
+            return retired+moreRetired,reason
+
+        registers:list[int] = cpu_jit.readRegisters(theCPU)
+        load:callable = theCPU.theRAM.getValueUsingIntegerAddress
+        store:callable = theCPU.theRAM.setUsingUnsignedIntegerAddressAndValue
+        blocks:dict[int,tuple[callable,int]] = self._blocks
+        loops:sim.loopDetector = theCPU.loops
+        reason:str = sim.stopReason.limit
+        try:
+            while retired<max_instructions:
+                startAddress:int = registers[0]
+                entry:tuple[callable,int] = blocks.get(startAddress)
+                if entry==None: # interpret until we're back in translated code
+                    cpu_jit.writeRegisters(theCPU,registers)
+                    register0:sim.cpuByte = theCPU.register0
+                    unused, reason = theCPU.run(1)
+                    retired = retired+1
+                    while (retired<max_instructions) & (reason==sim.stopReason.limit) & (register0._value not in blocks):
+                        unused, reason = theCPU.run(1)
+                        retired = retired+1
+                    registers = cpu_jit.readRegisters(theCPU)
+                    if reason==sim.stopReason.halted:
+                        return retired,reason
+                    continue
+                function, length = entry
+                if length>max_instructions-retired:
+                    break # the function would overshoot the limit, so the interpreter finishes the job
+                retired = retired+function(registers,load,store)
+                if (loops!=None) and (registers[0]<startAddress+length) and loops.check(tuple(registers),theCPU.theRAM.writeCount): # a backward jump from the function's last instruction, which is where CPU.run would look for a loop
+                    cpu_jit.writeRegisters(theCPU,registers)
+                    return retired,sim.stopReason.halted
+        finally:
+            self.addCounts()
+        cpu_jit.writeRegisters(theCPU,registers)
+
+        moreRetired,reason = theCPU.run(max_instructions-retired)
+        return retired+moreRetired,reason
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Translates a binary image into a Python module.  Without a module file the translation goes into the cache at "+defaultCacheDirectory)
+    parser.add_argument("binaryFile",help="the binary image to translate, one 16-bit binary string per line")
+    parser.add_argument("moduleFile",nargs="?",default=None,help="the Python module to write")
+    parser.add_argument("--start-address",type=lambda text: int(text,0),default=0,help="where the image is loaded and starts running")
+    arguments = parser.parse_args(argv)
+
+    image:list[str] = readBinaryFile(arguments.binaryFile)
+    print("Read "+str(len(image))+" lines of binary from "+arguments.binaryFile)
+    if arguments.moduleFile!=None:
+        with open(arguments.moduleFile,'w') as fileWriter:
+            fileWriter.write(translate(image,arguments.start_address))
+        print("Translation written to "+arguments.moduleFile)
+        return 0
+    translation:types.ModuleType = loadTranslation(image,arguments.start_address)
+    print("Translation cached at "+translation.__file__)
+    return 0
+
+if __name__=="__main__":
+    sys.exit(main(sys.argv[1:]))
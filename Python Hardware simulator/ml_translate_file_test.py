@@ -0,0 +1,106 @@
+import os
+import random
+import cpu_simulator
+import ml_translate_file as translator
+import pytest
+from cpu_test_helpers import countdownProgram, assertSameState
+
+def test_readBinaryFile_skipsBlankLines(tmp_path):
+    binaryFile:str = str(tmp_path/"program.bin")
+    with open(binaryFile,'w') as fileWriter:
+        fileWriter.write("0000000000000011\n\n  0000000101000010\n")
+    assert translator.readBinaryFile(binaryFile)==["0000000000000011","0000000101000010"]
+
+def test_readBinaryFile_badLine_raisesError(tmp_path):
+    binaryFile:str = str(tmp_path/"program.bin")
+    with open(binaryFile,'w') as fileWriter:
+        fileWriter.write("0000000000000011\nSETLOWBITS 00000001\n")
+    with pytest.raises(RuntimeError):
+        translator.readBinaryFile(binaryFile)
+
+def test_findEntryPoints_countdown_findsLoopAndSpin():
+    assert translator.findEntryPoints(countdownProgram)==[0,8,11]
+
+def test_translatedProgram_countdown_sameStateAsRun(tmp_path):
+    interpretedCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    translator.loadImage(interpretedCpu,countdownProgram)
+    interpretedCpu.run(1000)
+
+    translatedCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    translator.loadImage(translatedCpu,countdownProgram)
+    translation = translator.loadTranslation(countdownProgram,cacheDirectory=str(tmp_path))
+    retired, reason = translator.translatedProgram(translatedCpu,translation).run(1000)
+
+    assert retired==1000
+    assert reason==cpu_simulator.stopReason.limit
+    assertSameState(interpretedCpu,translatedCpu,32)
+    assert translatedCpu.counters.snapshot()==interpretedCpu.counters.snapshot()
+
+def test_loadTranslation_secondLoad_usesDiskCache(tmp_path,monkeypatch):
+    image:list[str] = countdownProgram+["0000000000000110"] # a different image from the other tests, so nothing is cached in memory yet
+    translator.loadTranslation(image,cacheDirectory=str(tmp_path))
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".py")])==1
+
+    translator._loadedTranslations.clear() # forget the in-memory copy, as a new process would
+    def translateShouldNotBeCalled(*args):
+        raise AssertionError("The image was translated again")
+    monkeypatch.setattr(translator,"translate",translateShouldNotBeCalled)
+    translation = translator.loadTranslation(image,cacheDirectory=str(tmp_path))
+    assert translation.imageHash==translator.imageHash(image)
+
+def test_translatedProgram_codeOverwritten_fallsBackToInterpreter(tmp_path):
+    theCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    translator.loadImage(theCpu,countdownProgram)
+    program = translator.translatedProgram(theCpu,translator.loadTranslation(countdownProgram,cacheDirectory=str(tmp_path)))
+    assert 8 in program._blocks
+
+    theCpu.theRAM.setUsingUnsignedIntegerAddressAndBitStringValue(9,"0000000000000110") # replace "COPY R4 R2" with a no-op
+    assert 8 not in program._blocks
+    assert 11 in program._blocks
+    program.run(200)
+    assert theCpu.register2.asUnsignedInteger()==40 # without the copy, register2 never counts down
+
+def test_translatedProgram_loopDetection_haltsLikeRun(tmp_path):
+    interpretedCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    translator.loadImage(interpretedCpu,countdownProgram)
+    interpretedCpu.startLoopDetection()
+    expected:tuple[int,str] = interpretedCpu.run(100000)
+
+    translatedCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+    translator.loadImage(translatedCpu,countdownProgram)
+    translatedCpu.startLoopDetection()
+    translation = translator.loadTranslation(countdownProgram,cacheDirectory=str(tmp_path))
+    assert translator.translatedProgram(translatedCpu,translation).run(100000)==expected
+    assertSameState(interpretedCpu,translatedCpu,32)
+
+def test_translatedProgram_loopDetection_randomPrograms_haltsAtSameInstructionAsRun(tmp_path):
+    generator:random.Random = random.Random(11)
+    for trial in range(20):
+        program:list[str] = [cpu_simulator.cpuByte.unsignedIntegerToBitString(generator.getrandbits(16) & 0b0000000111111111) for i in range(48)]
+        interpretedCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+        translator.loadImage(interpretedCpu,program)
+        interpretedCpu.startLoopDetection()
+        expected:tuple[int,str] = interpretedCpu.run(2000)
+
+        translatedCpu:cpu_simulator.CPU = cpu_simulator.CPU()
+        translator.loadImage(translatedCpu,program)
+        translatedCpu.startLoopDetection()
+        translation = translator.loadTranslation(program,cacheDirectory=str(tmp_path))
+        assert translator.translatedProgram(translatedCpu,translation).run(2000)==expected
+        assertSameState(interpretedCpu,translatedCpu,64)
+
+def test_imageHash_emitterChanged_differentHash(monkeypatch):
+    before:str = translator.imageHash(countdownProgram)
+    monkeypatch.setattr(translator,"_emitterHash","a different code generator")
+    assert translator.imageHash(countdownProgram)!=before
+
+def test_main_startAddress_translatesAtThatAddress(tmp_path):
+    binaryFile:str = str(tmp_path/"program.bin")
+    with open(binaryFile,'w') as fileWriter:
+        fileWriter.write("\n".join(countdownProgram)+"\n")
+    moduleFile:str = str(tmp_path/"program.py")
+    assert translator.main([binaryFile,moduleFile,"--start-address","0x100"])==0
+    with open(moduleFile,'r') as fileReader:
+        source:str = fileReader.read()
+    assert "startAddress = 256" in source
+    assert "imageHash = "+repr(translator.imageHash(countdownProgram,256)) in source